@@ -52,6 +52,8 @@ with col_buttons1:
 with col_buttons2:
     st.page_link("pages/Collection.py", label="📄 View Your Data Collection", icon="📁")
 
+st.page_link("pages/Analytics.py", label="📊 Explore Collection Analytics", icon="📈")
+
 
 st.markdown("<br>", unsafe_allow_html=True) # Add some space
 
@@ -0,0 +1,151 @@
+"""Collection page load time on synthetic `data/` directories.
+
+Writes 1k, 10k and 100k generated records through the record store (the
+segment log by default, or one JSON file per record) and times what
+`pages/Collection.py` does on a visit, without Streamlit itself:
+
+- `collection.cold`: the first visit to a directory with no index yet
+  (`RecordIndex.sync()` reads every record, then the embeddings are built).
+- `collection.page`: a warm rerun listing records (sync, the three filter
+  dropdowns, the count, one page of rows and the selected record).
+- `collection.search`: the same rerun with a full-text search.
+- `collection.similar`: the "similar recordings" lookup for the selected record.
+
+    python benchmarks/bench_collection.py [--sizes 1000 10000 100000] [--backend segments|json] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import percentiles, print_rows, row
+
+from parampara_ai.embeddings import EmbeddingIndex
+from parampara_ai.index import RecordIndex
+from parampara_ai.recordstore import get_store, read_record
+
+LANGUAGES = ["Telugu", "Hindi", "Tamil", "Kannada", "Marathi", "Bengali"]
+CATEGORIES = ["Agriculture", "Crafts", "Medicine", "Folk Music", "Food", "Rituals", "General Summary"]
+WORDS = ("clay pottery kiln river harvest seed monsoon loom weaving indigo turmeric neem festival drum song "
+         "grandmother village temple millet rice well cattle market dye bamboo basket fishing net boat").split()
+SYSTEM_PROMPT = "You are an expert transcriber and translator. " * 40 # Shared by every record, as in practice
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def make_record(rng, position, start=datetime(2024, 1, 1)):
+    """Returns one synthetic record shaped like `storage.save_data` writes them."""
+    category = rng.choice(CATEGORIES)
+    return {
+        "id": f"{position:08d}-{rng.getrandbits(64):016x}",
+        "timestamp": (start + timedelta(minutes=17 * position)).isoformat(),
+        "username": f"user{rng.randrange(200)}",
+        "coordinates": {"latitude": str(round(rng.uniform(8, 30), 4)), "longitude": str(round(rng.uniform(70, 88), 4))},
+        "category": category,
+        "original_language": rng.choice(LANGUAGES),
+        "transcription_original_language": " ".join(_sentence(rng, 12) for _ in range(8)),
+        "translation_english": " ".join(_sentence(rng, 12) for _ in range(8)),
+        "summary_data": {"title": _sentence(rng, 4), "category": category, "summary": _sentence(rng, 30),
+                         "keywords": rng.sample(WORDS, 5)},
+        "system_prompt": SYSTEM_PROMPT,
+    }
+
+
+def write_records(data_dir, count, backend="segments", seed=0):
+    """Writes `count` synthetic records to `data_dir`; returns the IDs."""
+    rng = random.Random(seed)
+    store = get_store(data_dir, backend)
+    ids = []
+    for position in range(count):
+        record = make_record(rng, position)
+        store.write(record)
+        ids.append(record["id"])
+    return ids
+
+
+def _time(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def render_page(data_dir, search_text=None, page_size=25):
+    """What one Collection rerun asks of the index; returns the selected record."""
+    record_index = RecordIndex(data_dir)
+    record_index.sync()
+    for column in ("category", "username", "original_language"):
+        record_index.distinct(column)
+    if search_text:
+        record_index.count_matches(search_text)
+        rows = record_index.search(search_text, limit=page_size)
+    else:
+        record_index.count()
+        rows = record_index.query(limit=page_size)
+    return read_record(rows[0]["path"]) if rows else None
+
+
+def bench_size(count, backend="segments", repeat=20, seed=0):
+    """Cold and warm timings for one directory size; returns the result rows."""
+    work_dir = tempfile.mkdtemp()
+    try:
+        data_dir = os.path.join(work_dir, "data")
+        write_seconds, ids = _time(write_records, data_dir, count, backend, seed)
+        params = {"records": count, "backend": backend}
+
+        index_seconds, indexed = _time(RecordIndex(data_dir).sync)
+        embeddings_seconds, _ = _time(EmbeddingIndex(data_dir).sync, RecordIndex(data_dir))
+        rows = [row(
+            "collection.cold", params,
+            write_s=write_seconds,
+            index_sync_s=index_seconds,
+            embeddings_sync_s=embeddings_seconds,
+            indexed=indexed,
+            index_mb=os.path.getsize(os.path.join(data_dir, "index.db")) / 1e6,
+        )]
+
+        for name, search_text in (("collection.page", None), ("collection.search", "pottery kiln")):
+            timings = [_time(render_page, data_dir, search_text)[0] for _ in range(repeat)]
+            rows.append(row(name, params, **percentiles(timings, "render_s_")))
+
+        rng = random.Random(seed)
+        timings = [_time(EmbeddingIndex(data_dir).similar, rng.choice(ids), 5)[0] for _ in range(repeat)]
+        rows.append(row("collection.similar", params, **percentiles(timings, "lookup_s_")))
+        return rows
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark(sizes=(1000, 10000, 100000), backend="segments", repeat=20, seed=0):
+    rows = []
+    for count in sizes:
+        rows.extend(bench_size(count, backend, repeat, seed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Collection page loads on synthetic data directories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Record counts to generate.")
+    parser.add_argument("--backend", choices=["segments", "json"], default="segments", help="Record store to write the records with.")
+    parser.add_argument("--repeat", type=int, default=20, help="Warm reruns per measurement.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated records.")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON.")
+    args = parser.parse_args(argv)
+
+    rows = benchmark(args.sizes, args.backend, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_rows(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Ingestion latency and throughput against the local fake Gemini API.
+
+Runs the real `process_audio` flow (hash, upload, generate, parse, save to
+the record store, index and embeddings) with `parampara_ai.fakes` standing
+in for `google.generativeai`, so only the fake's configured latency is
+simulated and everything else is this project's code:
+
+- `ingest.single`: end-to-end latency of one recording at a time, and the
+  pipeline's own overhead on top of the simulated API latency.
+- `ingest.batch`: throughput of `run_batch` at several concurrency levels,
+  with injected transient errors retried as in production.
+
+    python benchmarks/bench_ingest.py [--latency 0.05] [--jitter 0.2] [--error-rate 0.05] [--concurrency 1 4 16] [--json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import wave
+
+from common import percentiles, print_rows, row
+
+from parampara_ai.batch import BatchItem, run_batch
+from parampara_ai.fakes import FakeClient
+from parampara_ai.metrics import RequestMetrics
+from parampara_ai.pipeline import process_audio
+
+SAMPLE_RATE = 16000
+
+
+def write_test_audio(directory, count, seconds=1.0):
+    """Writes `count` distinct short mono WAV files and returns their paths."""
+    paths = []
+    for position in range(count):
+        path = os.path.join(directory, f"clip_{position:05d}.wav")
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            frames = int(seconds * SAMPLE_RATE)
+            wav.writeframes(position.to_bytes(4, "little") + bytes(2 * frames - 4)) # Distinct content per file
+        paths.append(path)
+    return paths
+
+
+def bench_single(requests=20, latency=0.05, upload_latency=0.01, jitter=0.2, seed=0):
+    """Sequential end-to-end latency; returns one result row."""
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths = write_test_audio(work_dir, requests)
+        client = FakeClient(upload_latency=upload_latency, latency=latency, latency_jitter=jitter, seed=seed)
+        model = client.GenerativeModel()
+        data_dir = os.path.join(work_dir, "data")
+        totals, overheads = [], []
+        stages = {}
+        for path in paths:
+            metrics = RequestMetrics()
+            start = time.perf_counter()
+            process_audio(path, "Telugu", client, model, data_dir=data_dir, metrics=metrics)
+            total = time.perf_counter() - start
+            totals.append(total)
+            overheads.append(total - metrics.stages["upload_file"] - metrics.stages["generate_content"])
+            for name, seconds in metrics.stages.items():
+                stages.setdefault(name, []).append(seconds)
+        stage_means = {f"stage_{name}_mean_s": sum(values) / len(values) for name, values in stages.items()}
+        return [row(
+            "ingest.single",
+            {"requests": requests, "latency_s": latency, "upload_latency_s": upload_latency, "jitter": jitter},
+            **percentiles(totals, "latency_s_"),
+            **percentiles(overheads, "overhead_s_"),
+            **stage_means,
+        )]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_batch(files=64, concurrency=(1, 2, 4, 8, 16), latency=0.05, upload_latency=0.01, jitter=0.2, error_rate=0.05, seed=0):
+    """Batch throughput at each concurrency level; returns one row per level."""
+    rows = []
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths = write_test_audio(work_dir, files)
+        for workers in concurrency:
+            client = FakeClient(upload_latency=upload_latency, latency=latency, latency_jitter=jitter, error_rate=error_rate, seed=seed)
+            model = client.GenerativeModel()
+            data_dir = os.path.join(work_dir, f"data_{workers}")
+            items = [BatchItem(name=os.path.basename(path), path=path) for path in paths]
+            start = time.perf_counter()
+            results = list(run_batch(
+                items, lambda item: process_audio(item.path, "Telugu", client, model, data_dir=data_dir),
+                max_workers=workers, max_retries=3, base_delay=0.01, max_delay=0.1,
+            ))
+            duration = time.perf_counter() - start
+            rows.append(row(
+                "ingest.batch",
+                {"files": files, "concurrency": workers, "latency_s": latency, "jitter": jitter, "error_rate": error_rate},
+                seconds=duration,
+                files_per_s=files / duration,
+                succeeded=sum(result.ok for result in results),
+                failed=sum(not result.ok for result in results),
+                attempts=sum(result.attempts for result in results),
+                injected_errors=model.rejected,
+                **percentiles([result.duration for result in results], "item_s_"),
+            ))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return rows
+
+
+def benchmark(latency=0.05, upload_latency=0.01, jitter=0.2, error_rate=0.05, requests=20, files=64, concurrency=(1, 2, 4, 8, 16), seed=0):
+    return (bench_single(requests, latency, upload_latency, jitter, seed)
+            + bench_batch(files, concurrency, latency, upload_latency, jitter, error_rate, seed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline against the fake Gemini API.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated generate_content latency in seconds.")
+    parser.add_argument("--upload-latency", type=float, default=0.01, help="Simulated upload_file latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency varies by up to this fraction either way.")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of calls failing with a transient 503 in the batch runs.")
+    parser.add_argument("--requests", type=int, default=20, help="Recordings in the single-item latency run.")
+    parser.add_argument("--files", type=int, default=64, help="Recordings in each batch run.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Worker counts for the batch runs.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the fake's error injection.")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON.")
+    args = parser.parse_args(argv)
+
+    rows = benchmark(args.latency, args.upload_latency, args.jitter, args.error_rate, args.requests, args.files, args.concurrency, args.seed)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_rows(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
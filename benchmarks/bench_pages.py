@@ -0,0 +1,128 @@
+"""Cold start and rerun time of the Streamlit pages.
+
+Each page runs headless with `streamlit.testing.v1.AppTest` in a fresh
+Python process, against a synthetic `data/` directory (see
+`bench_collection.write_records`) whose index and embeddings are already
+built, as on a running server:
+
+- `pages.cold`: the first run of the page in a new server process, with all
+  of its imports (`cold_s`), and whether the Gemini SDK got imported.
+  `AppTest` spends a second or two of every first run scanning installed
+  packages for components, which a real server does once at startup; that
+  is timed on an empty script (`harness_s`) and left out of `cold_s`.
+- `pages.rerun`: every later run, as on any widget interaction (`rerun_s_*`).
+
+    python benchmarks/bench_pages.py [--pages Home Upload Collection Analytics] [--records 10000] [--repeat 20]
+
+Needs `streamlit` installed; `GEMINI_API_KEY` is set to a dummy value, as
+no request is ever sent.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, percentiles, print_rows, row
+
+PAGES = {
+    "Home": "Home.py",
+    "Upload": os.path.join("pages", "Upload.py"),
+    "Collection": os.path.join("pages", "Collection.py"),
+    "Analytics": os.path.join("pages", "Analytics.py"),
+}
+SDK_MODULE = "google.generativeai"
+
+
+def measure_page(page, repeat):
+    """Runs in the child process (cwd holds `data/`): times the first run and `repeat` reruns."""
+    from streamlit.testing.v1 import AppTest
+
+    AppTest.from_string("import streamlit").run() # Start the test harness itself outside the measurement
+    start = time.perf_counter()
+    AppTest.from_string("import streamlit").run()
+    harness = time.perf_counter() - start
+    app = AppTest.from_file(os.path.join(ROOT, PAGES[page]), default_timeout=600)
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start - harness
+    reruns = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        app.run()
+        reruns.append(time.perf_counter() - start)
+    errors = [str(element.value) for element in app.exception]
+    return {"cold_s": cold, "harness_s": harness, "reruns": reruns, "sdk_imported": SDK_MODULE in sys.modules, "errors": errors}
+
+
+def bench_page(page, data_parent, repeat):
+    """Measures one page in a fresh interpreter; returns the result rows."""
+    env = dict(os.environ, GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "benchmark"))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", page, "--repeat", str(repeat)],
+        cwd=data_parent, env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(completed.stdout.splitlines()[-1])
+    if result["errors"]:
+        print(f"{page}: {result['errors'][0]}", file=sys.stderr)
+    params = {"page": page}
+    return [
+        row("pages.cold", params, cold_s=result["cold_s"], harness_s=result["harness_s"], sdk_imported=result["sdk_imported"], errors=len(result["errors"])),
+        row("pages.rerun", params, **percentiles(result["reruns"], "rerun_s_")),
+    ]
+
+
+def benchmark(pages=tuple(PAGES), records=10000, repeat=20, seed=0):
+    import bench_collection
+    from parampara_ai.embeddings import EmbeddingIndex
+    from parampara_ai.index import RecordIndex
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        data_dir = os.path.join(work_dir, "data")
+        bench_collection.write_records(data_dir, records, seed=seed)
+        previous_dir = os.getcwd()
+        os.chdir(work_dir) # Index as the pages open it: index locations include the `data` path they were made with
+        try:
+            record_index = RecordIndex("data")
+            record_index.sync()
+            EmbeddingIndex("data").sync(record_index)
+        finally:
+            os.chdir(previous_dir)
+        rows = []
+        for page in pages:
+            for result in bench_page(page, work_dir, repeat):
+                result["params"]["records"] = records
+                rows.append(result)
+        return rows
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Streamlit page cold starts and reruns.")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES), help="Pages to measure.")
+    parser.add_argument("--records", type=int, default=10000, help="Records in the synthetic data directory.")
+    parser.add_argument("--repeat", type=int, default=20, help="Reruns per page.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated records.")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON.")
+    parser.add_argument("--child", choices=list(PAGES), help=argparse.SUPPRESS) # Internal: measure one page in this process
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_page(args.child, args.repeat)))
+        return 0
+    rows = benchmark(args.pages, args.records, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_rows(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
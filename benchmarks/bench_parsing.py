@@ -0,0 +1,120 @@
+"""Parse success rate and parse time over the corpus of raw Gemini responses.
+
+Every line of `corpus/responses.jsonl` is one raw response with the outcome
+it should parse to (`expect.ok`, and the summary title when it parses). The
+corpus doubles as a regression suite: the run exits with status 1 when any
+response parses differently than expected, or when a parsed translation
+still carries the summary heading or JSON fence.
+
+    python benchmarks/bench_parsing.py [--repeat 200] [--json] [--verbose]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from common import row
+
+from parampara_ai.parsing import parse_response
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "responses.jsonl")
+
+
+def load_corpus(path=DEFAULT_CORPUS):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_case(case, parsed):
+    """Returns the ways `parsed` differs from what the case expects (empty when it matches)."""
+    expect = case["expect"]
+    problems = []
+    if parsed.ok != expect["ok"]:
+        problems.append(f"ok={parsed.ok}, expected {expect['ok']} ({parsed.error})")
+    if parsed.ok and "title" in expect and parsed.summary_data.get("title") != expect["title"]:
+        problems.append(f"title={parsed.summary_data.get('title')!r}, expected {expect['title']!r}")
+    translation = parsed.translated_text.lower()
+    if "summary json" in translation or "```" in translation:
+        problems.append("translation contains the summary heading or fence")
+    return problems
+
+
+def run(corpus, repeat=200):
+    """Parses every case `repeat` times; returns one result dict per case."""
+    results = []
+    for case in corpus:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parsed = parse_response(case["response"], case["language"])
+            timings.append(time.perf_counter() - start)
+        results.append({
+            "name": case["name"],
+            "ok": parsed.ok,
+            "expected_ok": case["expect"]["ok"],
+            "repairs": parsed.repairs,
+            "problems": check_case(case, parsed),
+            "bytes": len(case["response"].encode("utf-8")),
+            "median_us": statistics.median(timings) * 1e6,
+        })
+    return results
+
+
+def summarize(results):
+    timings = sorted(result["median_us"] for result in results)
+    parseable = [result for result in results if result["expected_ok"]]
+    return {
+        "cases": len(results),
+        "parsed": sum(result["ok"] for result in results),
+        "success_rate": sum(result["ok"] for result in parseable) / len(parseable) if parseable else 1.0,
+        "repaired": sum(bool(result["repairs"]) for result in results),
+        "regressions": [result["name"] for result in results if result["problems"]],
+        "median_us": statistics.median(timings),
+        "p95_us": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "mb_per_s": sum(result["bytes"] for result in results) / (sum(timings) / 1e6) / 1e6,
+    }
+
+
+def benchmark(corpus_path=DEFAULT_CORPUS, repeat=200):
+    """The corpus summary as one result row for `run_all.py`."""
+    summary = summarize(run(load_corpus(corpus_path), repeat=repeat))
+    regressions = summary.pop("regressions")
+    return [row("parsing.corpus", {"corpus": os.path.basename(corpus_path), "repeat": repeat},
+                **summary, regressions=len(regressions))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Gemini response parser against the recorded corpus.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON Lines corpus of raw responses.")
+    parser.add_argument("--repeat", type=int, default=200, help="Parses per response; the median is reported.")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON.")
+    parser.add_argument("--verbose", action="store_true", help="Show every case, not only regressions.")
+    args = parser.parse_args(argv)
+
+    results = run(load_corpus(args.corpus), repeat=args.repeat)
+    summary = summarize(results)
+    if args.json:
+        print(json.dumps({"summary": summary, "cases": results}, indent=2))
+    else:
+        for result in results:
+            if args.verbose or result["problems"]:
+                status = "FAIL" if result["problems"] else ("ok" if result["ok"] else "rejected")
+                repairs = f" [{', '.join(result['repairs'])}]" if result["repairs"] else ""
+                print(f"{status:8} {result['name']:32} {result['median_us']:8.1f} µs{repairs}")
+                for problem in result["problems"]:
+                    print(f"         {problem}")
+        print(
+            f"{summary['parsed']}/{summary['cases']} parsed, success rate {summary['success_rate']:.1%} on parseable responses, "
+            f"{summary['repaired']} repaired; median {summary['median_us']:.1f} µs, p95 {summary['p95_us']:.1f} µs, "
+            f"{summary['mb_per_s']:.1f} MB/s"
+        )
+        if summary["regressions"]:
+            print(f"Regressions: {', '.join(summary['regressions'])}")
+    return 1 if summary["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
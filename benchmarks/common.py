@@ -0,0 +1,83 @@
+"""Helpers shared by the benchmark scripts.
+
+Every benchmark returns a list of result rows, each a dict with the
+benchmark name, the parameters it ran with and the measured metrics:
+
+    {"benchmark": "ingest.batch", "params": {"concurrency": 4}, "metrics": {"files_per_s": 12.3}}
+
+`run_all.py` writes the rows together with the commit and machine details as
+one JSON document, and `compare.py` diffs two such documents.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT) # Run from a checkout without installing the package
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def row(benchmark, params, **metrics):
+    """One result row; float metrics are rounded to keep the files readable."""
+    return {
+        "benchmark": benchmark,
+        "params": params,
+        "metrics": {name: round(value, 6) if isinstance(value, float) else value for name, value in metrics.items()},
+    }
+
+
+def percentiles(samples, prefix=""):
+    """Mean, p50, p95 and max of `samples` as metrics named `<prefix>mean` etc."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        f"{prefix}mean": statistics.fmean(ordered),
+        f"{prefix}p50": ordered[len(ordered) // 2],
+        f"{prefix}p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        f"{prefix}max": ordered[-1],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Commit and machine details recorded with every results file."""
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(rows, path=None):
+    """Writes `rows` with the environment to `path` (default: results/<commit>.json); returns the path."""
+    document = {"environment": environment(), "results": rows}
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{document['environment']['commit'] or 'results'}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def print_rows(rows):
+    """Prints rows as aligned text, one per line."""
+    for result in rows:
+        params = ", ".join(f"{name}={value}" for name, value in result["params"].items())
+        metrics = ", ".join(f"{name}={value:.4g}" if isinstance(value, float) else f"{name}={value}" for name, value in result["metrics"].items())
+        print(f"{result['benchmark']:24} {params:40} {metrics}")
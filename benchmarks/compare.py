@@ -0,0 +1,90 @@
+"""Compares two results files written by `run_all.py`.
+
+Rows are matched by benchmark name and parameters, and every metric present
+in both is shown with its relative change. Timings (`*_s`, `*_s_p95`,
+`*_us`, ...) are better when lower and rates (`*_per_s`, `success_rate`)
+when higher; a change for the worse beyond `--threshold` is reported as a
+regression and makes the exit status 1, so the script can gate CI.
+
+    python benchmarks/compare.py OLD.json NEW.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("per_s", "rate", "parsed", "succeeded")
+LOWER_IS_BETTER = ("_s", "_us", "seconds", "failed", "regressions")
+
+
+def direction(metric):
+    """1 when a higher value is better, -1 when lower is better, 0 when neither."""
+    if any(marker in metric for marker in HIGHER_IS_BETTER):
+        return 1
+    if any(metric.endswith(marker) or f"{marker}_" in metric for marker in LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def _key(result):
+    return result["benchmark"], json.dumps(result["params"], sort_keys=True)
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold=0.1):
+    """Returns one dict per metric found in both documents."""
+    old_rows = {_key(result): result for result in old["results"]}
+    changes = []
+    for result in new["results"]:
+        previous = old_rows.get(_key(result))
+        if previous is None:
+            continue
+        for metric, value in result["metrics"].items():
+            before = previous["metrics"].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+                continue
+            change = (value - before) / before if before else 0.0
+            worse = -change * direction(metric)
+            changes.append({
+                "benchmark": result["benchmark"],
+                "params": result["params"],
+                "metric": metric,
+                "old": before,
+                "new": value,
+                "change": change,
+                "regression": worse > threshold,
+                "improvement": -worse > threshold,
+            })
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff two benchmark results files.")
+    parser.add_argument("old", help="Baseline results file.")
+    parser.add_argument("new", help="Results file to compare against the baseline.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression or improvement.")
+    parser.add_argument("--all", action="store_true", help="Show unchanged metrics too.")
+    args = parser.parse_args(argv)
+
+    old, new = load(args.old), load(args.new)
+    print(f"{old['environment']['commit']} -> {new['environment']['commit']}")
+    changes = compare(old, new, args.threshold)
+    for change in changes:
+        if not (args.all or change["regression"] or change["improvement"]):
+            continue
+        marker = "REGRESSION" if change["regression"] else ("improved" if change["improvement"] else "")
+        params = ", ".join(f"{name}={value}" for name, value in change["params"].items())
+        print(f"{marker:10} {change['benchmark']:20} {params:40} {change['metric']:24} "
+              f"{change['old']:>12.4g} -> {change['new']:<12.4g} {change['change']:+.1%}")
+    regressions = sum(change["regression"] for change in changes)
+    print(f"{len(changes)} metrics compared, {regressions} regressions, "
+          f"{sum(change['improvement'] for change in changes)} improvements (threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
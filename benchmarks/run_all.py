@@ -0,0 +1,62 @@
+"""Runs every benchmark and writes the results as one JSON document.
+
+The document (default: `benchmarks/results/<commit>.json`) records the
+commit, Python version and machine next to each result row, so two runs can
+be diffed with `compare.py`:
+
+    python benchmarks/run_all.py [--quick] [--only ingest parsing collection pages] [--output results.json]
+    python benchmarks/compare.py benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+
+import argparse
+import sys
+import time
+
+import bench_collection
+import bench_ingest
+import bench_pages
+import bench_parsing
+from common import print_rows, write_results
+
+BENCHMARKS = {
+    "ingest": (
+        lambda: bench_ingest.benchmark(),
+        lambda: bench_ingest.benchmark(requests=5, files=16, concurrency=(1, 4)),
+    ),
+    "parsing": (
+        lambda: bench_parsing.benchmark(),
+        lambda: bench_parsing.benchmark(repeat=20),
+    ),
+    "collection": (
+        lambda: bench_collection.benchmark(),
+        lambda: bench_collection.benchmark(sizes=(1000,), repeat=5),
+    ),
+    "pages": (
+        lambda: bench_pages.benchmark(),
+        lambda: bench_pages.benchmark(records=1000, repeat=5),
+    ),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and save the results.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="Benchmarks to run.")
+    parser.add_argument("--quick", action="store_true", help="Smaller runs (1k records, fewer requests) for a fast check.")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>.json).")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for name in args.only:
+        full, quick = BENCHMARKS[name]
+        start = time.perf_counter()
+        results = (quick if args.quick else full)()
+        print(f"# {name}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        print_rows(results)
+        rows.extend(results)
+    path = write_results(rows, args.output)
+    print(f"Results written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import streamlit as st
+import time
+from datetime import timedelta
+import os
+
+import pydeck as pdk
+
+from parampara_ai.appcontext import analytics_view, index_version
+
+st.set_page_config(page_title="Parampara AI Analytics", layout="wide")
+
+st.title("Parampara AI: Collection Analytics")
+st.markdown("Recordings by language and category over time, the most active contributors, and where recordings come from.")
+
+data_dir = "data"
+
+if not os.path.isdir(data_dir):
+    st.warning(f"The directory '{data_dir}' does not exist yet. Upload some recordings using the main app.")
+    st.stop()
+
+start_time = time.perf_counter()
+version = index_version(data_dir)
+
+# --- Period and grouping controls ---
+col_c1, col_c2 = st.columns(2)
+with col_c1:
+    period = st.date_input("📅 Date Range", value=(), key="analytics_dates")
+with col_c2:
+    granularity = st.selectbox("Group by", ["Day", "Week", "Month"], index=1, key="analytics_granularity")
+start, end = (period[0], period[1] + timedelta(days=1)) if len(period) == 2 else (None, None) # Inclusive end date, once both ends are picked
+freq = {"Day": "D", "Week": "W", "Month": "MS"}[granularity]
+top_n = st.session_state.get("analytics_top_n", 10)
+cell_degrees = st.session_state.get("analytics_cell", 0.25)
+
+# Aggregated from one metadata table per server process, cached until the record index changes
+view = analytics_view(data_dir, version, start, end, freq, top_n, cell_degrees)
+if view is None:
+    st.info("No recordings yet. Upload some using the main app.")
+    st.stop()
+
+# --- Headline numbers ---
+col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+col_m1.metric("Recordings", f"{view['recordings']:,}")
+col_m2.metric("Contributors", f"{view['contributors']:,}")
+col_m3.metric("Languages", f"{view['languages']:,}")
+col_m4.metric("With location", f"{view['located']:,}")
+
+# --- Counts over time ---
+st.subheader("🗣️ Recordings by Language")
+col_l1, col_l2 = st.columns([0.7, 0.3])
+with col_l1:
+    st.area_chart(view["language_counts"])
+with col_l2:
+    st.dataframe(view["language_totals"], use_container_width=True)
+
+st.subheader("📁 Recordings by Category")
+col_k1, col_k2 = st.columns([0.7, 0.3])
+with col_k1:
+    st.bar_chart(view["category_counts"])
+with col_k2:
+    st.dataframe(view["category_totals"], use_container_width=True)
+
+# --- Contributor leaderboard ---
+st.subheader("🏆 Top Contributors")
+st.slider("Contributors shown", min_value=5, max_value=50, value=10, key="analytics_top_n")
+st.dataframe(view["leaderboard"], use_container_width=True)
+
+# --- Geographic heatmap ---
+st.subheader("🗺️ Where Recordings Come From")
+st.select_slider("Grid size (degrees)", options=[0.05, 0.1, 0.25, 0.5, 1.0], value=0.25, key="analytics_cell")
+bins = view["location_bins"]
+if bins.empty:
+    st.info("No recordings with a latitude and longitude yet.")
+else:
+    st.pydeck_chart(pdk.Deck(
+        map_style=None,
+        initial_view_state=pdk.ViewState(
+            latitude=float(bins["latitude"].mean()), longitude=float(bins["longitude"].mean()), zoom=4,
+        ),
+        layers=[pdk.Layer(
+            "HeatmapLayer", data=bins, get_position=["longitude", "latitude"], get_weight="count",
+            radius_pixels=40, aggregation="SUM",
+        )],
+        tooltip=False,
+    ))
+    st.caption(f"{len(bins):,} grid cells from {int(bins['count'].sum()):,} located recordings.")
+
+st.caption(f"Computed in {(time.perf_counter() - start_time) * 1000:.0f} ms.")
+
+st.markdown("---")
+st.markdown("Developed with ❤️ by Dev_404")
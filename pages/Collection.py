@@ -1,21 +1,24 @@
 import streamlit as st
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-import glob # Import glob to find files matching a pattern
+
+from parampara_ai.appcontext import (count_records, embeddings_version, filter_options, index_version, load_record, record_page,
+                                     similar_records)
+from parampara_ai.recordstore import describe_location
 
 st.set_page_config(page_title="JSON Data Viewer", layout="centered")
 
 st.title("Parampara AI: Data Collection Viewer")
-st.markdown("This page allows you to browse and display details from JSON files stored in the `data/` directory. "
+st.markdown("This page allows you to browse and display the records stored under the `data/` directory "
+            "(the segment log in `data/segments/`, or one JSON file per record). "
             "It supports the transcription, translation, and structured summary output from the Gemini Audio App.")
 
 # --- Function to load data from a specific file ---
 def load_json_data(file_path):
-    """Loads JSON data from the given file path."""
+    """Loads a record from its location in the index (a JSON file or a segment-log offset), cached until the index changes."""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return load_record(file_path, data_dir, version)
     except FileNotFoundError:
         st.error(f"Error: File not found at {file_path}")
         return None
@@ -26,55 +29,94 @@ def load_json_data(file_path):
         st.error(f"An unexpected error occurred while reading {file_path}: {e}")
         return None
 
-# --- Find all JSON files in the 'data' directory ---
+# --- Format timestamps for display ---
+def format_timestamp(timestamp_str):
+    """Formats an ISO timestamp for the record selector, falling back to the raw string."""
+    if not timestamp_str:
+        return "Unknown Date"
+    try:
+        # Attempt to parse ISO format first, then basic strptime if that fails
+        return datetime.fromisoformat(timestamp_str).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        try:
+            return datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S.%f").strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return timestamp_str # Fallback to raw string
+
+# --- List records from the index in the 'data' directory ---
 data_dir = "data"
-json_files = []
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+records = []
+total_records = 0
+version = None
 if os.path.exists(data_dir) and os.path.isdir(data_dir):
-    # Sort files by modification time, newest first, for easier Browse of recent entries
-    json_files = sorted(glob.glob(os.path.join(data_dir, "*.json")), key=os.path.getmtime, reverse=True)
+    # The index only re-reads files that were added or changed since the last sync, and
+    # everything listed below is cached until its version changes, so reruns stay cheap
+    version = index_version(data_dir)
+    options = filter_options(data_dir, version)
+
+    # --- Full-text search over transcriptions, translations and summaries ---
+    search_text = st.text_input("🔍 Search recordings", placeholder="e.g., pottery, clay, మట్టి, मिट्टी", key="search_text").strip()
+
+    # --- Filters (applied inside the index, not in Python) ---
+    with st.expander("🔎 Filter Records", expanded=False):
+        col_f1, col_f2 = st.columns(2)
+        with col_f1:
+            filter_category = st.selectbox("📁 Category", ["All"] + options["category"], key="filter_category")
+            filter_username = st.selectbox("👤 Username", ["All"] + options["username"], key="filter_username")
+        with col_f2:
+            filter_language = st.selectbox("🗣️ Original Language", ["All"] + options["original_language"], key="filter_language")
+            filter_dates = st.date_input("📅 Date Range", value=(), key="filter_dates")
+
+    filters = {
+        "category": None if filter_category == "All" else filter_category,
+        "language": None if filter_language == "All" else filter_language,
+        "username": None if filter_username == "All" else filter_username,
+    }
+    if len(filter_dates) == 2: # Only apply once both ends of the range are picked
+        filters["start"] = filter_dates[0].isoformat()
+        filters["end"] = (filter_dates[1] + timedelta(days=1)).isoformat() # Inclusive end date
+
+    # --- Pagination: only the current page of records is loaded ---
+    total_records = count_records(data_dir, version, search_text, filters)
+    col_p1, col_p2 = st.columns(2)
+    with col_p2:
+        page_size = st.selectbox("Records per page", PAGE_SIZE_OPTIONS, index=1, key="page_size")
+    page_count = max(1, -(-total_records // page_size)) # Ceiling division
+    with col_p1:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1, key="page_number")
+    records = record_page(data_dir, version, search_text, filters, limit=page_size, page=page) # Best match or newest first
+    st.caption(f"Showing {len(records)} of {total_records} matching records.")
+    if search_text and records:
+        with st.expander("📄 Search Results", expanded=True):
+            for record in records:
+                st.markdown(f"**{format_timestamp(record['timestamp'])}** · {record['original_language'] or 'N/A'} · ID `{record['id'][:8]}`  \n{record['snippet']}")
 else:
     st.warning(f"The directory '{data_dir}' does not exist. Please create it and place your JSON files inside.")
 
-# --- File Selection Dropdown ---
+# --- Record Selection Dropdown ---
 selected_file = None
 data = None # Initialize data outside the if-else for wider scope
 
-if json_files:
-    # Present file names with a more user-friendly format (e.g., ID and timestamp if available)
-    file_options = []
-    for f_path in json_files:
-        temp_data = load_json_data(f_path)
-        if temp_data:
-            file_id = temp_data.get("id", "N/A")[:8] # Shorten ID for display
-            timestamp_str = temp_data.get("timestamp")
-            display_timestamp = "Unknown Date"
-            if timestamp_str:
-                try:
-                    # Attempt to parse ISO format first, then basic strptime if that fails
-                    timestamp_dt = datetime.fromisoformat(timestamp_str)
-                    display_timestamp = timestamp_dt.strftime("%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    try:
-                        timestamp_dt = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S.%f")
-                        display_timestamp = timestamp_dt.strftime("%Y-%m-%d %H:%M:%S")
-                    except ValueError:
-                        display_timestamp = timestamp_str # Fallback to raw string
-            file_options.append(f"{display_timestamp} - ID: {file_id} ({os.path.basename(f_path)})")
-        else:
-            file_options.append(f"Error reading: {os.path.basename(f_path)}")
+if records:
+    # Present records with a user-friendly label built from the index alone
+    records_by_path = {record["path"]: record for record in records}
 
-    selected_option = st.selectbox("Select a JSON entry to view:", file_options)
-    if selected_option and "ID: " in selected_option:
-        # Extract the original file path from the selected option
-        original_file_name = selected_option.split('(')[-1].rstrip(')')
-        selected_file = os.path.join(data_dir, original_file_name)
+    def format_record_option(path):
+        record = records_by_path[path]
+        return f"{format_timestamp(record['timestamp'])} - ID: {record['id'][:8]} ({record['original_language'] or 'N/A'}, {record['category'] or 'Uncategorized'})"
+
+    selected_file = st.selectbox("Select a JSON entry to view:", list(records_by_path), format_func=format_record_option)
+    if selected_file:
+        # Only the selected record is parsed
         data = load_json_data(selected_file)
-else:
-    st.info("No JSON files found in the 'data/' directory. Please upload or create some using the main app.")
+elif total_records == 0 and os.path.isdir(data_dir):
+    st.info("No matching records found in the 'data/' directory. Adjust the filters, or upload some using the main app.")
 
 # --- Display Data ---
 if data:
     st.subheader("📋 General Information")
+    st.caption(f"📁 Stored in {describe_location(selected_file)}")
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("ID", data.get("id", "N/A"))
@@ -150,6 +192,16 @@ if data:
     else:
         st.info("No structured summary data found for this entry.")
 
+    # --- Similar Recordings (embedding cosine similarity, across languages) ---
+    st.subheader("🧭 Similar Recordings")
+    similar = similar_records(data_dir, version, embeddings_version(data_dir), data.get("id"), k=5)
+    if similar:
+        for similar_record in similar:
+            st.markdown(f"**{similar_record['title']}** · {similar_record['original_language'] or 'N/A'} · {similar_record['category'] or 'Uncategorized'} · "
+                        f"ID `{similar_record['id'][:8]}` · similarity {similar_record['score']:.2f}")
+    else:
+        st.info("No similar recordings found yet.")
+
     with st.expander("⚙️ System Prompt Used for Gemini API"):
         st.code(data.get("system_prompt", "No system prompt recorded."), language="text")
 
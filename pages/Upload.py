@@ -2,37 +2,39 @@ import streamlit as st
 import tempfile
 import time
 import os
-import json
-import uuid
-from datetime import datetime
 import pathlib
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-# Load environment variables (ensure .env file exists with GEMINI_API_KEY)
-load_dotenv()
+from parampara_ai.appcontext import get_gemini, get_job_workers, get_metrics_recorder, get_result_cache
+from parampara_ai.batch import BatchItem, expand_archive, run_batch
+from parampara_ai.gemini import MissingAPIKeyError
+from parampara_ai.jobs import DONE, FAILED
+from parampara_ai.metrics import RequestMetrics
+from parampara_ai.pipeline import ResponseParseError, process_audio
+from parampara_ai.prompts import CATEGORIES, DEFAULT_LANGUAGE, INDIC_LANGUAGES
+from parampara_ai.preprocess import AudioToolError, describe_savings
+from parampara_ai.recordstore import describe_location
+from parampara_ai.segments import process_long_audio
+from parampara_ai.uploads import spool_upload
 
 # --- CONFIG ---
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Ensure GEMINI_API_KEY is set
-if not GEMINI_API_KEY:
-    st.error("GEMINI_API_KEY not found. Please set it in your .env file.")
+# Built once per server process (see parampara_ai.appcontext); the Gemini SDK is only
+# imported when the first recording is processed (ensure .env has GEMINI_API_KEY)
+try:
+    genai, model = get_gemini()
+except MissingAPIKeyError as e:
+    st.error(str(e))
     st.stop()
 
-# Configure the Gemini API with the API key
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Initialize Gemini model for audio processing
-# Using gemini-1.5-flash which supports multimodal input including audio
-model = genai.GenerativeModel("gemini-1.5-flash")
+result_cache = get_result_cache()
+metrics_recorder = get_metrics_recorder()
+job_queue, job_workers = get_job_workers()
 
 # --- Streamlit Page Setup ---
 st.set_page_config(page_title="Gemini Audio STT + Translation + Summary", layout="centered")
 
 st.title("Parampara AI: Audio Transcription, Translation & Summary")
 st.markdown("""
-Upload a short audio clip (10–30 seconds) in **any Indic language**.
+Upload a short audio clip (10–30 seconds) in **any Indic language**. For longer recordings such as interviews, turn on **long recording mode**.
 
 🧠 **Gemini (Google AI)** will transcribe it in the original language, translate it to **English**, and then generate a **structured summary**.
 
@@ -46,6 +48,11 @@ if "translated_text" not in st.session_state:
     st.session_state.translated_text = ""
 if "summary_data" not in st.session_state:
     st.session_state.summary_data = None # Will store dict {title, category, instructions}
+if "job_ids" not in st.session_state:
+    st.session_state.job_ids = [] # Background jobs submitted from this session, oldest first
+# A job ID in the URL lets the user leave the page and come back to the result
+if st.query_params.get("job") and st.query_params["job"] not in st.session_state.job_ids:
+    st.session_state.job_ids.append(st.query_params["job"])
 
 # --- User Metadata Section (using st.expander for a cleaner look) ---
 with st.expander("🧾 Additional Information (Optional)", expanded=False):
@@ -54,7 +61,7 @@ with st.expander("🧾 Additional Information (Optional)", expanded=False):
     with col1:
         username = st.text_input("👤 Your Name", key="username_input")
     with col2:
-        category = st.selectbox("📁 Category", ["Story", "Interview", "News", "Tutorial: Pottery", "Other"], key="category_select")
+        category = st.selectbox("📁 Category", CATEGORIES, key="category_select")
 
     col3, col4 = st.columns(2)
     with col3:
@@ -64,12 +71,7 @@ with st.expander("🧾 Additional Information (Optional)", expanded=False):
 
 # --- Language Selection Section ---
 st.subheader("Language Selection")
-# List of common Indic languages. You can expand this list as needed.
-indic_languages = [
-    "Hindi", "Bengali", "Marathi", "Telugu", "Tamil", "Gujarati",
-    "Kannada", "Malayalam", "Punjabi", "Odia", "Assamese", "Urdu", "Nepali", "Konkani"
-]
-selected_language = st.selectbox("Select the language of the audio file:", indic_languages, index=3) # Default to Telugu
+selected_language = st.selectbox("Select the language of the audio file:", INDIC_LANGUAGES, index=INDIC_LANGUAGES.index(DEFAULT_LANGUAGE))
 
 # --- File Upload Section ---
 st.subheader("Upload Audio")
@@ -77,203 +79,174 @@ audio_file = st.file_uploader("📤 Upload an audio file", type=["mp3", "wav", "
 
 temp_path = None # Initialize temp_path outside the if block
 
+# The upload is spooled to disk once and reused across reruns until the file changes;
+# the file is deleted then, or when the session ends (see SpooledUpload)
+spooled_upload = st.session_state.get("spooled_upload")
+spooled_file_id = st.session_state.get("spooled_file_id")
+if spooled_upload and (audio_file is None or audio_file.file_id != spooled_file_id or not os.path.exists(spooled_upload.path)):
+    spooled_upload.remove() # The previous upload was replaced or removed
+    spooled_upload = st.session_state.spooled_upload = None
+
 if audio_file is not None:
     ext = pathlib.Path(audio_file.name).suffix
-    # Create a temporary file to save the uploaded audio
-    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as temp_audio:
-        temp_audio.write(audio_file.read())
-        temp_path = temp_audio.name
-
-    st.audio(temp_path, format=f"audio/{ext.lstrip('.')}") # Display the audio player
+    if spooled_upload is None:
+        # Copy the upload to a temporary file in chunks, hashing it in the same pass
+        spooled_upload = spool_upload(audio_file, suffix=ext)
+        st.session_state.spooled_upload = spooled_upload
+        st.session_state.spooled_file_id = audio_file.file_id
+    temp_path = spooled_upload.path
+
+    st.audio(audio_file, format=f"audio/{ext.lstrip('.')}") # Display the audio player from the upload itself
+
+    long_audio_mode = st.toggle("🎞️ Long recording mode (split into overlapping segments transcribed in parallel)", value=False, key="long_audio_toggle")
+    if long_audio_mode:
+        col_l1, col_l2 = st.columns(2)
+        with col_l1:
+            segment_minutes = st.slider("Segment length (minutes)", min_value=1, max_value=15, value=5, key="segment_minutes")
+        with col_l2:
+            long_max_workers = st.slider("Segments processed in parallel", min_value=1, max_value=16, value=4, key="long_max_workers")
+    preprocess_audio = st.toggle("🎚️ Optimise the audio before uploading (mono, 16 kHz, silence trimmed, compressed)", value=True, key="preprocess_toggle")
+    background_mode = st.toggle("🕒 Process in the background (you can leave this page and come back)", value=True, key="background_toggle")
+    stream_response = False # Only a single request processed on this page can be shown as it streams
+    if not long_audio_mode and not background_mode:
+        stream_response = st.toggle("⚡ Show the transcription while Gemini is still generating (streaming)", value=True, key="stream_toggle")
 
     # --- Transcription & Translation & Summary Button ---
     if st.button("📝🌐✨ Process Audio with Gemini (Transcribe, Translate & Summarize)", use_container_width=True, type="primary"):
-        if temp_path: # Ensure temp_path exists before processing
-            audio_data = None # Initialize audio_data here for finally block
+        if temp_path and background_mode:
+            audio_metadata = {"username": username, "latitude": latitude, "longitude": longitude, "category": category, "audio_file": audio_file.name}
+            job_options = {"long": True, "segment_seconds": segment_minutes * 60, "max_workers": long_max_workers} if long_audio_mode else {}
+            if preprocess_audio:
+                job_options["preprocess"] = True
+            # Identical audio with the same settings reuses the earlier job instead of calling Gemini again
+            job_id = job_queue.submit(temp_path, selected_language, metadata=audio_metadata, options=job_options, audio_digest=spooled_upload.sha256)
+            job_workers.notify()
+            if job_id not in st.session_state.job_ids:
+                st.session_state.job_ids.append(job_id)
+            st.query_params["job"] = job_id
+        elif temp_path: # Ensure temp_path exists before processing
             try:
-                start_time = time.time()
+                live_transcript = st.empty()
+                live_translation = st.empty()
+
+                def show_partial_response(parser):
+                    """Renders the sections parsed so far while the response streams in."""
+                    if parser.original_lang_text:
+                        live_transcript.markdown(f"**📝 {selected_language} Transcript (live):**\n\n{parser.original_lang_text}")
+                    if parser.translated_text:
+                        live_translation.markdown(f"**🌍 English Translation (live):**\n\n{parser.translated_text}")
+
+                audio_metadata = {"username": username, "latitude": latitude, "longitude": longitude, "category": category, "audio_file": audio_file.name}
+                request_metrics = RequestMetrics()
+                if spooled_upload.write_seconds is not None:
+                    # Report the temp-file write once, with the first request for this upload
+                    request_metrics.stages["temp_file_write"] = spooled_upload.write_seconds
+                    spooled_upload.write_seconds = None
                 with st.spinner("Processing audio with Gemini AI (transcribing, translating & summarizing)... This might take a moment."):
-                    st.info(f"Attempting to upload audio file from temp_path: {temp_path}")
-                    audio_data = genai.upload_file(temp_path)
-                    
-                    if not audio_data or not audio_data.name:
-                        st.error("Failed to upload audio file to Gemini. 'audio_data' is invalid or upload failed.")
-                        # Raise a ValueError to be caught by the outer try-except block
-                        raise ValueError("Gemini file upload failed.")
-
-                    st.info(f"Audio file successfully uploaded to Gemini. File Name: {audio_data.name}, URI: {audio_data.uri}")
-
-                    # Construct the prompt for Gemini API - Adjusted to match Gemini's actual output format
-                    # Dynamically insert the selected_language here
-                    prompt_for_gemini = f"""Please transcribe the following audio in {selected_language}. Then, translate the {selected_language} transcription into fluent, natural English.
-                    Finally, analyze the English translation and provide a structured summary in JSON format.
-                    If the content is a tutorial (e.g., pottery), structure the summary with a "title", a "category" (e.g., "Pottery Tutorial"), and an "instructions" array where each element is a numbered step.
-                    If it's not a tutorial, provide a "title", a "category" (e.g., "General Summary"), and a "summary_text" field.
-                    Ensure the meaning, tone, and context are preserved throughout. The input corpus might contain a mix of other languages and grammatical errors. Focus on the essence of the content.
-
-                    Format your full response clearly as follows, including the markdown bolding and newlines:
-
-                    **{selected_language} Transcription:**
-                    [{selected_language} Transcribed Text Here]
-
-                    **English Translation:**
-                    [Translated English Text Here]
-
-                    **Summary JSON:**
-                    ```json
-                    {{
-                      "title": "Summary Title",
-                      "category": "Pottery Tutorial" or "General Summary",
-                      "instructions": [
-                        "1. First step...",
-                        "2. Second step...",
-                        ...
-                      ]
-                    }}
-                    ```
-                    OR
-                    ```json
-                    {{
-                      "title": "Summary Title",
-                      "category": "General Summary",
-                      "summary_text": "A concise summary of the content."
-                    }}
-                    ```
-                    """
-                    st.info("Sending request to Gemini model...")
-                    response = model.generate_content([
-                        {"role": "user", "parts": [
-                            {"text": prompt_for_gemini},
-                            audio_data # The audio file content
-                        ]}
-                    ])
-                    st.info("Received response from Gemini model.")
-
-                full_response_text = response.text
-                duration = time.time() - start_time
-                st.success(f"✅ Processing completed in {duration:.2f} seconds!")
-                st.markdown("---")
-                st.subheader("Raw Gemini API Response (for debugging):")
-                st.text(full_response_text)
-                st.markdown("---")
-
-
-                # Parse the response to extract Telugu, English, and JSON summary parts
-                # Adjusted prefixes to precisely match Gemini's output format
-                original_lang_prefix_marker = f"**{selected_language} Transcription:**" # Dynamic prefix
-                english_prefix_marker = "**English Translation:**"
-                summary_json_block_start_marker = "```json" # This is the crucial marker for the JSON content itself
-                summary_json_block_end_marker = "```"
-
-                # Find the markers
-                original_lang_start_idx = full_response_text.find(original_lang_prefix_marker)
-                english_start_idx = full_response_text.find(english_prefix_marker)
-                json_block_start_idx = full_response_text.find(summary_json_block_start_marker)
-                json_block_end_idx = full_response_text.find(summary_json_block_end_marker, json_block_start_idx + len(summary_json_block_start_marker))
-
-                st.info(f"Parsing indices: original_lang_start_idx={original_lang_start_idx}, english_start_idx={english_start_idx}, json_block_start_idx={json_block_start_idx}, json_block_end_idx={json_block_end_idx}")
-
-                # Ensure all markers are found and in a logical order
-                if (original_lang_start_idx != -1 and
-                    english_start_idx != -1 and
-                    json_block_start_idx != -1 and
-                    json_block_end_idx != -1 and
-                    original_lang_start_idx < english_start_idx < json_block_start_idx):
-                    
-                    # Extract original language text: from after its marker to before English marker, stripping newlines
-                    original_lang_text_raw = full_response_text[original_lang_start_idx + len(original_lang_prefix_marker):english_start_idx].strip()
-                    st.session_state.original_lang_text = original_lang_text_raw.strip() 
-
-                    # Extract English text: from after its marker to before JSON block marker, stripping newlines
-                    translated_text_raw = full_response_text[english_start_idx + len(english_prefix_marker):json_block_start_idx].strip()
-                    st.session_state.translated_text = translated_text_raw.strip()
-
-                    # Extract JSON string
-                    json_string = full_response_text[json_block_start_idx + len(summary_json_block_start_marker):json_block_end_idx].strip()
-                    try:
-                        st.session_state.summary_data = json.loads(json_string)
-                        st.success("✅ Transcription, Translation, and Summary extracted and parsed successfully!")
-                    except json.JSONDecodeError as e:
-                        st.error(f"Failed to parse Summary JSON. JSONDecodeError: {e}")
-                        st.text(f"Attempted to parse this JSON string:\n```json\n{json_string}\n```") # Display malformed JSON for debugging
-                        st.session_state.summary_data = None
+                    if long_audio_mode:
+                        segment_progress = st.progress(0.0, text="Transcribing segments...")
+                        result = process_long_audio(
+                            temp_path, selected_language, genai, model, metadata=audio_metadata,
+                            segment_seconds=segment_minutes * 60, max_workers=long_max_workers,
+                            on_progress=lambda done, total: segment_progress.progress(done / total, text=f"Transcribed {done} of {total} segments"),
+                            recorder=metrics_recorder,
+                            preprocess=preprocess_audio,
+                        )
+                    else:
+                        # Upload → generate → parse → save; identical audio, language, model and prompt is served from the cache
+                        result = process_audio(
+                            temp_path, selected_language, genai, model,
+                            metadata=audio_metadata,
+                            cache=result_cache,
+                            audio_digest=spooled_upload.sha256,
+                            recorder=metrics_recorder,
+                            metrics=request_metrics,
+                            stream=stream_response,
+                            on_update=show_partial_response,
+                            preprocess=preprocess_audio,
+                        )
+                live_transcript.empty()
+                live_translation.empty()
+
+                st.session_state.original_lang_text = result.parsed.original_lang_text
+                st.session_state.translated_text = result.parsed.translated_text
+                st.session_state.summary_data = result.parsed.summary_data
+                if long_audio_mode:
+                    st.success(f"✅ Long recording processed in {result.duration:.2f} seconds!")
+                elif result.cached:
+                    st.success(f"✅ Loaded previously processed result from cache in {result.duration:.2f} seconds (no Gemini API call needed)!")
                 else:
-                    st.error("Gemini API response did not contain all expected sections in the correct order, or parsing markers were not found. This means parsing failed.")
-                    st.info("Please examine the 'Raw Gemini API Response' above and the 'Parsing indices' to understand why.")
-                    st.session_state.original_lang_text = ""
-                    st.session_state.translated_text = ""
-                    st.session_state.summary_data = None
-
-
-                # --- Save Data Function ---
-                def save_data(transcription_original_lang, translation, summary, system_prompt, username_val, latitude_val, longitude_val, category_val, selected_lang_val):
-                    """Saves transcription, translation, and summary data to a JSON file."""
-                    os.makedirs("data", exist_ok=True) # Ensure 'data' directory exists
-                    file_id = str(uuid.uuid4()) # Generate a unique ID for the file
-                    data = {
-                        "id": file_id,
-                        "timestamp": datetime.now().isoformat(),
-                        "username": username_val if username_val else "Anonymous",
-                        "coordinates": {
-                            "latitude": latitude_val if latitude_val else None,
-                            "longitude": longitude_val if longitude_val else None
-                        },
-                        "category": category_val,
-                        "original_language": selected_lang_val, # Save the selected language
-                        "transcription_original_language": transcription_original_lang,
-                        "translation_english": translation,
-                        "summary_data": summary, # Add summary data here
-                        "system_prompt": system_prompt
-                    }
-                    file_path = f"data/{file_id}.json"
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        json.dump(data, f, ensure_ascii=False, indent=2)
-                    return file_id
-
-                # Save the data
-                if st.session_state.original_lang_text and st.session_state.translated_text and st.session_state.summary_data:
-                    file_id = save_data(
-                        transcription_original_lang=st.session_state.original_lang_text,
-                        translation=st.session_state.translated_text,
-                        summary=st.session_state.summary_data,
-                        system_prompt=prompt_for_gemini, # Use the prompt sent to Gemini
-                        username_val=username,
-                        latitude_val=latitude,
-                        longitude_val=longitude,
-                        category_val=category,
-                        selected_lang_val=selected_language # Pass the selected language
-                    )
-                    st.info(f"📁 Data saved as `data/{file_id}.json`")
+                    st.success(f"✅ Processing completed in {result.duration:.2f} seconds (first text after {result.time_to_first_text:.2f} seconds)!")
+                    with st.expander("Raw Gemini API Response (for debugging)"):
+                        st.text(result.raw_text)
+                if result.existing_record:
+                    st.info(f"📁 Already saved earlier as record `{result.file_id}` in {describe_location(result.location)}")
                 else:
-                    st.warning("Could not save data due to missing transcription, translation, or summary after successful API call and parsing attempt. Check logs for details.")
-
+                    st.info(f"📁 Record `{result.file_id}` saved in {describe_location(result.location)}")
+                if result.preprocessed is not None:
+                    st.caption(f"🎚️ Preprocessed: {describe_savings(result.preprocessed.to_dict(), result.metrics.fields.get('estimated_seconds_saved'))}")
+                with st.expander("⏱️ Stage Timings"):
+                    st.table([{"Stage": name, "Seconds": round(seconds, 3)} for name, seconds in result.metrics.stages.items()])
+
+            except ResponseParseError as pe:
+                st.session_state.original_lang_text = ""
+                st.session_state.translated_text = ""
+                st.session_state.summary_data = None
+                st.error(f"{pe} This means parsing failed, so the data was not saved.")
+                if pe.parsed is not None and pe.parsed.indices:
+                    st.info(f"Parsing indices: {', '.join(f'{name}={idx}' for name, idx in pe.parsed.indices.items())}")
+                st.subheader("Raw Gemini API Response (for debugging):")
+                st.text(pe.raw_text)
+            except AudioToolError as ae:
+                st.error(f"Could not split the recording: {ae}")
             except ValueError as ve:
                 st.error(f"A critical error occurred: {ve}")
             except Exception as e:
                 st.error(f"An unexpected error occurred during Gemini processing: {e}")
                 st.exception(e) # Display full traceback for debugging
-            finally:
-                # Clean up the temporary file and uploaded audio file
-                if temp_path and os.path.exists(temp_path):
-                    try:
-                        os.remove(temp_path)
-                        st.info(f"Cleaned up local temporary audio file: {temp_path}")
-                    except Exception as e:
-                        st.warning(f"Could not delete local temporary file {temp_path}: {e}")
-                
-                # Clean up the uploaded file from Gemini's storage
-                # Ensure audio_data is defined and has a name before attempting to delete
-                if audio_data and audio_data.name:
-                    try:
-                        genai.delete_file(audio_data.name)
-                        st.info(f"Cleaned up temporary Gemini uploaded file: {audio_data.name}")
-                    except Exception as e:
-                        st.warning(f"Could not delete Gemini uploaded file {audio_data.name}: {e}")
-                else:
-                    st.info("No Gemini uploaded file to clean up (or upload failed).")
         else:
             st.warning("Please upload an audio file first before clicking the process button.")
 
+# --- Background Jobs Section ---
+if st.session_state.job_ids:
+    latest_job = job_queue.get(st.session_state.job_ids[-1])
+    if latest_job and latest_job["status"] in (DONE, FAILED) and st.session_state.get("loaded_job_id") != latest_job["id"]:
+        # Show the newest finished job's result once, like a synchronous run
+        st.session_state.loaded_job_id = latest_job["id"]
+        if latest_job["status"] == DONE:
+            st.session_state.original_lang_text = latest_job["result"]["original_lang_text"]
+            st.session_state.translated_text = latest_job["result"]["translated_text"]
+            st.session_state.summary_data = latest_job["result"]["summary_data"]
+            saved = "already saved earlier" if latest_job["result"].get("existing_record") else "saved"
+            st.session_state.job_message = f"✅ Job finished in {latest_job['result']['duration']:.2f} seconds. Record `{latest_job['result']['file_id']}` {saved}"
+            if latest_job["result"].get("location"): # Not recorded by jobs finished before locations were
+                st.session_state.job_message += f" in {describe_location(latest_job['result']['location'])}"
+            if latest_job["result"].get("preprocessed"):
+                st.session_state.job_message += f"\n\n🎚️ Preprocessed: {describe_savings(latest_job['result']['preprocessed'], latest_job['result'].get('estimated_seconds_saved'))}"
+        else:
+            st.session_state.job_message = None
+
+    @st.fragment(run_every=2)
+    def show_job_status():
+        """Polls the job queue; reruns the page once the newest job has finished."""
+        jobs = [job for job in (job_queue.get(job_id) for job_id in st.session_state.job_ids) if job]
+        st.subheader("🕒 Background Jobs")
+        st.dataframe([{
+            "Job ID": job["id"],
+            "Status": job["status"],
+            "Submitted": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["created_at"])),
+            "Record ID": (job["result"] or {}).get("file_id", ""),
+            "Error": (job["error"] or "").splitlines()[0] if job["error"] else "",
+        } for job in reversed(jobs)], use_container_width=True)
+        if jobs and jobs[-1]["status"] in (DONE, FAILED) and st.session_state.get("loaded_job_id") != jobs[-1]["id"]:
+            st.rerun()
+        if jobs and jobs[-1]["status"] == FAILED:
+            st.error(f"The latest job failed: {jobs[-1]['error'].splitlines()[0]}")
+
+    show_job_status()
+    if st.session_state.get("job_message"):
+        st.success(st.session_state.job_message)
+
 # --- Display Transcription and Translation Sections ---
 if st.session_state.original_lang_text:
     st.subheader(f"📝 {selected_language} Transcript")
@@ -306,5 +279,75 @@ if st.session_state.summary_data:
         st.warning("Summary data found, but unexpected format or empty. Displaying raw JSON for debug:")
         st.json(summary) # Show raw JSON for debugging
 
+# --- Bulk Upload Section ---
+st.markdown("---")
+st.subheader("Bulk Upload")
+with st.expander("📦 Process many recordings at once (multiple files or a .zip archive)", expanded=False):
+    st.markdown("Every file is processed with the language and additional information selected above, "
+                "using the same Gemini flow as a single upload. Transient errors (rate limits, timeouts) are retried with backoff.")
+    bulk_files = st.file_uploader("📤 Upload audio files or zip archives", type=["mp3", "wav", "m4a", "mp4", "zip"], accept_multiple_files=True, key="bulk_files")
+    col_b1, col_b2 = st.columns(2)
+    with col_b1:
+        max_workers = st.slider("Concurrent Gemini requests", min_value=1, max_value=16, value=4, key="bulk_max_workers")
+    with col_b2:
+        max_retries = st.slider("Retries per file", min_value=0, max_value=5, value=3, key="bulk_max_retries")
+
+    if bulk_files and st.button("📦 Process All Files with Gemini", use_container_width=True):
+        bulk_metadata = {"username": username, "latitude": latitude, "longitude": longitude, "category": category}
+        bulk_digests = {} # Local path -> SHA-256 computed while spooling
+
+        def process_bulk_item(item):
+            """Runs the full upload → generate → parse → save flow for one bulk item."""
+            return process_audio(item.path, selected_language, genai, model, metadata=dict(bulk_metadata, audio_file=item.name), cache=result_cache,
+                                 audio_digest=bulk_digests.get(item.path), recorder=metrics_recorder, preprocess=preprocess_audio)
+
+        with tempfile.TemporaryDirectory() as bulk_dir:
+            # Copy uploads to disk and unpack archives so every item is a local audio file
+            bulk_items = []
+            for position, uploaded in enumerate(bulk_files):
+                spooled = spool_upload(uploaded, suffix=pathlib.Path(uploaded.name).suffix, dest_dir=bulk_dir)
+                if uploaded.name.lower().endswith(".zip"):
+                    archive_dir = os.path.join(bulk_dir, f"archive_{position:05d}")
+                    os.makedirs(archive_dir)
+                    bulk_items.extend(expand_archive(spooled.path, archive_dir))
+                else:
+                    bulk_items.append(BatchItem(name=uploaded.name, path=spooled.path))
+                    bulk_digests[spooled.path] = spooled.sha256
+
+            if not bulk_items:
+                st.warning("No audio files found in the uploaded files.")
+            else:
+                start_time = time.time()
+                progress_bar = st.progress(0.0, text=f"Processing {len(bulk_items)} files...")
+                status_table = st.empty()
+                status_rows = []
+                for done, batch_result in enumerate(run_batch(bulk_items, process_bulk_item, max_workers=max_workers, max_retries=max_retries), start=1):
+                    status_rows.append({
+                        "File": batch_result.item.name,
+                        "Status": ("✅ Already saved" if batch_result.result.existing_record else "✅ Cached" if batch_result.result.cached else "✅ Done") if batch_result.ok else "❌ Failed",
+                        "Record ID": batch_result.result.file_id if batch_result.ok else "",
+                        "Attempts": batch_result.attempts,
+                        "Seconds": round(batch_result.duration, 2),
+                        "Preprocessing": describe_savings(batch_result.result.preprocessed.to_dict()) if batch_result.ok and batch_result.result.preprocessed else "",
+                        "Error": "" if batch_result.ok else str(batch_result.error),
+                    })
+                    progress_bar.progress(done / len(bulk_items), text=f"Processed {done} of {len(bulk_items)} files")
+                    status_table.dataframe(status_rows, use_container_width=True)
+
+                succeeded = sum(1 for row in status_rows if row["Status"] != "❌ Failed")
+                duration = time.time() - start_time
+                if succeeded == len(bulk_items):
+                    st.success(f"✅ All {succeeded} files processed in {duration:.2f} seconds!")
+                else:
+                    st.warning(f"Processed {succeeded} of {len(bulk_items)} files in {duration:.2f} seconds. See the table above for errors.")
+
+cache_stats = result_cache.stats()
+job_counts = job_queue.counts()
+st.caption(f"Result cache: {cache_stats['entries']} entries, {cache_stats['hits']} hits, {cache_stats['misses']} misses · "
+           f"Jobs: {job_counts['queued']} queued, {job_counts['running']} running, {job_counts['failed']} failed")
+scheduler_stats = model.limiter.stats()
+st.caption(f"Gemini scheduler ({scheduler_stats['rpm']} RPM, {scheduler_stats['tpm']:,} TPM): {scheduler_stats['queue_depth']} waiting, "
+           f"{scheduler_stats['throttled']} throttled, {scheduler_stats['rate_limited']} rate-limited (429), {scheduler_stats['retries']} retries")
+
 st.markdown("---")
 st.markdown("Developed with ❤️ by Dev_404")
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""Parampara AI: helpers shared by the Streamlit pages."""
+
+__version__ = "1.0.0"
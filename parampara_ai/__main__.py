@@ -0,0 +1,3 @@
+from parampara_ai.cli import main
+
+raise SystemExit(main())
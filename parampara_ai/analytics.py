@@ -0,0 +1,167 @@
+"""Collection-wide aggregates for the analytics page.
+
+All aggregates are computed with pandas/NumPy over one columnar table of the
+indexed record metadata (id, timestamp, username, category, language and
+coordinates). The table is read straight from the record index, never from
+the record files, and `AnalyticsTable.refresh()` only fetches rows written
+since the previous refresh.
+"""
+
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from parampara_ai.index import RecordIndex
+
+COLUMNS = ["id", "timestamp", "username", "category", "original_language", "latitude", "longitude"]
+CATEGORICAL_COLUMNS = ["username", "category", "original_language"]
+
+
+class AnalyticsTable:
+    """Cached DataFrame of record metadata that refreshes incrementally.
+
+    Rows are fetched by SQLite rowid: a record that is added or re-indexed
+    gets a new rowid, so fetching rows above the last seen rowid picks up
+    both, and the newest copy of each ID wins. When rows disappear (records
+    deleted), the table is reloaded in full.
+    """
+
+    def __init__(self, record_index):
+        self.record_index = record_index
+        self.frame = self._empty()
+        self._max_rowid = 0
+        self._lock = threading.Lock() # One table is shared by every Streamlit session
+
+    @staticmethod
+    def _empty():
+        return _prepare(pd.DataFrame(columns=COLUMNS))
+
+    def _fetch(self, after_rowid):
+        with closing(sqlite3.connect(self.record_index.db_path, timeout=30)) as conn:
+            rows = pd.read_sql_query(
+                f"SELECT rowid AS _rowid, {', '.join(COLUMNS)} FROM records WHERE rowid > ? ORDER BY rowid",
+                conn, params=(after_rowid,),
+            )
+            total = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return rows, total
+
+    def refresh(self):
+        """Brings the table up to date with the index and returns it."""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self):
+        self.record_index.sync()
+        rows, total = self._fetch(self._max_rowid)
+        if not rows.empty:
+            self._max_rowid = int(rows["_rowid"].max())
+            new = _prepare(rows.drop(columns="_rowid"))
+            combined = pd.concat([self.frame, new], ignore_index=True) if len(self.frame) else new
+            self.frame = _prepare(combined.drop_duplicates("id", keep="last").reset_index(drop=True))
+        if len(self.frame) != total:
+            # Rows were deleted (or the index was rebuilt): start over
+            rows, _ = self._fetch(0)
+            self._max_rowid = int(rows["_rowid"].max()) if len(rows) else 0
+            self.frame = _prepare(rows.drop(columns="_rowid"))
+        return self.frame
+
+
+def _prepare(frame):
+    """Parses timestamps and stores repeated strings as categoricals."""
+    frame = frame.copy()
+    if not pd.api.types.is_datetime64_any_dtype(frame["timestamp"]):
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"], format="ISO8601", errors="coerce")
+    for column in CATEGORICAL_COLUMNS:
+        frame[column] = frame[column].astype("string").fillna("Unknown").astype("category")
+    for column in ("latitude", "longitude"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    return frame
+
+
+def load_table(data_dir="data"):
+    """Returns the analytics table for `data_dir` in one full read."""
+    return AnalyticsTable(RecordIndex(data_dir)).refresh()
+
+
+# --- Aggregates ---
+def filter_period(frame, start=None, end=None):
+    """Rows with `start <= timestamp < end` (either bound may be None)."""
+    mask = np.ones(len(frame), dtype=bool)
+    if start is not None:
+        mask &= (frame["timestamp"] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (frame["timestamp"] < pd.Timestamp(end)).to_numpy()
+    return frame[mask]
+
+
+def _period_starts(timestamps, freq):
+    """Floors datetime64 values to the start of their day ("D"), Monday-based week ("W") or month ("MS")."""
+    if freq == "MS":
+        return timestamps.astype("datetime64[M]").astype("datetime64[D]")
+    days = timestamps.astype("datetime64[D]")
+    if freq == "W":
+        # 1970-01-01 was a Thursday, so Mondays are 3 days before multiples of 7
+        day_numbers = days.astype(np.int64)
+        days = ((day_numbers + 3) // 7 * 7 - 3).astype("datetime64[D]")
+    return days
+
+
+def counts_over_time(frame, by="original_language", freq="W"):
+    """Recordings per period (rows) and value of `by` (columns).
+
+    `freq` is "D", "W" or "MS". Counting is a single `np.bincount` over
+    (period, category code) pairs.
+    """
+    timestamps = frame["timestamp"].to_numpy(dtype="datetime64[ns]")
+    dated = ~np.isnat(timestamps)
+    if not dated.any():
+        return pd.DataFrame()
+    periods, period_index = np.unique(_period_starts(timestamps[dated], freq), return_inverse=True)
+    categories = frame[by].cat.categories
+    codes = frame[by].cat.codes.to_numpy()[dated]
+    counts = np.bincount(period_index * len(categories) + codes, minlength=len(periods) * len(categories))
+    table = pd.DataFrame(counts.reshape(len(periods), len(categories)), index=pd.DatetimeIndex(periods, name="period"), columns=categories)
+    return table.loc[:, table.sum() > 0]
+
+
+def totals(frame, by):
+    """Recordings per value of `by`, largest first."""
+    return frame[by].value_counts().rename("recordings")
+
+
+def leaderboard(frame, n=10):
+    """Top `n` contributors by number of recordings."""
+    if frame.empty:
+        return pd.DataFrame(columns=["recordings", "languages", "categories", "first", "latest"])
+    board = frame.groupby("username", observed=True).agg(
+        recordings=("id", "size"),
+        languages=("original_language", "nunique"),
+        categories=("category", "nunique"),
+        first=("timestamp", "min"),
+        latest=("timestamp", "max"),
+    )
+    return board.nlargest(n, "recordings")
+
+
+def location_bins(frame, cell_degrees=0.25):
+    """Recording counts on a latitude/longitude grid, one row per non-empty cell.
+
+    Binning keeps the map payload small however many records there are; each
+    cell is reported at its centre.
+    """
+    latitude = frame["latitude"].to_numpy(dtype=float)
+    longitude = frame["longitude"].to_numpy(dtype=float)
+    valid = np.isfinite(latitude) & np.isfinite(longitude) & (np.abs(latitude) <= 90) & (np.abs(longitude) <= 180)
+    if not valid.any():
+        return pd.DataFrame(columns=["latitude", "longitude", "count"])
+    cells = np.floor(np.column_stack([latitude[valid], longitude[valid]]) / cell_degrees).astype(np.int64)
+    # One int64 key per cell makes the grouping a 1-D unique
+    width = int(np.ceil(360 / cell_degrees)) + 2
+    keys = (cells[:, 0] + width // 2) * width + (cells[:, 1] + width // 2)
+    unique_keys, counts = np.unique(keys, return_counts=True)
+    centres_lat = (unique_keys // width - width // 2 + 0.5) * cell_degrees
+    centres_lon = (unique_keys % width - width // 2 + 0.5) * cell_degrees
+    return pd.DataFrame({"latitude": centres_lat, "longitude": centres_lon, "count": counts})
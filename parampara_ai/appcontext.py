@@ -0,0 +1,232 @@
+"""Cached state shared by the Streamlit pages.
+
+Streamlit runs a page's whole script again on every interaction. What only
+needs doing once per server process (reading `.env`, the Gemini client and
+model, the result cache, the job workers, the record index) is built here
+with `st.cache_resource`. What the pages show from the collection (record
+listings, filter values, records, similar recordings, analytics aggregates)
+is kept with `st.cache_data`, keyed on `RecordIndex.version()`, so a rerun
+that changes nothing costs one `sync()` and no queries, and any new or
+changed record invalidates it. Similar recordings are also keyed on
+`EmbeddingIndex.version()`; the embeddings are caught up once per server
+process by a background thread (`start_embedding_sync`), never while a page
+renders.
+
+`get_gemini()` returns a `gemini.LazyClient`: the slow `google.generativeai`
+import happens when the first recording is processed, not when the Upload
+page first loads.
+"""
+
+import threading
+
+import streamlit as st
+from dotenv import load_dotenv
+
+from parampara_ai.index import RecordIndex
+from parampara_ai.storage import DATA_DIR
+
+CACHED_QUERIES = 256 # Per cached function: pages, searches and records kept per server
+
+
+# --- Per-process resources ---
+@st.cache_resource
+def load_environment():
+    """Loads `.env` (GEMINI_API_KEY, GEMINI_RPM, ...) once per server process."""
+    load_dotenv()
+
+
+@st.cache_resource
+def get_gemini():
+    """Returns the lazily configured client and the shared rate-limited model.
+
+    Every session's requests go through the same RateLimiter (GEMINI_RPM /
+    GEMINI_TPM), so bursts of uploads wait their turn instead of failing
+    with 429 errors. Raises `MissingAPIKeyError` (not cached) without a key.
+    """
+    from parampara_ai.gemini import LazyClient, create_model
+    from parampara_ai.ratelimit import RateLimiter
+
+    load_environment()
+    client = LazyClient()
+    return client, create_model(client, limiter=RateLimiter.from_env())
+
+
+@st.cache_resource
+def get_result_cache():
+    """Results of earlier runs, keyed on the audio content, language, model and prompt."""
+    from parampara_ai.cache import ResultCache
+
+    return ResultCache()
+
+
+@st.cache_resource
+def get_metrics_recorder():
+    """Per-stage latency of every processed recording, appended to data/metrics.jsonl."""
+    from parampara_ai.metrics import MetricsRecorder
+
+    return MetricsRecorder()
+
+
+@st.cache_resource
+def get_job_workers():
+    """Starts the background workers once per server process; jobs outlive reruns and sessions."""
+    from parampara_ai.jobs import JobQueue, WorkerPool, make_pipeline_handler
+
+    client, model = get_gemini()
+    job_queue = JobQueue()
+    workers = WorkerPool(job_queue, make_pipeline_handler(client, model, cache=get_result_cache(), recorder=get_metrics_recorder()))
+    return job_queue, workers.start()
+
+
+@st.cache_resource
+def get_record_index(data_dir=DATA_DIR):
+    return RecordIndex(data_dir)
+
+
+@st.cache_resource
+def get_analytics_table(data_dir=DATA_DIR):
+    """One metadata table per server process; each refresh only fetches rows added since the last one."""
+    from parampara_ai.analytics import AnalyticsTable
+
+    return AnalyticsTable(get_record_index(data_dir))
+
+
+@st.cache_resource
+def start_embedding_sync(data_dir=DATA_DIR, generation=0):
+    """Embeds records saved before the embedding index existed, in a background thread.
+
+    New records are embedded as they are saved; `parampara-ai storage
+    reindex` does the same catch-up from the command line. `generation`
+    (`EmbeddingIndex.generation()`) keys the cache, so an index discarded
+    as invalid is rebuilt by a new thread.
+    """
+    from parampara_ai.embeddings import EmbeddingIndex
+
+    thread = threading.Thread(target=EmbeddingIndex(data_dir).sync, args=(get_record_index(data_dir),),
+                              name="parampara-embedding-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def embeddings_version(data_dir=DATA_DIR):
+    """The embedding index version that keys `similar_records`; starts the catch-up on first use."""
+    from parampara_ai.embeddings import EmbeddingIndex
+
+    embeddings = EmbeddingIndex(data_dir)
+    start_embedding_sync(data_dir, embeddings.generation())
+    return embeddings.version()
+
+
+def index_version(data_dir=DATA_DIR):
+    """Syncs the record index and returns its version, the key of every cached query below."""
+    record_index = get_record_index(data_dir)
+    record_index.sync()
+    return record_index.version()
+
+
+# --- Cached queries (`version` is only there to key the cache) ---
+@st.cache_data(max_entries=CACHED_QUERIES)
+def filter_options(data_dir, version):
+    """Distinct categories, languages and usernames for the filter dropdowns."""
+    record_index = get_record_index(data_dir)
+    return {column: record_index.distinct(column) for column in ("category", "original_language", "username")}
+
+
+@st.cache_data(max_entries=CACHED_QUERIES)
+def count_records(data_dir, version, search_text="", filters=None):
+    record_index = get_record_index(data_dir)
+    if search_text:
+        return record_index.count_matches(search_text, **(filters or {}))
+    return record_index.count(**(filters or {}))
+
+
+def record_page(data_dir, version, search_text="", filters=None, limit=25, page=1):
+    """One page (1-based) of index rows as dicts: best match first with `search_text`, newest first otherwise."""
+    after = None if search_text else page_start(data_dir, version, filters, limit, page)
+    return _record_page(data_dir, version, search_text, filters, limit, page, after)
+
+
+@st.cache_data(max_entries=CACHED_QUERIES)
+def _record_page(data_dir, version, search_text, filters, limit, page, after):
+    record_index = get_record_index(data_dir)
+    if search_text:
+        rows = record_index.search(search_text, limit=limit, offset=(page - 1) * limit, **(filters or {}))
+    else:
+        rows = record_index.query(limit=limit, after=after, **(filters or {}))
+    return [dict(row) for row in rows]
+
+
+def page_start(data_dir, version, filters, page_size, page):
+    """The key of the last record before `page` of the listing, for `RecordIndex.query(after=...)`.
+
+    The keys found so far are kept in the session until the index, the
+    filters or the page size change. A page is located from the nearest
+    one already found, so stepping through the pages reads one page of
+    index keys at a time instead of every record before it.
+    """
+    listing = (data_dir, version, tuple(sorted((filters or {}).items())), page_size)
+    state = st.session_state.get("page_keys")
+    if state is None or state[0] != listing:
+        state = st.session_state["page_keys"] = (listing, {1: None})
+    keys = state[1]
+    if page not in keys:
+        nearest = min(keys, key=lambda known: abs(known - page))
+        keys[page] = get_record_index(data_dir).key_after((page - nearest) * page_size, after=keys[nearest], **(filters or {}))
+    return keys[page]
+
+
+@st.cache_data(max_entries=CACHED_QUERIES)
+def load_record(location, data_dir, version):
+    """The record at `location` (a JSON file or a segment-log offset)."""
+    from parampara_ai.recordstore import read_record
+
+    return read_record(location, data_dir)
+
+
+@st.cache_data(max_entries=CACHED_QUERIES)
+def similar_records(data_dir, version, embeddings, record_id, k=5):
+    """The `k` records most like `record_id`, as dicts with their score, title, language and category.
+
+    `embeddings` is `embeddings_version()`, so results refresh once the
+    background sync has embedded more records.
+    """
+    from parampara_ai.embeddings import EmbeddingIndex
+    from parampara_ai.recordstore import read_record
+
+    record_index = get_record_index(data_dir)
+    similar = []
+    for similar_id, score in EmbeddingIndex(data_dir).similar(record_id, k=k):
+        row = record_index.get(similar_id)
+        if row is None:
+            continue # Deleted since it was embedded
+        try:
+            title = (read_record(row["path"], data_dir).get("summary_data") or {}).get("title", "Untitled")
+        except (OSError, ValueError):
+            title = "Untitled"
+        similar.append({"id": similar_id, "score": score, "title": title,
+                        "original_language": row["original_language"], "category": row["category"]})
+    return similar
+
+
+@st.cache_data(max_entries=CACHED_QUERIES)
+def analytics_view(data_dir, version, start=None, end=None, freq="W", top_n=10, cell_degrees=0.25):
+    """Every aggregate on the Analytics page for one setting of its controls, or None without records."""
+    from parampara_ai.analytics import counts_over_time, filter_period, leaderboard, location_bins, totals
+
+    frame = get_analytics_table(data_dir).refresh()
+    if frame.empty:
+        return None
+    if start or end:
+        frame = filter_period(frame, start, end)
+    return {
+        "recordings": len(frame),
+        "contributors": frame["username"].nunique(),
+        "languages": frame["original_language"].nunique(),
+        "located": int(frame["latitude"].notna().sum()),
+        "language_counts": counts_over_time(frame, "original_language", freq),
+        "language_totals": totals(frame, "original_language"),
+        "category_counts": counts_over_time(frame, "category", freq),
+        "category_totals": totals(frame, "category"),
+        "leaderboard": leaderboard(frame, top_n),
+        "location_bins": location_bins(frame, cell_degrees),
+    }
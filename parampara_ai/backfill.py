@@ -0,0 +1,384 @@
+"""Re-processing existing records after a prompt or model change.
+
+Every record keeps the hash of the prompt it was made with and, since
+records started saving it, the model. `select_records` picks records by
+prompt hash, by model, by date, or because their prompt is no longer the
+current one. A backfill run stores its selection in `data/backfill.db` and
+checkpoints every record as it finishes, so an interrupted run resumes with
+only the records still to do.
+
+Records are re-run a few at a time on the caller's (rate-limited) model and
+saved with `storage.save_new_version`, which keeps the previous version in
+the history log. There are two modes:
+
+- `full`: the recording is uploaded and transcribed again with the current
+  prompt. It needs the audio, found from the record's `audio_file` (or by
+  that file name in `audio_dirs`); records without it are skipped.
+- `summary`: only the summary is regenerated from the stored English
+  translation, which works for every record. The summary's prompt hash and
+  model are saved as `summary_prompt_hash` and `summary_model`, and select
+  the record in summary mode in place of its own, so a record whose summary
+  is already current is not selected again.
+"""
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field
+
+from parampara_ai.batch import BatchItem, run_batch
+from parampara_ai.index import RecordIndex
+from parampara_ai.metrics import RequestMetrics, timed
+from parampara_ai.parsing import parse_response
+from parampara_ai.pipeline import ResponseParseError, generate, recover_summary
+from parampara_ai.prompts import (JSON_GENERATION_CONFIG, MODEL_NAME, build_prompt, build_segment_prompt,
+                                  build_summary_prompt)
+from parampara_ai.recordstore import PromptStore, read_record, scan_records
+from parampara_ai.segments import parse_summary_response
+from parampara_ai.storage import DATA_DIR, save_new_version
+
+BACKFILL_FILENAME = "backfill.db"
+MODES = ("full", "summary")
+
+# Stands in for the translation in the summary prompt whose hash is recorded
+SUMMARY_PLACEHOLDER = "[Stitched English Translation]"
+
+# Records saved before the model was recorded were all made with the default model of the time
+LEGACY_MODEL = "gemini-1.5-flash"
+
+PENDING, DONE, FAILED, SKIPPED = "pending", "done", "failed", "skipped"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    selection TEXT NOT NULL,
+    options TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_id TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    location TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    new_location TEXT,
+    finished_at REAL,
+    PRIMARY KEY (run_id, record_id)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (run_id, status);
+"""
+
+
+class AudioNotFoundError(FileNotFoundError):
+    """Raised in full mode when a record's recording cannot be found."""
+
+
+# --- Selection ---
+def record_prompt_hash(record):
+    """The hash of the prompt a record was made with (as stored in `data/prompts/`)."""
+    if record.get("system_prompt_hash"):
+        return record["system_prompt_hash"]
+    return PromptStore.hash(record.get("system_prompt") or "")
+
+
+def record_model(record):
+    return record.get("model") or LEGACY_MODEL
+
+
+def summary_prompt_hash(language):
+    """Hash of the summary prompt for `language`, with a placeholder for the translation it is given."""
+    return PromptStore.hash(build_summary_prompt(language, SUMMARY_PLACEHOLDER))
+
+
+def current_prompt_hashes(language, mode="full"):
+    """Hashes of the prompts a record in `language` would be made with today.
+
+    In full mode these are the single and long mode prompts, in summary
+    mode the summary prompt.
+    """
+    if mode == "summary":
+        return {summary_prompt_hash(language)}
+    long_prompt = f"{build_segment_prompt(language)}\n\n{build_summary_prompt(language, SUMMARY_PLACEHOLDER)}"
+    return {PromptStore.hash(build_prompt(language)), PromptStore.hash(long_prompt)}
+
+
+def select_records(data_dir=DATA_DIR, prompt_hashes=None, models=None, start=None, end=None, stale_prompt=False,
+                   mode="full"):
+    """Yields `(location, record)` for the records a backfill should re-run.
+
+    A record is selected when it matches every criterion given: its prompt
+    hash is one of `prompt_hashes`, its model one of `models`, its
+    timestamp within [`start`, `end`) (ISO strings), and with
+    `stale_prompt`, its prompt differs from the current one. In summary
+    mode, the prompt and model a record's summary was last regenerated with
+    (if it was) are used instead of the record's.
+    """
+    prompt_hashes = set(prompt_hashes) if prompt_hashes else None
+    models = set(models) if models else None
+    current = {}
+    for location, record in scan_records(data_dir):
+        timestamp = record.get("timestamp") or ""
+        if start and timestamp < start or end and timestamp >= end:
+            continue
+        model = record_model(record)
+        record_hash = record_prompt_hash(record)
+        if mode == "summary":
+            model = record.get("summary_model") or model
+            record_hash = record.get("summary_prompt_hash") or record_hash
+        if models is not None and model not in models:
+            continue
+        if prompt_hashes is not None and record_hash not in prompt_hashes:
+            continue
+        if stale_prompt:
+            language = record.get("original_language") or ""
+            if language not in current:
+                current[language] = current_prompt_hashes(language, mode)
+            if record_hash in current[language]:
+                continue
+        yield location, record
+
+
+# --- Checkpoints ---
+class BackfillStore:
+    """SQLite record of backfill runs and the progress of each of their records."""
+
+    def __init__(self, data_dir=DATA_DIR, db_path=None):
+        self.db_path = db_path or os.path.join(data_dir, BACKFILL_FILENAME)
+
+    def _connect(self):
+        """Opens a connection, creating the schema on first use."""
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=PERSIST") # Writes must not change data/'s mtime (see RecordIndex.sync)
+        conn.executescript(SCHEMA)
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        run = dict(row)
+        for name in ("selection", "options"):
+            run[name] = json.loads(run[name])
+        return run
+
+    def create_run(self, records, selection, options, batch_size=1000):
+        """Stores a new run over `(location, record)` pairs; returns its ID."""
+        run_id = str(uuid.uuid4())
+        total = 0
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT INTO runs (id, selection, options, created_at) VALUES (?, ?, ?, ?)",
+                    (run_id, json.dumps(selection), json.dumps(options), time.time()),
+                )
+            batch = []
+            for location, record in records:
+                batch.append((run_id, record["id"], location, PENDING))
+                if len(batch) >= batch_size:
+                    with conn:
+                        conn.executemany("INSERT OR IGNORE INTO items (run_id, record_id, location, status) VALUES (?, ?, ?, ?)", batch)
+                    total += len(batch)
+                    batch = []
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO items (run_id, record_id, location, status) VALUES (?, ?, ?, ?)", batch)
+                total += len(batch)
+                conn.execute("UPDATE runs SET total = ? WHERE id = ?", (total, run_id))
+        return run_id
+
+    def get_run(self, run_id):
+        with closing(self._connect()) as conn:
+            return self._to_dict(conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone())
+
+    def list_runs(self, limit=20):
+        """Returns the most recent runs, newest first."""
+        with closing(self._connect()) as conn:
+            return [self._to_dict(row) for row in conn.execute("SELECT * FROM runs ORDER BY created_at DESC LIMIT ?", (limit,))]
+
+    def latest_unfinished(self):
+        """Returns the newest run that still has records to do, or None."""
+        with closing(self._connect()) as conn:
+            return self._to_dict(conn.execute(
+                "SELECT * FROM runs WHERE finished_at IS NULL ORDER BY created_at DESC LIMIT 1"
+            ).fetchone())
+
+    def pending(self, run_id, retry_failed=False):
+        """Yields `(record_id, location)` for the records still to do."""
+        statuses = (PENDING, FAILED) if retry_failed else (PENDING,)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT record_id, location FROM items WHERE run_id = ? AND status IN ({', '.join('?' * len(statuses))}) ORDER BY rowid",
+                (run_id, *statuses),
+            ).fetchall()
+        for row in rows:
+            yield row["record_id"], row["location"]
+
+    def mark(self, run_id, record_id, status, attempts=0, error=None, new_location=None):
+        """Checkpoints one record's outcome."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE items SET status = ?, attempts = attempts + ?, error = ?, new_location = ?, finished_at = ? "
+                "WHERE run_id = ? AND record_id = ?",
+                (status, attempts, error, new_location, time.time(), run_id, record_id),
+            )
+
+    def finish_run(self, run_id):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+
+    def counts(self, run_id):
+        """Returns the number of the run's records in each status."""
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM items WHERE run_id = ? GROUP BY status", (run_id,)).fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, DONE, FAILED, SKIPPED)}
+
+    def failures(self, run_id, limit=20):
+        """Returns `(record_id, error)` for failed records."""
+        with closing(self._connect()) as conn:
+            return [tuple(row) for row in conn.execute(
+                "SELECT record_id, error FROM items WHERE run_id = ? AND status = ? LIMIT ?", (run_id, FAILED, limit),
+            )]
+
+
+# --- Re-processing ---
+def find_audio(record, audio_dirs=()):
+    """Returns the path of a record's recording, or raises `AudioNotFoundError`."""
+    audio_file = record.get("audio_file")
+    if audio_file:
+        if os.path.isfile(audio_file):
+            return audio_file
+        for directory in audio_dirs:
+            candidate = os.path.join(directory, os.path.basename(audio_file))
+            if os.path.isfile(candidate):
+                return candidate
+    raise AudioNotFoundError(f"No audio for record {record.get('id')} ({audio_file or 'audio file not recorded'})")
+
+
+def reprocess_record(record, client, model, mode="full", audio_dirs=(), model_name=MODEL_NAME, metrics=None):
+    """Re-runs one record with the current prompt and `model`; returns the updated fields."""
+    language = record.get("original_language") or ""
+    if mode == "summary":
+        with timed(metrics, "generate_content"):
+            response = model.generate_content(
+                build_summary_prompt(language, record.get("translation_english") or ""),
+                generation_config=JSON_GENERATION_CONFIG,
+            )
+        with timed(metrics, "parse"):
+            return {"summary_data": parse_summary_response(response.text), "summary_model": model_name,
+                    "summary_prompt_hash": summary_prompt_hash(language)}
+
+    audio_path = find_audio(record, audio_dirs)
+    prompt = build_prompt(language)
+    raw_text = generate(client, model, audio_path, prompt, metrics=metrics)
+    with timed(metrics, "parse"):
+        parsed = parse_response(raw_text, language)
+    recover_summary(model, language, parsed, metrics)
+    if not parsed.ok:
+        raise ResponseParseError(parsed.error or "Gemini response is missing a section.", raw_text, parsed)
+    return {
+        "transcription_original_language": parsed.original_lang_text,
+        "translation_english": parsed.translated_text,
+        "summary_data": parsed.summary_data,
+        "system_prompt": prompt,
+        "model": model_name,
+        "summary_prompt_hash": None, # The summary now comes from the record's own prompt and model
+        "summary_model": None,
+    }
+
+
+@dataclass
+class BackfillProgress:
+    """Counts for a run, with throughput and ETA over the records done in this session."""
+
+    total: int
+    done: int = 0
+    failed: int = 0
+    skipped: int = 0
+    processed: int = 0 # Finished in this session, whatever the outcome
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def remaining(self):
+        return max(0, self.total - self.done - self.failed - self.skipped)
+
+    @property
+    def throughput(self):
+        """Records finished per second in this session."""
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self):
+        return self.remaining / self.throughput if self.throughput else None
+
+    def describe(self):
+        eta = "unknown" if self.eta_seconds is None else f"{self.eta_seconds:.0f}s"
+        return (f"{self.done + self.failed + self.skipped}/{self.total} ({self.done} done, {self.failed} failed, "
+                f"{self.skipped} skipped), {self.throughput:.2f} records/s, ETA {eta}")
+
+
+def run_backfill(store, run_id, client, model, data_dir=DATA_DIR, max_workers=4, max_retries=3,
+                 retry_failed=False, on_progress=None, stop=None, recorder=None, base_delay=1.0, max_delay=30.0):
+    """Re-runs the run's remaining records, checkpointing each one; returns a `BackfillProgress`.
+
+    Records whose latest version was already written by this run (e.g. just
+    before an interruption) are marked done without calling the model again.
+    `on_progress(progress, batch_result)` is called after every record, and
+    setting the `stop` event finishes the records in progress and returns.
+    """
+    run = store.get_run(run_id)
+    options = run["options"]
+    mode, audio_dirs = options.get("mode", "full"), options.get("audio_dirs", [])
+    model_name = options.get("model", MODEL_NAME)
+    counts = store.counts(run_id)
+    progress = BackfillProgress(total=run["total"], done=counts[DONE], skipped=counts[SKIPPED],
+                                failed=0 if retry_failed else counts[FAILED])
+    record_index = RecordIndex(data_dir)
+    record_index.sync()
+
+    def process(item):
+        row = record_index.get(item.name)
+        location = row["path"] if row else item.path # The latest version, which may be newer than the selection
+        record = read_record(location, data_dir, resolve_prompt=False)
+        if record.get("backfill_run") == run_id:
+            return location # Written by this run before an interruption
+        metrics = RequestMetrics(model=model_name, language=record.get("original_language"), mode="backfill", backfill_mode=mode)
+        try:
+            updates = reprocess_record(record, client, model, mode, audio_dirs, model_name, metrics)
+            updates["backfill_run"] = run_id
+            with timed(metrics, "save_data"):
+                _, new_location = save_new_version(location, updates, data_dir)
+            metrics.outcome = "ok"
+        except Exception as e:
+            metrics.outcome = type(e).__name__
+            raise
+        finally:
+            if recorder is not None:
+                recorder.record(metrics)
+        return new_location
+
+    items = (BatchItem(name=record_id, path=location) for record_id, location in store.pending(run_id, retry_failed))
+    for result in run_batch(items, process, max_workers=max_workers, max_retries=max_retries,
+                            base_delay=base_delay, max_delay=max_delay, stop=stop):
+        if result.ok:
+            store.mark(run_id, result.item.name, DONE, result.attempts, new_location=result.result)
+            progress.done += 1
+        elif isinstance(result.error, AudioNotFoundError): # Nothing to retry until the audio turns up
+            store.mark(run_id, result.item.name, SKIPPED, result.attempts, error=str(result.error))
+            progress.skipped += 1
+        else:
+            store.mark(run_id, result.item.name, FAILED, result.attempts, error=f"{type(result.error).__name__}: {result.error}")
+            progress.failed += 1
+        progress.processed += 1
+        if on_progress:
+            on_progress(progress, result)
+    if store.counts(run_id)[PENDING] == 0:
+        store.finish_run(run_id)
+    return progress
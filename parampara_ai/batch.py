@@ -0,0 +1,155 @@
+"""Bulk processing of many recordings through a bounded worker pool."""
+
+import os
+import random
+import shutil
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Optional
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".mp4")
+
+# google.api_core exception names (and HTTP codes) worth retrying. Matching on
+# names keeps this module importable without the Gemini SDK installed.
+TRANSIENT_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+}
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class BatchItem:
+    """One file to process: a display name and a local path."""
+
+    name: str
+    path: str
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one batch item after all retries."""
+
+    item: BatchItem
+    result: Any = None # Whatever the worker returned
+    error: Optional[BaseException] = None
+    attempts: int = 0
+    duration: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def is_transient(exc):
+    """True for errors that are worth retrying (rate limits, timeouts, 5xx)."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if type(exc).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    return getattr(exc, "code", None) in TRANSIENT_STATUS_CODES
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Exponential backoff with full jitter for the given 1-based retry attempt."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def call_with_retries(fn, max_retries=3, base_delay=1.0, max_delay=30.0, sleep=time.sleep):
+    """Calls `fn()`, retrying transient errors with backoff.
+
+    Returns `(result, attempts)`; the last error is re-raised once retries
+    run out, with its `attempts` set. An error that already has `attempts`
+    was given up on by an inner retry layer (`RateLimitedModel`, or a nested
+    `call_with_retries` or `run_batch`) and passes straight through, so
+    stacked layers never multiply the number of calls.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(), attempt
+        except Exception as exc:
+            if getattr(exc, "attempts", None) is not None:
+                raise # Already retried further down
+            if attempt > max_retries or not is_transient(exc):
+                exc.attempts = attempt
+                raise
+            sleep(backoff_delay(attempt, base_delay, max_delay))
+
+
+def run_batch(items, worker, max_workers=4, max_retries=3, base_delay=1.0, max_delay=30.0, stop=None):
+    """Runs `worker(item)` for every item on a thread pool of `max_workers`.
+
+    Yields a `BatchResult` per item as soon as it finishes (in completion
+    order), so callers can report progress from their own thread. A failing
+    item never stops the rest of the batch.
+
+    Items are taken from the iterable only as workers free up (at most twice
+    `max_workers` wait at a time), so it can be a lazy generator. Once the
+    `stop` event is set no new items are started, and the batch ends when
+    those in progress have finished.
+    """
+    def run_one(item):
+        start_time = time.time()
+        try:
+            result, attempts = call_with_retries(
+                lambda: worker(item), max_retries=max_retries,
+                base_delay=base_delay, max_delay=max_delay,
+            )
+            return BatchResult(item, result=result, attempts=attempts, duration=time.time() - start_time)
+        except Exception as exc:
+            return BatchResult(item, error=exc, attempts=getattr(exc, "attempts", 1), duration=time.time() - start_time)
+
+    items = iter(items)
+    window = 2 * max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pending = set()
+        while True:
+            if stop is None or not stop.is_set():
+                pending.update(executor.submit(run_one, item) for item in islice(items, window - len(pending)))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def find_audio_files(directory, recursive=False):
+    """Returns batch items for the audio files in `directory`, sorted by path."""
+    paths = []
+    if recursive:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            paths.extend(os.path.join(root, name) for name in files)
+    else:
+        with os.scandir(directory) as entries:
+            paths.extend(entry.path for entry in entries if entry.is_file())
+    return [
+        BatchItem(name=os.path.relpath(path, directory), path=path)
+        for path in sorted(paths)
+        if path.lower().endswith(AUDIO_EXTENSIONS) and not os.path.basename(path).startswith(".")
+    ]
+
+
+def expand_archive(zip_path, dest_dir):
+    """Extracts the audio files in a zip archive and returns them as batch items.
+
+    Entries are flattened into `dest_dir` under their base names (prefixed with
+    their position to keep duplicates apart), which also guards against
+    path traversal in archive member names.
+    """
+    items = []
+    with zipfile.ZipFile(zip_path) as archive:
+        for position, info in enumerate(archive.infolist()):
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name.lower().endswith(AUDIO_EXTENSIONS) or name.startswith("."):
+                continue
+            target = os.path.join(dest_dir, f"{position:05d}_{name}")
+            with archive.open(info) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            items.append(BatchItem(name=info.filename, path=target))
+    return items
@@ -0,0 +1,152 @@
+"""Content-addressed cache of processed Gemini results.
+
+Results are keyed on a hash of the audio bytes together with the language,
+model name and prompt template, so re-uploading or retrying the same recording
+returns the stored transcription, translation and summary without another
+`upload_file`/`generate_content` round trip.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from parampara_ai.storage import DATA_DIR
+
+CACHE_FILENAME = "cache.db"
+HASH_CHUNK_SIZE = 1024 * 1024 # Read audio in 1 MiB chunks when hashing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """Returns the SHA-256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(audio_digest, language, model_name, prompt_template):
+    """Combines everything that determines a Gemini result into one cache key."""
+    key = hashlib.sha256()
+    for part in (audio_digest, language, model_name, prompt_template):
+        key.update(part.encode("utf-8"))
+        key.update(b"\0") # Separator, so ("ab", "c") and ("a", "bc") differ
+    return key.hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed result cache with age- and size-based eviction.
+
+    `max_age` is in seconds; entries older than that are never returned.
+    When the cache holds more than `max_entries` entries or `max_bytes` bytes
+    of stored results, the least recently used entries are evicted first.
+    """
+
+    def __init__(self, db_path=os.path.join(DATA_DIR, CACHE_FILENAME), max_entries=1000,
+                 max_bytes=64 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def _connect(self):
+        """Opens a connection, creating the schema on first use."""
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=PERSIST") # Writes must not change data/'s mtime (see RecordIndex.sync)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key):
+        """Returns the cached result for `key`, or None on a miss."""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT value FROM results WHERE key = ? AND created_at >= ?",
+                (key, now - self.max_age),
+            ).fetchone()
+            if row is None:
+                self._bump(conn, "misses")
+                return None
+            conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._bump(conn, "hits")
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Stores a JSON-serialisable result under `key` and evicts as needed."""
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        """Drops expired entries, then least recently used ones over the limits."""
+        expired = conn.execute(
+            "DELETE FROM results WHERE created_at < ?", (now - self.max_age,)
+        ).rowcount
+        evicted = 0
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            for key, size in conn.execute(
+                "SELECT key, size FROM results ORDER BY accessed_at ASC"
+            ).fetchall():
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                count -= 1
+                total -= size
+                evicted += 1
+        if expired or evicted:
+            self._bump(conn, "evictions", expired + evicted)
+
+    def stats(self):
+        """Returns entry count, stored bytes and the hit/miss/eviction counters."""
+        with closing(self._connect()) as conn:
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM stats"))
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+        }
+
+    def clear(self):
+        """Removes every cached result (the counters are kept)."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM results")
@@ -0,0 +1,380 @@
+"""Command-line entry point for running the ingestion pipeline without Streamlit.
+
+Example (e.g. from cron)::
+
+    parampara-ai process recordings/ --language Telugu --workers 4
+
+`parampara-ai worker` runs the background job queue filled by the upload page
+in a separate process, `parampara-ai export` writes the collection out as a
+dataset, and `parampara-ai backfill` re-processes existing records after a
+prompt or model change.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+
+from parampara_ai.batch import find_audio_files, run_batch
+from parampara_ai.export import FORMATS
+from parampara_ai.metrics import METRICS_FILENAME, MetricsRecorder, render_prometheus, summarize
+from parampara_ai.prompts import CATEGORIES, DEFAULT_LANGUAGE, INDIC_LANGUAGES, MODEL_NAME
+from parampara_ai.ratelimit import DEFAULT_RPM, DEFAULT_TPM, RateLimiter
+from parampara_ai.storage import DATA_DIR
+
+
+def add_rate_limit_arguments(parser):
+    parser.add_argument("--rpm", type=int, default=int(os.getenv("GEMINI_RPM", DEFAULT_RPM)),
+                        help=f"Gemini requests per minute to stay under (default: $GEMINI_RPM or {DEFAULT_RPM}).")
+    parser.add_argument("--tpm", type=int, default=int(os.getenv("GEMINI_TPM", DEFAULT_TPM)),
+                        help=f"Gemini tokens per minute to stay under (default: $GEMINI_TPM or {DEFAULT_TPM}).")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="parampara-ai", description="Parampara AI ingestion pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    process = subparsers.add_parser("process", help="Transcribe, translate and summarise a directory of audio files.")
+    process.add_argument("directory", help="Directory containing .mp3/.wav/.m4a/.mp4 files.")
+    process.add_argument("--language", default=DEFAULT_LANGUAGE, choices=INDIC_LANGUAGES, help="Language spoken in the recordings.")
+    process.add_argument("--recursive", action="store_true", help="Also process files in subdirectories.")
+    process.add_argument("--workers", type=int, default=4, help="Maximum concurrent Gemini requests (default: 4).")
+    process.add_argument("--retries", type=int, default=3, help="Retries per file for transient errors (default: 3).")
+    process.add_argument("--model", default=MODEL_NAME, help=f"Gemini model name (default: {MODEL_NAME}).")
+    process.add_argument("--data-dir", default=DATA_DIR, help=f"Where records are saved (default: {DATA_DIR}).")
+    process.add_argument("--long", action="store_true", help="Split each recording into overlapping segments transcribed in parallel.")
+    process.add_argument("--segment-seconds", type=int, default=300, help="Segment length in long mode (default: 300).")
+    process.add_argument("--overlap-seconds", type=int, default=10, help="Overlap between segments in long mode (default: 10).")
+    process.add_argument("--stream", action="store_true", help="Stream responses and parse them incrementally.")
+    process.add_argument("--no-cache", action="store_true", help="Always call Gemini, even for audio processed before.")
+    process.add_argument("--preprocess", action="store_true",
+                         help="Upload a mono 16 kHz copy with silence trimmed, compressed with Opus (needs ffmpeg for non-WAV files).")
+    add_rate_limit_arguments(process)
+    process.add_argument("--username", help="Contributor name saved with every record.")
+    process.add_argument("--category", default="Other", choices=CATEGORIES, help="Category saved with every record.")
+    process.add_argument("--latitude", help="Latitude saved with every record.")
+    process.add_argument("--longitude", help="Longitude saved with every record.")
+    process.set_defaults(func=run_process)
+
+    worker = subparsers.add_parser("worker", help="Run queued background jobs from the upload page.")
+    worker.add_argument("--workers", type=int, default=4, help="Jobs processed concurrently (default: 4).")
+    worker.add_argument("--retries", type=int, default=3, help="Retries per job for transient errors (default: 3).")
+    worker.add_argument("--model", default=MODEL_NAME, help=f"Gemini model name (default: {MODEL_NAME}).")
+    worker.add_argument("--data-dir", default=DATA_DIR, help=f"Directory holding the job queue (default: {DATA_DIR}).")
+    worker.add_argument("--once", action="store_true", help="Exit once the queue is empty instead of waiting for new jobs.")
+    add_rate_limit_arguments(worker)
+    worker.set_defaults(func=run_worker)
+
+    storage = subparsers.add_parser("storage", help="Migrate, compact or reindex the record segment log.")
+    storage.add_argument("action", choices=["migrate", "compact", "reindex"],
+                         help="migrate: move one-file-per-record JSON files into the segment log; "
+                              "compact: drop superseded record versions from sealed segments; "
+                              "reindex: bring the record index and the similar-records embeddings up to date.")
+    storage.add_argument("--data-dir", default=DATA_DIR, help=f"Directory holding the records (default: {DATA_DIR}).")
+    storage.add_argument("--keep-files", action="store_true", help="With migrate, leave the JSON files in place.")
+    storage.set_defaults(func=run_storage)
+
+    export = subparsers.add_parser("export", help="Export the collection as JSON Lines, CSV, Parquet or a Hugging Face dataset.")
+    export.add_argument("output", help="Directory the export is written to (and its watermark kept in).")
+    export.add_argument("--format", choices=FORMATS, default="jsonl",
+                        help="jsonl, csv, parquet (needs pyarrow) or hf: a Hugging Face dataset directory (default: jsonl).")
+    export.add_argument("--shards", type=int, default=1, help="Output files written in parallel (default: 1).")
+    export.add_argument("--language", action="append", help="Only records in this original language (repeatable).")
+    export.add_argument("--category", action="append", help="Only records in this category (repeatable).")
+    export.add_argument("--start", help="Only records saved on or after this date (YYYY-MM-DD).")
+    export.add_argument("--end", help="Only records saved on or before this date (YYYY-MM-DD).")
+    export.add_argument("--incremental", action="store_true", help="Only records added since the last export to OUTPUT.")
+    export.add_argument("--data-dir", default=DATA_DIR, help=f"Directory holding the records (default: {DATA_DIR}).")
+    export.set_defaults(func=run_export)
+
+    backfill = subparsers.add_parser("backfill", help="Re-process existing records with the current prompt and model.")
+    backfill.add_argument("action", choices=["run", "resume", "status"],
+                          help="run: select records and start a backfill; resume: continue an interrupted one; status: show progress.")
+    backfill.add_argument("run_id", nargs="?", help="With resume or status, the run (default: the latest unfinished run).")
+    backfill.add_argument("--prompt-hash", action="append", help="Select records made with this prompt hash (repeatable).")
+    backfill.add_argument("--stale-prompt", action="store_true", help="Select records made with an older prompt than the current one.")
+    backfill.add_argument("--from-model", action="append",
+                          help="Select records made with this model (repeatable; records that predate saving the model count as gemini-1.5-flash).")
+    backfill.add_argument("--start", help="Select records saved on or after this date (YYYY-MM-DD).")
+    backfill.add_argument("--end", help="Select records saved on or before this date (YYYY-MM-DD).")
+    backfill.add_argument("--mode", choices=["full", "summary"], default="full",
+                          help="full: transcribe the audio again (needs the recordings); summary: only regenerate the summary (default: full).")
+    backfill.add_argument("--audio-dir", action="append", default=[], help="Directory to look for recordings in by file name (repeatable).")
+    backfill.add_argument("--model", default=MODEL_NAME, help=f"Gemini model to re-run the records with (default: {MODEL_NAME}).")
+    backfill.add_argument("--workers", type=int, default=4, help="Records processed concurrently (default: 4).")
+    backfill.add_argument("--retries", type=int, default=3, help="Retries per record for transient errors (default: 3).")
+    backfill.add_argument("--retry-failed", action="store_true", help="With resume, also retry the records that failed.")
+    backfill.add_argument("--dry-run", action="store_true", help="With run, only count the selected records.")
+    backfill.add_argument("--data-dir", default=DATA_DIR, help=f"Directory holding the records (default: {DATA_DIR}).")
+    add_rate_limit_arguments(backfill)
+    backfill.set_defaults(func=run_backfill_command)
+
+    metrics = subparsers.add_parser("metrics", help="Summarise the per-stage latency log.")
+    metrics.add_argument("--data-dir", default=DATA_DIR, help=f"Directory holding {METRICS_FILENAME} (default: {DATA_DIR}).")
+    metrics.add_argument("--format", choices=["summary", "prometheus"], default="summary", help="Percentile table or Prometheus text format.")
+    metrics.set_defaults(func=run_metrics)
+    return parser
+
+
+def run_process(args):
+    """Processes every audio file in `args.directory`; returns the exit code."""
+    startup_start = time.perf_counter()
+    if not os.path.isdir(args.directory):
+        print(f"error: '{args.directory}' is not a directory", file=sys.stderr)
+        return 2
+    items = find_audio_files(args.directory, recursive=args.recursive)
+    if not items:
+        print(f"No audio files found in '{args.directory}'.", file=sys.stderr)
+        return 0
+
+    # The SDK import and client setup happen once per run, and only when there is work to do
+    from parampara_ai.cache import CACHE_FILENAME, ResultCache
+    from parampara_ai.gemini import MissingAPIKeyError, configure_client, create_model
+    from parampara_ai.pipeline import process_audio
+    from parampara_ai.preprocess import describe_savings
+    from parampara_ai.segments import process_long_audio
+
+    try:
+        client = configure_client()
+    except MissingAPIKeyError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    model = create_model(client, args.model, limiter=RateLimiter(args.rpm, args.tpm), max_retries=args.retries)
+    cache = None if args.no_cache else ResultCache(os.path.join(args.data_dir, CACHE_FILENAME))
+    recorder = MetricsRecorder(os.path.join(args.data_dir, METRICS_FILENAME))
+    metadata = {
+        "username": args.username,
+        "latitude": args.latitude,
+        "longitude": args.longitude,
+        "category": args.category,
+    }
+    startup_duration = time.perf_counter() - startup_start
+    print(f"Processing {len(items)} files with {args.model} ({args.workers} workers, startup {startup_duration:.2f}s)", file=sys.stderr)
+
+    def process_item(item):
+        item_metadata = dict(metadata, audio_file=os.path.abspath(item.path))
+        if args.long:
+            # Segments of one recording share the worker budget, so files run one at a time
+            return process_long_audio(item.path, args.language, client, model, metadata=item_metadata,
+                                      segment_seconds=args.segment_seconds, overlap_seconds=args.overlap_seconds,
+                                      max_workers=args.workers, max_retries=args.retries, data_dir=args.data_dir,
+                                      model_name=args.model, recorder=recorder, preprocess=args.preprocess)
+        return process_audio(item.path, args.language, client, model, metadata=item_metadata, cache=cache,
+                             model_name=args.model, data_dir=args.data_dir, stream=args.stream, recorder=recorder,
+                             preprocess=args.preprocess)
+
+    batch_start = time.perf_counter()
+    failed = 0
+    file_workers = 1 if args.long else args.workers
+    file_retries = 0 if args.long else args.retries # Long mode retries each segment instead
+    for batch_result in run_batch(items, process_item, max_workers=file_workers, max_retries=file_retries):
+        if batch_result.ok:
+            result = batch_result.result
+            source = "existing" if result.existing_record else "cached" if result.cached else "ok"
+            first_text = "" if result.time_to_first_text is None else f"\tfirst text {result.time_to_first_text:.2f}s"
+            savings = "" if result.preprocessed is None else f"\t{describe_savings(result.preprocessed.to_dict(), result.metrics.fields.get('estimated_seconds_saved'))}"
+            print(f"{source}\t{batch_result.item.name}\t{result.file_id}\t{batch_result.duration:.2f}s\t{batch_result.attempts}{first_text}{savings}")
+        else:
+            failed += 1
+            print(f"failed\t{batch_result.item.name}\t{batch_result.error}\t{batch_result.duration:.2f}s\t{batch_result.attempts}")
+    batch_duration = time.perf_counter() - batch_start
+
+    print(
+        f"Done: {len(items) - failed} succeeded, {failed} failed in {batch_duration:.2f}s "
+        f"({len(items) / batch_duration:.2f} files/s, startup {startup_duration:.2f}s)",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+def run_worker(args):
+    """Runs queued jobs until interrupted (or, with --once, until the queue is empty)."""
+    from parampara_ai.cache import CACHE_FILENAME, ResultCache
+    from parampara_ai.gemini import MissingAPIKeyError, configure_client, create_model
+    from parampara_ai.jobs import JobQueue, WorkerPool, make_pipeline_handler
+
+    try:
+        client = configure_client()
+    except MissingAPIKeyError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    queue = JobQueue(args.data_dir)
+    handler = make_pipeline_handler(
+        client, create_model(client, args.model, limiter=RateLimiter(args.rpm, args.tpm), max_retries=args.retries),
+        cache=ResultCache(os.path.join(args.data_dir, CACHE_FILENAME)),
+        recorder=MetricsRecorder(os.path.join(args.data_dir, METRICS_FILENAME)),
+        max_retries=args.retries, data_dir=args.data_dir, model_name=args.model,
+    )
+    workers = WorkerPool(queue, handler, num_workers=args.workers)
+    if args.once:
+        queue.requeue_stale()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            for _ in range(args.workers):
+                executor.submit(workers.drain)
+    else:
+        print(f"Waiting for jobs in {queue.db_path} ({args.workers} workers, Ctrl+C to stop)", file=sys.stderr)
+        workers.start()
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            print("Stopping after the jobs in progress...", file=sys.stderr)
+            workers.stop()
+    counts = queue.counts()
+    print(f"Jobs: {counts['queued']} queued, {counts['running']} running, {counts['done']} done, {counts['failed']} failed", file=sys.stderr)
+    return 0
+
+
+def run_storage(args):
+    """Migrates JSON records into the segment log, compacts it, or brings the indexes up to date."""
+    from parampara_ai.embeddings import EmbeddingIndex
+    from parampara_ai.index import RecordIndex
+    from parampara_ai.recordstore import SegmentLogStore, migrate_json_files
+
+    start = time.perf_counter()
+    record_index = RecordIndex(args.data_dir)
+    record_index.sync()
+    if args.action == "migrate":
+        migrated = migrate_json_files(args.data_dir, record_index=record_index, remove=not args.keep_files)
+        record_index.sync() # Index anything that was not indexed before
+        print(f"Migrated {migrated} records into {os.path.join(args.data_dir, 'segments')} in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    elif args.action == "reindex":
+        embedded = EmbeddingIndex(args.data_dir).sync(record_index)
+        print(f"Indexed {len(record_index)} records, embedded {embedded} new ones in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    else:
+        store = SegmentLogStore(args.data_dir)
+        before = sum(os.path.getsize(path) for path in store.segment_paths())
+        moved = store.compact(on_moved=record_index.relocate) # The index moves before the old segments go
+        record_index.mark_segments_indexed()
+        after = sum(os.path.getsize(path) for path in store.segment_paths())
+        print(f"Compacted {len(moved)} records: {before:,} -> {after:,} bytes in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0
+
+
+def date_range(args):
+    """Returns `(start, end)` ISO bounds for `--start`/`--end` dates, the end date included."""
+    start = date.fromisoformat(args.start).isoformat() if args.start else None
+    end = (date.fromisoformat(args.end) + timedelta(days=1)).isoformat() if args.end else None
+    return start, end
+
+
+def run_export(args):
+    """Streams the matching records to dataset files in `args.output`."""
+    from parampara_ai.export import ExportError, export_records
+
+    try:
+        start, end = date_range(args)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    try:
+        result = export_records(
+            args.data_dir, args.output, fmt=args.format, shards=max(1, args.shards), language=args.language,
+            category=args.category, start=start, end=end, incremental=args.incremental,
+            on_progress=lambda exported: print(f"Exported {exported} records...", file=sys.stderr, end="\r"),
+        )
+    except (ExportError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    for path in result.files:
+        print(path)
+    print(f"Exported {result.records} records ({result.skipped} skipped) to {len(result.files)} files in {result.seconds:.2f}s; "
+          f"watermark {result.watermark or 'unchanged'}", file=sys.stderr)
+    return 0
+
+
+def run_backfill_command(args):
+    """Starts, resumes or reports on a backfill run; returns the exit code."""
+    from parampara_ai.backfill import BackfillStore, run_backfill, select_records
+
+    store = BackfillStore(args.data_dir)
+    if args.action == "status":
+        runs = [store.get_run(args.run_id)] if args.run_id else store.list_runs()
+        for run in filter(None, runs):
+            counts = store.counts(run["id"])
+            state = "finished" if run["finished_at"] else "unfinished"
+            print(f"{run['id']}\t{state}\t{run['total']} records\t"
+                  + ", ".join(f"{count} {status}" for status, count in counts.items())
+                  + f"\t{json.dumps(run['selection'])}\t{json.dumps(run['options'])}")
+            for record_id, error in store.failures(run["id"], limit=5):
+                print(f"  failed\t{record_id}\t{error}")
+        return 0
+
+    if args.action == "run":
+        try:
+            start, end = date_range(args)
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+        selection = {"prompt_hashes": args.prompt_hash, "models": args.from_model, "start": start, "end": end,
+                     "stale_prompt": args.stale_prompt}
+        if not any(selection.values()):
+            print("error: select records with --prompt-hash, --stale-prompt, --from-model, --start or --end", file=sys.stderr)
+            return 2
+        if args.dry_run:
+            print(f"{sum(1 for _ in select_records(args.data_dir, mode=args.mode, **selection))} records selected", file=sys.stderr)
+            return 0
+        options = {"mode": args.mode, "audio_dirs": args.audio_dir, "model": args.model}
+        run_id = store.create_run(select_records(args.data_dir, mode=args.mode, **selection), selection, options)
+    else:
+        run = store.get_run(args.run_id) if args.run_id else store.latest_unfinished()
+        if run is None:
+            print("error: no backfill run to resume", file=sys.stderr)
+            return 2
+        run_id, options = run["id"], run["options"]
+
+    from parampara_ai.gemini import MissingAPIKeyError, configure_client, create_model
+    try:
+        client = configure_client()
+    except MissingAPIKeyError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    model = create_model(client, options["model"], limiter=RateLimiter(args.rpm, args.tpm), max_retries=args.retries)
+    recorder = MetricsRecorder(os.path.join(args.data_dir, METRICS_FILENAME))
+    print(f"Backfill {run_id}: {store.get_run(run_id)['total']} records, {options['mode']} mode with {options['model']} "
+          f"({args.workers} workers)", file=sys.stderr)
+
+    def report(progress, result):
+        status = "ok" if result.ok else f"failed\t{result.error}"
+        print(f"{status}\t{result.item.name}\t{result.duration:.2f}s\t{result.attempts}")
+        if progress.processed % 10 == 0:
+            print(progress.describe(), file=sys.stderr)
+
+    try:
+        progress = run_backfill(store, run_id, client, model, data_dir=args.data_dir, max_workers=args.workers,
+                                max_retries=args.retries, retry_failed=args.retry_failed, on_progress=report, recorder=recorder)
+    except KeyboardInterrupt:
+        print(f"Interrupted; continue with: parampara-ai backfill resume {run_id}", file=sys.stderr)
+        return 130
+    print(f"Done: {progress.describe()}", file=sys.stderr)
+    return 1 if progress.failed else 0
+
+
+def run_metrics(args):
+    """Prints per-stage latency percentiles (or Prometheus metrics) from the log."""
+    records = MetricsRecorder(os.path.join(args.data_dir, METRICS_FILENAME)).load()
+    if args.format == "prometheus":
+        sys.stdout.write(render_prometheus(records))
+        return 0
+    if not records:
+        print("No metrics recorded yet.", file=sys.stderr)
+        return 0
+    print(f"{'stage':<22}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}")
+    for name, stats in sorted(summarize(records).items(), key=lambda item: -item[1]["p95"]):
+        print(f"{name:<22}{stats['count']:>8}{stats['mean']:>10.3f}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['max']:>10.3f}")
+    return 0
+
+
+def main(argv=None):
+    load_dotenv() # Pick up GEMINI_API_KEY from a .env file, like the Streamlit app
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""Semantic similarity between records using locally computed embeddings.
+
+Every saved record is embedded from its English translation and summary, so
+recordings in different source languages that describe similar crafts or
+stories end up close together. Vectors are stored as one row each in a
+compact float16 matrix file that is appended to as records are saved and
+memory-mapped for queries; a parallel text file holds the record IDs.
+Appends hold an exclusive `flock` on `embeddings.lock` (plus a thread lock),
+so processes saving records at the same time keep the two files aligned.
+
+The default `HashingEmbedder` needs nothing beyond NumPy and runs on the CPU.
+Any object with `name`, `dim` and `embed(texts) -> ndarray` can replace it;
+the index is rebuilt automatically when the embedder changes.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows: appends are only serialised within one process
+    fcntl = None
+
+from parampara_ai.recordstore import read_record
+
+EMBEDDINGS_FILENAME = "embeddings.f16"
+IDS_FILENAME = "embeddings.ids"
+META_FILENAME = "embeddings.json"
+LOCK_FILENAME = "embeddings.lock"
+STORAGE_DTYPE = np.float16
+QUERY_BLOCK_ROWS = 16384 # Rows converted to float32 at a time while scoring
+
+STOP_WORDS = frozenset(
+    "a an and are as at be been but by for from had has have he her his i in into is it its of on or "
+    "our she so that the their them then there these they this to was we were which with you your".split()
+)
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    """Returns the process-wide lock guarding appends to the index at `path`."""
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _word_hashes(word):
+    """Hashes of a word and its character trigrams; words repeat, so this is mostly a cache hit."""
+    padded = f"#{word}#"
+    return (_feature_hash(word), *(_feature_hash(padded[i:i + 3]) for i in range(len(padded) - 2)))
+
+
+class HashingEmbedder:
+    """Bag-of-words embedding via the hashing trick.
+
+    Words, word bigrams and character trigrams (which match variants such as
+    pot/pots/pottery) are hashed into `dim` signed buckets and the result is
+    L2-normalised, so a dot product is the cosine similarity. Feature hashes
+    are cached and the buckets of a whole batch are summed in one
+    `np.bincount`.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-v1-{dim}"
+
+    def _hashes(self, text, hashes, weights):
+        """Appends the feature hashes and weights of `text`; returns how many were added."""
+        start = len(hashes)
+        words = [w for w in TOKEN_RE.findall(text.casefold()) if len(w) > 1 and w not in STOP_WORDS]
+        for word in words:
+            word_hashes = _word_hashes(word)
+            hashes.extend(word_hashes)
+            weights.append(1.0)
+            weights.extend([0.3] * (len(word_hashes) - 1)) # Trigrams
+        for first, second in zip(words, words[1:]):
+            hashes.append(_feature_hash(f"{first} {second}"))
+            weights.append(0.5)
+        return len(hashes) - start
+
+    def embed(self, texts):
+        """Returns a (len(texts), dim) float32 matrix of unit-length vectors."""
+        hashes, weights, counts = [], [], []
+        for text in texts:
+            counts.append(self._hashes(text, hashes, weights))
+        hashes = np.array(hashes, dtype=np.uint64)
+        weights = np.array(weights)
+        signed = np.where(hashes >> np.uint64(63), weights, -weights)
+        rows = np.repeat(np.arange(len(texts)), counts)
+        cells = rows * self.dim + (hashes % np.uint64(self.dim)).astype(np.int64)
+        vectors = np.bincount(cells, weights=signed, minlength=len(texts) * self.dim)
+        vectors = vectors.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+def embedding_text(record):
+    """Returns the text a record is embedded from (translation and summary)."""
+    summary = record.get("summary_data") or {}
+    if not isinstance(summary, dict):
+        summary = {}
+    instructions = summary.get("instructions") or []
+    if not isinstance(instructions, list):
+        instructions = [instructions]
+    title = summary.get("title") or ""
+    return "\n".join([
+        title, title, # The title is the densest description, so it counts twice
+        summary.get("summary_text") or "",
+        *[str(step) for step in instructions],
+        record.get("translation_english") or "",
+    ])
+
+
+class EmbeddingIndex:
+    """Append-only, memory-mapped matrix of record embeddings in `data_dir`."""
+
+    def __init__(self, data_dir="data", embedder=None):
+        self.data_dir = data_dir
+        self.embedder = embedder or HashingEmbedder()
+        self.vectors_path = os.path.join(data_dir, EMBEDDINGS_FILENAME)
+        self.ids_path = os.path.join(data_dir, IDS_FILENAME)
+        self.meta_path = os.path.join(data_dir, META_FILENAME)
+        self.lock_path = os.path.join(data_dir, LOCK_FILENAME)
+        self._row_bytes = self.embedder.dim * np.dtype(STORAGE_DTYPE).itemsize
+
+    # --- Storage ---
+    def _read_ids(self):
+        """Returns the stored IDs and the byte length of the complete lines holding them.
+
+        A last line without its newline is still being written (or was cut
+        short by a crash) and is left out.
+        """
+        try:
+            with open(self.ids_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        size = data.rfind(b"\n") + 1
+        return data[:size].decode("utf-8").splitlines(), size
+
+    @contextmanager
+    def _locked(self):
+        """Holds the append lock for this index, across threads and processes."""
+        with _lock_for(self.vectors_path):
+            os.makedirs(self.data_dir, exist_ok=True)
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file is closed
+                yield
+
+    def _is_valid(self, ids):
+        """True when the stored files were written by this embedder and hold a row for each of `ids`.
+
+        The vectors file may be longer than the IDs (an append in progress
+        writes the rows first), never shorter.
+        """
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                if json.load(f) != {"embedder": self.embedder.name, "dim": self.embedder.dim}:
+                    return False
+            vectors_size = os.path.getsize(self.vectors_path) if ids else 0
+        except (OSError, ValueError):
+            return False
+        return vectors_size >= len(ids) * self._row_bytes
+
+    def _reset(self):
+        """Discards the stored vectors and IDs (held under the append lock)."""
+        for path in (self.vectors_path, self.ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"embedder": self.embedder.name, "dim": self.embedder.dim}, f)
+
+    def add_many(self, records):
+        """Embeds and appends `(record_id, record)` pairs.
+
+        A record that is already indexed gets a new row; only its latest row
+        is used for queries.
+        """
+        records = list(records)
+        if not records:
+            return
+        vectors = self.embedder.embed([embedding_text(record) for _, record in records]).astype(STORAGE_DTYPE)
+        with self._locked():
+            ids, ids_size = self._read_ids()
+            if not self._is_valid(ids): # Another embedder's vectors, or a truncated file
+                self._reset()
+                ids, ids_size = [], 0
+            # Drop any half-written row or ID left behind by an interrupted append;
+            # vectors are written first, so readers never see an ID without its row
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(len(ids) * self._row_bytes)
+                f.write(vectors.tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.truncate(ids_size)
+                f.write("".join(f"{record_id}\n" for record_id, _ in records).encode("utf-8"))
+
+    def add(self, record_id, record):
+        """Embeds and appends a single record."""
+        self.add_many([(record_id, record)])
+
+    def _load(self):
+        """Returns (memory-mapped vectors, ids, row of each id's latest vector).
+
+        Files written by another embedder or dimension, or with fewer rows
+        than IDs (e.g. truncated by a full disk), are discarded rather than
+        mapped, and `sync()` then embeds every record again.
+        """
+        if not os.path.exists(self.meta_path):
+            return None, [], {}
+        ids, _ = self._read_ids()
+        if not ids:
+            return None, [], {}
+        if not self._is_valid(ids):
+            with self._locked():
+                if not self._is_valid(self._read_ids()[0]): # Still invalid once appends have finished
+                    self._reset()
+            return None, [], {}
+        matrix = np.memmap(self.vectors_path, dtype=STORAGE_DTYPE, mode="r", shape=(len(ids), self.embedder.dim))
+        return matrix, ids, {record_id: row for row, record_id in enumerate(ids)}
+
+    def __len__(self):
+        return len(self._load()[2])
+
+    def version(self):
+        """Returns a token that changes whenever vectors are appended (one `stat`)."""
+        try:
+            stat = os.stat(self.ids_path)
+        except FileNotFoundError:
+            return ""
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def generation(self):
+        """Returns a token that changes whenever the index is discarded and started again (one `stat`)."""
+        try:
+            return os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    # --- Keeping in sync with the record index ---
+    def sync(self, record_index):
+        """Embeds any record in `record_index` that has no vector yet.
+
+        Records are embedded as they are saved, so this only catches up on
+        records saved before the index existed or by other means; it reads
+        every ID from both indexes, so run it from `parampara-ai storage
+        reindex` or a background thread, not per request. Returns the number
+        of records added.
+        """
+        _, _, latest = self._load()
+        missing = record_index.ids() - latest.keys()
+        if not missing:
+            return 0
+        batch = []
+        for row in record_index.list_records():
+            if row["id"] not in missing:
+                continue
+            try:
+                batch.append((row["id"], read_record(row["path"], self.data_dir, resolve_prompt=False)))
+            except (OSError, ValueError):
+                continue
+        self.add_many(batch)
+        return len(batch)
+
+    # --- Queries ---
+    def query(self, vector, k=5, exclude=()):
+        """Returns the `k` most similar `(record_id, cosine)` pairs for `vector`."""
+        matrix, ids, latest = self._load()
+        if matrix is None:
+            return []
+        vector = np.asarray(vector, dtype=np.float32)
+        scores = np.empty(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), QUERY_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + QUERY_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ vector
+        # Rows superseded by a newer vector for the same record, and excluded IDs, never match
+        live = np.zeros(len(ids), dtype=bool)
+        live[list(latest.values())] = True
+        for record_id in exclude:
+            if record_id in latest:
+                live[latest[record_id]] = False
+        scores[~live] = -np.inf
+        k = min(k, int(live.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[row], float(scores[row])) for row in top]
+
+    def similar(self, record_id, k=5):
+        """Returns the `k` records most similar to `record_id` (excluding itself)."""
+        matrix, _, latest = self._load()
+        if matrix is None or record_id not in latest:
+            return []
+        vector = np.asarray(matrix[latest[record_id]], dtype=np.float32)
+        return self.query(vector, k=k, exclude=(record_id,))
+
+    def search_text(self, text, k=5):
+        """Returns the `k` records most similar to free text."""
+        return self.query(self.embedder.embed([text])[0], k=k)
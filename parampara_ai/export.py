@@ -0,0 +1,383 @@
+"""Streaming export of the collection to dataset formats.
+
+`export_records` reads every record once, sequentially (see
+`recordstore.iter_records`), keeps those matching the language, category and
+date filters, and writes them as JSON Lines, CSV, Parquet or a Hugging
+Face-style dataset directory. Records are never collected in memory: they
+are handed to one writer thread per output shard through small bounded
+queues, so a large corpus is written to several files in parallel while the
+reader keeps going.
+
+Every export directory holds an `_export_state.json` watermark (the newest
+record timestamp exported so far). With `incremental=True` only records
+newer than the watermark are written, as a new set of shard files next to
+the earlier ones, so the directory always holds the whole corpus exactly
+once. A record's timestamp is taken just before it is written, so one saved
+while an export runs can appear with a timestamp below the watermark: each
+run therefore also re-reads the `OVERLAP_SECONDS` before the watermark, and
+the state remembers the records exported in that window so none is written
+twice. The watermark only advances when every shard was written, and a full
+(non-incremental) export replaces the shard files of earlier runs once it
+has succeeded.
+
+A record re-processed by `parampara-ai backfill` gets a newer `updated_at`,
+so the next incremental export writes it again; readers combining the runs
+should keep the last row of each `id`.
+
+Parquet output needs `pyarrow` (`pip install "parampara_ai[export]"`).
+"""
+
+import csv
+import json
+import os
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from parampara_ai.recordstore import PromptStore, iter_records
+
+FORMATS = ("jsonl", "csv", "parquet", "hf")
+STATE_FILENAME = "_export_state.json" # Leading underscore: Parquet and Spark readers skip it
+HF_DATA_DIRNAME = "data"
+HF_SPLIT = "train"
+QUEUE_ROWS = 1000 # Rows waiting per shard writer; bounds the memory used
+OVERLAP_SECONDS = 3600 # Incremental exports re-read this much before the watermark for records saved late
+PARQUET_ROW_GROUP_ROWS = 5000
+SHARD_NAME_RE = re.compile(r"^(part|train)-(\d{5})-\d{5}-of-\d{5}\.(jsonl|csv|parquet)$")
+
+COLUMNS = [
+    "id", "timestamp", "original_language", "category", "username", "latitude", "longitude",
+    "audio_file", "transcription", "translation", "summary_title", "summary", "system_prompt_hash",
+]
+NUMERIC_COLUMNS = ("latitude", "longitude")
+
+
+class ExportError(RuntimeError):
+    """Raised when an export cannot be written (e.g. Parquet without pyarrow)."""
+
+
+@dataclass
+class ExportResult:
+    """What one export run wrote."""
+
+    files: list = field(default_factory=list)
+    records: int = 0
+    skipped: int = 0 # Records left out by the filters or the watermark
+    watermark: str = ""
+    seconds: float = 0.0
+
+
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def export_row(record):
+    """Returns the exported columns of one record (the summary stays a dict)."""
+    summary = record.get("summary_data")
+    coordinates = record.get("coordinates") or {}
+    prompt_hash = record.get("system_prompt_hash")
+    if prompt_hash is None and record.get("system_prompt") is not None: # Written by the JSON-file backend
+        prompt_hash = PromptStore.hash(record["system_prompt"])
+    return {
+        "id": record.get("id"),
+        "timestamp": record.get("timestamp") or "",
+        "original_language": record.get("original_language"),
+        "category": record.get("category"),
+        "username": record.get("username"),
+        "latitude": _coordinate(coordinates.get("latitude")),
+        "longitude": _coordinate(coordinates.get("longitude")),
+        "audio_file": record.get("audio_file"),
+        "transcription": record.get("transcription_original_language") or "",
+        "translation": record.get("translation_english") or "",
+        "summary_title": summary.get("title") if isinstance(summary, dict) else None,
+        "summary": summary,
+        "system_prompt_hash": prompt_hash,
+    }
+
+
+def watermark_of(record):
+    """The value incremental exports compare against: when the record was last written."""
+    return record.get("updated_at") or record.get("timestamp") or ""
+
+
+def window_start(watermark, overlap=OVERLAP_SECONDS):
+    """The earliest watermark an incremental export after `watermark` still reads."""
+    try:
+        return (datetime.fromisoformat(watermark) - timedelta(seconds=overlap)).isoformat()
+    except ValueError:
+        return watermark
+
+
+def _in_window(marks, watermark):
+    """The `{record ID: watermark}` entries inside the overlap window before `watermark`."""
+    cutoff = window_start(watermark)
+    return {record_id: mark for record_id, mark in marks.items() if mark > cutoff}
+
+
+def _as_set(values):
+    if values is None:
+        return None
+    return {values} if isinstance(values, str) else set(values)
+
+
+def record_filter(language=None, category=None, start=None, end=None, since=None, exported=None):
+    """Returns a predicate for records, like `RecordIndex.query()`'s filters.
+
+    `language` and `category` are one value or several; `start` (inclusive)
+    and `end` (exclusive) are ISO timestamp prefixes, and `since` is a
+    watermark the record must be newer than. `exported` maps record IDs to
+    the watermark they were already exported with; those versions are left
+    out.
+    """
+    exported = exported or {}
+
+    languages, categories = _as_set(language), _as_set(category)
+
+    def matches(record):
+        timestamp = record.get("timestamp") or ""
+        return ((languages is None or record.get("original_language") in languages)
+                and (categories is None or record.get("category") in categories)
+                and (not start or timestamp >= start)
+                and (not end or timestamp < end)
+                and (not since or watermark_of(record) > since)
+                and exported.get(record.get("id")) != watermark_of(record))
+
+    return matches
+
+
+# --- Shard writers: write(row) for every row, then close() ---
+class JsonlWriter:
+    extension = ".jsonl"
+
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class CsvWriter:
+    """One row per record; the summary is a JSON string in its column."""
+
+    extension = ".csv"
+
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(dict(row, summary=json.dumps(row["summary"], ensure_ascii=False)))
+
+    def close(self):
+        self._file.close()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError('Parquet export needs pyarrow: pip install "parampara_ai[export]"') from None
+    return pyarrow
+
+
+class ParquetWriter:
+    """Writes row groups of `PARQUET_ROW_GROUP_ROWS`; the summary is a JSON string column."""
+
+    extension = ".parquet"
+
+    def __init__(self, path):
+        pa = _import_pyarrow()
+        self._pa = pa
+        self._schema = pa.schema([(name, pa.float64() if name in NUMERIC_COLUMNS else pa.string()) for name in COLUMNS])
+        self._writer = pa.parquet.ParquetWriter(path, self._schema, compression="zstd")
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(dict(row, summary=json.dumps(row["summary"], ensure_ascii=False)))
+        if len(self._rows) >= PARQUET_ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def _writer_class(fmt):
+    if fmt == "jsonl":
+        return JsonlWriter
+    if fmt == "csv":
+        return CsvWriter
+    if fmt == "parquet":
+        _import_pyarrow() # Fail before anything is written
+        return ParquetWriter
+    try: # Hugging Face layout: Parquet when available, JSON Lines otherwise
+        _import_pyarrow()
+        return ParquetWriter
+    except ExportError:
+        return JsonlWriter
+
+
+# --- Export state ---
+def load_state(output_dir):
+    """Returns the export directory's state (watermark, runs, format), or an empty one."""
+    try:
+        with open(os.path.join(output_dir, STATE_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILENAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path) # A crash never leaves a half-written watermark
+
+
+def _write_dataset_card(output_dir, extension):
+    """README.md with the config `datasets.load_dataset(output_dir)` reads."""
+    card = (
+        "---\n"
+        "configs:\n"
+        "- config_name: default\n"
+        "  data_files:\n"
+        f"  - split: {HF_SPLIT}\n"
+        f"    path: {HF_DATA_DIRNAME}/{HF_SPLIT}-*{extension}\n"
+        "---\n\n"
+        "# Parampara AI oral traditions corpus\n\n"
+        "One row per recording: the source-language transcription, its English translation and a structured "
+        "summary, with language, category, contributor and location metadata. Exported by `parampara-ai export`.\n\n"
+        f"Columns: {', '.join(f'`{name}`' for name in COLUMNS)}.\n"
+    )
+    with open(os.path.join(output_dir, "README.md"), "w", encoding="utf-8") as f:
+        f.write(card)
+
+
+def _remove_earlier_shards(shard_dir, run):
+    """Deletes shard files written by runs before `run` (and nothing else)."""
+    for name in os.listdir(shard_dir):
+        match = SHARD_NAME_RE.match(name)
+        if match and int(match.group(2)) < run:
+            os.remove(os.path.join(shard_dir, name))
+
+
+def _drain(writer, rows):
+    """Writes rows from the queue until None arrives; keeps draining after an error so the reader never blocks."""
+    error = None
+    while True:
+        row = rows.get()
+        if row is None:
+            break
+        if error is None:
+            try:
+                writer.write(row)
+            except Exception as e:
+                error = e
+    writer.close()
+    if error is not None:
+        raise error
+
+
+def export_records(data_dir="data", output_dir="export", fmt="jsonl", shards=1, language=None, category=None,
+                   start=None, end=None, incremental=False, on_progress=None):
+    """Streams the matching records of `data_dir` to `shards` files in `output_dir`.
+
+    With `incremental`, only records written since the directory's last
+    export are included. `on_progress(exported)` is called every
+    `QUEUE_ROWS` records. Returns an `ExportResult`; raises `ExportError`
+    when the format cannot be written, or `ValueError` when an incremental
+    export would mix formats.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'; choose one of {', '.join(FORMATS)}")
+    start_time = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_state(output_dir)
+    if incremental and state and state.get("format") != fmt:
+        raise ValueError(f"{output_dir} holds a {state.get('format')} export; export incrementally in the same format")
+    since = state.get("watermark") if incremental else None
+    if since and "recent" in state: # States written before the overlap window have no record of it
+        since = window_start(since)
+    exported = state.get("recent", {}) if incremental else {}
+    run = state.get("runs", 0) + 1
+
+    writer_class = _writer_class(fmt)
+    shard_dir = os.path.join(output_dir, HF_DATA_DIRNAME) if fmt == "hf" else output_dir
+    os.makedirs(shard_dir, exist_ok=True)
+    prefix = HF_SPLIT if fmt == "hf" else "part"
+    paths = [os.path.join(shard_dir, f"{prefix}-{run:05d}-{shard:05d}-of-{shards:05d}{writer_class.extension}")
+             for shard in range(shards)]
+
+    result = ExportResult(watermark=state.get("watermark", "") if incremental else "")
+    counts = [0] * shards
+    queues = [queue.Queue(maxsize=QUEUE_ROWS) for _ in range(shards)]
+    matches = record_filter(language, category, start, end, since, exported)
+    recent, prune_at = {}, QUEUE_ROWS
+    try:
+        with ThreadPoolExecutor(max_workers=shards, thread_name_prefix="export") as executor:
+            futures = [executor.submit(_drain, writer_class(path), rows) for path, rows in zip(paths, queues)]
+            try:
+                for record in iter_records(data_dir):
+                    if not matches(record):
+                        result.skipped += 1
+                        continue
+                    shard = result.records % shards # Round robin keeps the shards the same size
+                    queues[shard].put(export_row(record))
+                    counts[shard] += 1
+                    result.records += 1
+                    result.watermark = max(result.watermark, watermark_of(record))
+                    recent[record["id"]] = watermark_of(record)
+                    if len(recent) >= prune_at: # Keep memory bounded on a full export
+                        recent = _in_window(recent, result.watermark)
+                        prune_at = max(QUEUE_ROWS, 2 * len(recent))
+                    if on_progress and result.records % QUEUE_ROWS == 0:
+                        on_progress(result.records)
+            finally:
+                for rows in queues:
+                    rows.put(None)
+            for future in futures:
+                future.result()
+    except BaseException:
+        for path in paths: # Leave the directory as the last complete export left it
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    for path, count in zip(paths, counts):
+        if count:
+            result.files.append(path)
+        else:
+            os.remove(path)
+    if not incremental:
+        _remove_earlier_shards(shard_dir, run)
+    if fmt == "hf":
+        _write_dataset_card(output_dir, writer_class.extension)
+    if result.records or not incremental:
+        recent = _in_window({**exported, **recent}, result.watermark) # What the next run must not write again
+        _save_state(output_dir, {
+            "format": fmt,
+            "watermark": result.watermark,
+            "recent": recent,
+            "runs": run,
+            "records": (state.get("records", 0) if incremental else 0) + result.records,
+            "filters": {"language": sorted(_as_set(language) or []), "category": sorted(_as_set(category) or []),
+                        "start": start, "end": end},
+        })
+    result.seconds = time.perf_counter() - start_time
+    return result
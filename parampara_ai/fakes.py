@@ -0,0 +1,157 @@
+"""A local stand-in for `google.generativeai`, for exercising the pipeline offline.
+
+`FakeClient` mimics the module-level `upload_file` / `delete_file` /
+`GenerativeModel` API the pipeline uses, and `FakeModel` answers every request
+with a well-formed canned response (or with recorded raw responses, in turn).
+Both can be told to be slow, to fail at a fixed rate, or to enforce a
+per-minute quota by raising 429 errors, which is how the rate limiter, retry
+paths and benchmarks run without an API key. Random choices are seeded, so a
+run is repeatable.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+from parampara_ai.parsing import ENGLISH_PREFIX_MARKER, original_lang_prefix_marker
+from parampara_ai.prompts import DEFAULT_LANGUAGE, MODEL_NAME
+
+
+class ResourceExhausted(Exception):
+    """Quota error, named and coded like `google.api_core.exceptions.ResourceExhausted`."""
+
+    code = 429
+
+
+class ServiceUnavailable(Exception):
+    """Server error, named and coded like `google.api_core.exceptions.ServiceUnavailable`."""
+
+    code = 503
+
+
+class FakeFile:
+    def __init__(self, path):
+        self.name = f"files/{uuid.uuid4().hex[:12]}"
+        self.size_bytes = os.path.getsize(path)
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens=0):
+        self.text = text
+        self.usage_metadata = type("UsageMetadata", (), {
+            "prompt_token_count": prompt_tokens,
+            "total_token_count": prompt_tokens + len(text) // 4,
+        })()
+
+
+def canned_response(language=DEFAULT_LANGUAGE, summary_only=False):
+    """Returns a response in the format the prompts ask for."""
+    summary = {
+        "title": "Making a clay pot",
+        "category": "Tutorial: Pottery",
+        "instructions": ["Knead the clay.", "Shape it on the wheel.", "Dry and fire the pot."],
+    }
+    summary_block = f"```json\n{json.dumps(summary, indent=2)}\n```"
+    if summary_only:
+        return summary_block
+    return (
+        f"{original_lang_prefix_marker(language)}\nమట్టిని బాగా పిసికి చక్రం మీద కుండను తయారు చేయాలి.\n\n"
+        f"{ENGLISH_PREFIX_MARKER}\nKnead the clay well and shape the pot on the wheel.\n\n"
+        f"**Summary JSON:**\n{summary_block}"
+    )
+
+
+class FakeModel:
+    """Deterministic `GenerativeModel` replacement.
+
+    `latency` seconds are spent on every call, varied by up to
+    `latency_jitter` of itself either way. `error_rate` of calls raise
+    `ServiceUnavailable` (seeded, so runs are repeatable), and with
+    `quota_rpm` set, calls beyond that many in the trailing minute raise
+    `ResourceExhausted` like the real API does. `responses` replaces the
+    canned transcription response with raw response texts used in turn.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, language=DEFAULT_LANGUAGE, latency=0.0, error_rate=0.0,
+                 quota_rpm=None, seed=0, clock=time.monotonic, sleep=time.sleep, latency_jitter=0.0, responses=None):
+        self.model_name = model_name
+        self.language = language
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.responses = list(responses) if responses else None
+        self.error_rate = error_rate
+        self.quota_rpm = quota_rpm
+        self.clock = clock
+        self.sleep = sleep
+        self.calls = 0
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._recent = deque() # Times of accepted calls within the last minute
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        """Counts the call and raises the injected error, if any; returns the latency to spend."""
+        with self._lock:
+            self.calls += 1
+            now = self.clock()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.quota_rpm is not None and len(self._recent) >= self.quota_rpm:
+                self.rejected += 1
+                raise ResourceExhausted("429 Quota exceeded for requests per minute.")
+            if self._random.random() < self.error_rate:
+                self.rejected += 1
+                raise ServiceUnavailable("503 The service is currently unavailable.")
+            self._recent.append(now)
+            latency = self.latency
+            if self.latency_jitter:
+                latency *= 1 + self.latency_jitter * (2 * self._random.random() - 1)
+            response_index = self.calls - self.rejected - 1
+        return latency, response_index
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        latency, response_index = self._admit()
+        if latency > 0:
+            self.sleep(latency)
+        if self.responses and not isinstance(contents, str):
+            text = self.responses[response_index % len(self.responses)]
+        else:
+            text = canned_response(self.language, summary_only=isinstance(contents, str))
+        if stream:
+            return iter([FakeResponse(text[i:i + 64]) for i in range(0, len(text), 64)])
+        return FakeResponse(text, prompt_tokens=100)
+
+
+class FakeClient:
+    """Module-like replacement for `google.generativeai`.
+
+    Uploads take `upload_latency` seconds plus `upload_seconds_per_mb` for
+    every megabyte of the file, so smaller uploads finish sooner.
+    """
+
+    def __init__(self, upload_latency=0.0, upload_seconds_per_mb=0.0, **model_kwargs):
+        self.upload_latency = upload_latency
+        self.upload_seconds_per_mb = upload_seconds_per_mb
+        self.model_kwargs = model_kwargs
+        self.files = {}
+
+    def configure(self, api_key=None):
+        pass
+
+    def upload_file(self, path):
+        uploaded = FakeFile(path)
+        delay = self.upload_latency + self.upload_seconds_per_mb * uploaded.size_bytes / 1e6
+        if delay:
+            time.sleep(delay)
+        self.files[uploaded.name] = uploaded
+        return uploaded
+
+    def delete_file(self, name):
+        self.files.pop(name, None)
+
+    def GenerativeModel(self, model_name=MODEL_NAME):
+        return FakeModel(model_name, **self.model_kwargs)
@@ -0,0 +1,105 @@
+"""Lazy setup of the Google Gemini SDK.
+
+`google.generativeai` is slow to import, so it is only imported when a client
+is actually requested rather than when `parampara_ai` is imported. A
+`LazyClient` goes one step further for the Streamlit app: it checks the API
+key straight away but imports the SDK only when a recording is processed.
+"""
+
+import os
+import threading
+
+from parampara_ai.prompts import MODEL_NAME
+from parampara_ai.ratelimit import RateLimitedModel
+
+
+class MissingAPIKeyError(RuntimeError):
+    """Raised when no Gemini API key is configured."""
+
+
+def _api_key(api_key=None):
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise MissingAPIKeyError("GEMINI_API_KEY not found. Please set it in your .env file.")
+    return api_key
+
+
+def configure_client(api_key=None):
+    """Imports and configures `google.generativeai`, returning the module.
+
+    The key defaults to the `GEMINI_API_KEY` environment variable.
+    """
+    api_key = _api_key(api_key)
+    import google.generativeai as genai
+
+    genai.configure(api_key=api_key)
+    return genai
+
+
+def create_model(client, model_name=MODEL_NAME, limiter=None, max_retries=None):
+    """Builds the Gemini model used for audio processing.
+
+    For a `LazyClient` the model is built on its first call. With a `RateLimiter`, every `generate_content` call is scheduled within
+    its RPM/TPM limits and transient errors are retried (`max_retries` times, if given).
+    """
+    model = LazyModel(client, model_name) if isinstance(client, LazyClient) else client.GenerativeModel(model_name)
+    if limiter is None:
+        return model
+    if max_retries is None:
+        return RateLimitedModel(model, limiter)
+    return RateLimitedModel(model, limiter, max_retries=max_retries)
+
+
+class LazyClient:
+    """Stands in for the configured `google.generativeai` module until it is used.
+
+    The API key is checked when the client is created, so a missing key is
+    still reported up front; the SDK is imported and configured on the
+    first attribute access (e.g. `upload_file`), once, from any thread.
+    """
+
+    def __init__(self, api_key=None):
+        self._api_key = _api_key(api_key)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Whether the SDK has been imported yet."""
+        return self._client is not None
+
+    def get(self):
+        """Returns the configured SDK module, importing it on the first call."""
+        with self._lock:
+            if self._client is None:
+                self._client = configure_client(self._api_key)
+            return self._client
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class LazyModel:
+    """A Gemini model built from a `LazyClient` on its first call."""
+
+    def __init__(self, client, model_name=MODEL_NAME):
+        self.client = client
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self.client.GenerativeModel(self.model_name)
+            return self._model
+
+    def generate_content(self, contents, **kwargs):
+        return self.get().generate_content(contents, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
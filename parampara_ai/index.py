@@ -0,0 +1,412 @@
+"""SQLite index of the records saved under the `data/` directory.
+
+The index keeps just enough metadata (id, timestamp, username, category,
+language, location) to list records without reading them, plus the
+full-text search table from `parampara_ai.search`. The `path` column holds
+the record's location in `parampara_ai.recordstore`: a JSON file path or a
+segment-log offset. `save_data` adds each new record as it is written, and
+`sync()` rebuilds or repairs the index from the directory and the segment
+log when records were added or removed by other means.
+
+Listings are ordered newest first by `(timestamp, mtime, id)` and paged by
+key: `query(after=...)` starts below the key of the previous page's last
+row (see `key_after()`), so a deep page costs the same as the first.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from parampara_ai.recordstore import SegmentLogStore, is_segment_location
+from parampara_ai.search import BM25_WEIGHTS, FTS_SCHEMA, SNIPPET_TOKENS, to_match_query, upsert_document
+
+INDEX_FILENAME = "index.db"
+
+# Bumped whenever the schema gains data that existing index files lack; sync()
+# then re-reads every record once.
+SCHEMA_VERSION = "7"
+
+# Listing order, and the keyset conditions that continue it either way (see query())
+KEY_ORDER = "timestamp DESC, mtime DESC, id DESC"
+KEY_AFTER = "(timestamp, mtime, id) < (?, ?, ?)"
+KEY_BEFORE = "(timestamp, mtime, id) > (?, ?, ?)"
+
+# sync() stats every JSON file at least this often, catching files edited in
+# place (which leave the directory mtime alone), and at once when files come or go
+FILE_SCAN_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL DEFAULT '',
+    username TEXT,
+    category TEXT,
+    original_language TEXT,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    latitude REAL,
+    longitude REAL
+);
+CREATE INDEX IF NOT EXISTS records_timestamp ON records (timestamp DESC, mtime DESC, id DESC);
+CREATE INDEX IF NOT EXISTS records_category ON records (category, timestamp DESC, mtime DESC, id DESC);
+CREATE INDEX IF NOT EXISTS records_language ON records (original_language, timestamp DESC, mtime DESC, id DESC);
+CREATE INDEX IF NOT EXISTS records_username ON records (username, timestamp DESC, mtime DESC, id DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _coordinate(value):
+    """Parses a latitude/longitude as entered on the upload page, or returns None."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RecordIndex:
+    """Metadata index for the records stored in `data_dir`."""
+
+    def __init__(self, data_dir="data", db_path=None):
+        self.data_dir = data_dir
+        self.db_path = db_path or os.path.join(data_dir, INDEX_FILENAME)
+        self._scanned = (None, float("-inf")) # (directory mtime, monotonic time) of the last stat pass
+
+    # --- Connection handling ---
+    def _connect(self):
+        """Opens a connection, creating the schema on first use."""
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        # Keep the rollback journal between transactions: creating and deleting it
+        # would change the data directory's mtime, which sync() uses to rescan early
+        conn.execute("PRAGMA journal_mode=PERSIST")
+        conn.executescript(SCHEMA + FTS_SCHEMA)
+        if self._get_meta(conn, "schema_version") != SCHEMA_VERSION:
+            self._migrate(conn)
+        return conn
+
+    def _migrate(self, conn):
+        """Stamps a new index with the schema version, or recreates an outdated one.
+
+        Runs under the write lock and re-checks the version there, so that
+        concurrent first writers neither drop each other's tables nor migrate
+        twice.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = self._get_meta(conn, "schema_version")
+            if version is not None and version != SCHEMA_VERSION:
+                # Written by an older version: recreate the tables, and sync() re-reads everything once
+                conn.execute("DROP TABLE IF EXISTS records")
+                conn.execute("DROP TABLE IF EXISTS documents")
+                for statement in (SCHEMA + FTS_SCHEMA).split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            if version != SCHEMA_VERSION:
+                self._set_meta(conn, "schema_version", SCHEMA_VERSION)
+                self._set_meta(conn, "segment_offsets", "{}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _get_meta(self, conn, key):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, conn, key, value):
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    # --- Writes ---
+    def _upsert(self, conn, record, path, mtime, size=0):
+        record_id = record.get("id") or os.path.splitext(os.path.basename(path))[0]
+        coordinates = record.get("coordinates") or {}
+        # INSERT OR REPLACE deletes the rows with the same id or path; their documents go too
+        replaced = [row[0] for row in conn.execute("SELECT rowid FROM records WHERE id = ? OR path = ?", (record_id, path))]
+        cursor = conn.execute(
+            """
+            INSERT OR REPLACE INTO records
+                (id, timestamp, username, category, original_language, path, mtime, size, latitude, longitude)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                record_id,
+                record.get("timestamp") or "",
+                record.get("username"),
+                record.get("category"),
+                record.get("original_language"),
+                path,
+                mtime,
+                size,
+                _coordinate(coordinates.get("latitude")),
+                _coordinate(coordinates.get("longitude")),
+            ),
+        )
+        upsert_document(conn, record_id, record, cursor.lastrowid, replaced)
+
+    def add(self, record, path):
+        """Adds (or replaces) a single record that was just written to `path`."""
+        if is_segment_location(path):
+            mtime, size = time.time(), 0
+        else:
+            stat = os.stat(path) # The file's own signature, so sync() does not read it again
+            mtime, size = stat.st_mtime, stat.st_size
+        with closing(self._connect()) as conn, conn:
+            self._upsert(conn, record, path, mtime, size)
+
+    def relocate(self, locations):
+        """Points already indexed records at new locations (`{record_id: location}`)."""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("UPDATE records SET path = ? WHERE id = ?", [(path, record_id) for record_id, path in locations.items()])
+
+    def mark_segments_indexed(self):
+        """Marks the segment log as fully indexed (after a compaction has relocated its records)."""
+        sizes = {path: os.path.getsize(path) for path in SegmentLogStore(self.data_dir).segment_paths()}
+        with closing(self._connect()) as conn, conn:
+            self._set_meta(conn, "segment_offsets", json.dumps(sizes))
+
+    def rebuild(self):
+        """Drops the index and re-reads every record in `data_dir`."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM records")
+            conn.execute("DELETE FROM documents")
+            self._set_meta(conn, "segment_offsets", "{}")
+        return self.sync()
+
+    def sync(self):
+        """Brings the index up to date with `data_dir`.
+
+        Only the part of each log segment written since the last sync is
+        read, and only JSON files whose mtime or size differs from the
+        indexed one are parsed. The `scandir` pass that stats them runs when
+        the directory mtime changed since this instance last looked (files
+        added or removed, by any process) and otherwise every
+        `FILE_SCAN_SECONDS` (files edited in place), so this is cheap to call
+        on every Streamlit rerun.
+        Returns the number of records that were (re)indexed.
+        """
+        if not os.path.isdir(self.data_dir):
+            return 0
+        dir_mtime = os.stat(self.data_dir).st_mtime_ns # Taken first: a file added during the pass triggers another
+        now = time.monotonic()
+        with closing(self._connect()) as conn, conn:
+            updated = self._sync_segments(conn)
+            if dir_mtime != self._scanned[0] or now - self._scanned[1] >= FILE_SCAN_SECONDS:
+                updated += self._sync_json_files(conn)
+                self._scanned = (dir_mtime, now)
+        return updated
+
+    def _sync_segments(self, conn):
+        """Indexes records appended to the segment log since the last sync."""
+        store = SegmentLogStore(self.data_dir)
+        sizes = {path: os.path.getsize(path) for path in store.segment_paths()}
+        offsets = json.loads(self._get_meta(conn, "segment_offsets") or "{}")
+        if offsets == sizes:
+            return 0
+        if any(path not in sizes or sizes[path] < offset for path, offset in offsets.items()):
+            offsets = {} # Segments were compacted by another process: re-read them all
+        updated = 0
+        for location, record in store.scan(start_offsets=offsets):
+            self._upsert(conn, record, location, time.time())
+            updated += 1
+        self._set_meta(conn, "segment_offsets", json.dumps(sizes))
+        return updated
+
+    def _sync_json_files(self, conn):
+        """Indexes new or modified one-file-per-record JSON files and drops deleted ones."""
+        on_disk = {}
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    stat = entry.stat()
+                    on_disk[entry.path] = (stat.st_mtime, stat.st_size)
+
+        indexed = {
+            path: (mtime, size)
+            for path, mtime, size in conn.execute("SELECT path, mtime, size FROM records WHERE path LIKE '%.json'") # Not segment-log rows
+        }
+        stale = [(path,) for path in indexed if path not in on_disk]
+        conn.executemany("DELETE FROM documents WHERE rowid IN (SELECT rowid FROM records WHERE path = ?)", stale)
+        conn.executemany("DELETE FROM records WHERE path = ?", stale)
+
+        updated = 0
+        for path, signature in on_disk.items():
+            if indexed.get(path) == signature:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue  # Unreadable files are simply left out of the index
+            if not isinstance(record, dict) or "id" not in record:
+                continue # Not a record, e.g. embeddings.json
+            self._upsert(conn, record, path, *signature)
+            updated += 1
+        return updated
+
+    # --- Reads ---
+    def list_records(self):
+        """Returns all indexed records, newest first."""
+        return self.query(limit=None)
+
+    def ids(self):
+        """Returns the set of indexed record IDs."""
+        with closing(self._connect()) as conn:
+            return {row[0] for row in conn.execute("SELECT id FROM records")}
+
+    @staticmethod
+    def _where(category=None, language=None, username=None, start=None, end=None):
+        """Builds the WHERE clause shared by query() and count().
+
+        `start` and `end` are ISO timestamp strings (inclusive lower bound,
+        exclusive upper bound); ISO timestamps sort correctly as text.
+        """
+        clauses, params = [], []
+        for column, value in (
+            ("category", category),
+            ("original_language", language),
+            ("username", username),
+        ):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    @classmethod
+    def _keyset(cls, after, filters):
+        """WHERE clause for the rows matching `filters` that sort after the key `after`."""
+        where, params = cls._where(**filters)
+        if after is not None:
+            where = f"{where} AND {KEY_AFTER}" if where else f"WHERE {KEY_AFTER}"
+            params += list(after)
+        return where, params
+
+    def query(self, limit=50, after=None, **filters):
+        """Returns one page of records matching `filters`, newest first.
+
+        Accepted filters are `category`, `language`, `username`, `start` and
+        `end`. `after` is the `(timestamp, mtime, id)` key of the last row of
+        the previous page, or None for the first page. Filtering, ordering and
+        paging all run inside SQLite on one composite index, so only the
+        requested page is read, however deep it is.
+        """
+        where, params = self._keyset(after, filters)
+        sql = f"SELECT * FROM records {where} ORDER BY {KEY_ORDER}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def key_after(self, count, after=None, **filters):
+        """Returns the key of the `count`-th record after `after`, or None when there is none.
+
+        A negative `count` counts back towards the newest record instead.
+        Used to find where a page starts when pages are skipped: only the
+        keys of the skipped records are read, from the covering index.
+        """
+        where, params = self._keyset(after, filters)
+        order = KEY_ORDER
+        if count < 0:
+            where, order = where.replace(KEY_AFTER, KEY_BEFORE), KEY_ORDER.replace("DESC", "ASC")
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT timestamp, mtime, id FROM records {where} ORDER BY {order} LIMIT 1 OFFSET ?",
+                [*params, abs(count) - 1],
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def count(self, **filters):
+        """Returns the number of records matching `filters`."""
+        where, params = self._where(**filters)
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM records {where}", params).fetchone()[0]
+
+    def distinct(self, column):
+        """Returns the sorted distinct non-empty values of a filterable column."""
+        if column not in ("category", "original_language", "username"):
+            raise ValueError(f"Cannot list distinct values of column '{column}'")
+        with closing(self._connect()) as conn:
+            return [
+                row[0]
+                for row in conn.execute(
+                    f"SELECT DISTINCT {column} FROM records "
+                    f"WHERE {column} IS NOT NULL AND {column} != '' ORDER BY {column}"
+                )
+            ]
+
+    def search(self, text, limit=20, offset=0, **filters):
+        """Returns records whose text matches `text`, best matches first.
+
+        Each row carries the record's index columns plus `snippet` (the
+        matching passage, with hits in [brackets]) and `rank` (bm25, lower is
+        better). The same filters as query() can narrow the results.
+        """
+        match = to_match_query(text)
+        if match is None:
+            return []
+        where, params = self._where(**filters)
+        where = where.replace("WHERE", "AND", 1)
+        weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+        sql = f"""
+            SELECT records.*,
+                   snippet(documents, -1, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet,
+                   bm25(documents, {weights}) AS rank
+            FROM documents JOIN records ON records.rowid = documents.rowid
+            WHERE documents MATCH ? {where}
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, [match, *params, limit, offset]).fetchall()
+
+    def count_matches(self, text, **filters):
+        """Returns the number of records whose text matches `text`."""
+        match = to_match_query(text)
+        if match is None:
+            return 0
+        where, params = self._where(**filters)
+        where = where.replace("WHERE", "AND", 1)
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM documents JOIN records ON records.rowid = documents.rowid "
+                f"WHERE documents MATCH ? {where}",
+                [match, *params],
+            ).fetchone()[0]
+
+    def get(self, record_id):
+        """Returns the index row for `record_id`, or None."""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT * FROM records WHERE id = ?", (record_id,)
+            ).fetchone()
+
+    def version(self):
+        """Returns a token that changes whenever the index file is written.
+
+        It costs one `stat`, so the Streamlit pages key their cached query
+        results on it and reuse them until a record is added or changed.
+        """
+        try:
+            stat = os.stat(self.db_path)
+        except FileNotFoundError:
+            return ""
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def __len__(self):
+        return self.count()
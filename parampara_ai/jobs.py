@@ -0,0 +1,416 @@
+"""Persistent background job queue for audio processing.
+
+Jobs live in an SQLite table (`data/jobs.db`) with a status of queued,
+running, done or failed, so they survive Streamlit reruns, closed tabs and
+process restarts. A `WorkerPool` of background threads claims queued jobs and
+runs them; the page only submits jobs and polls their status.
+
+A claimed job holds a lease (`locked_until`) that its worker renews every
+`HEARTBEAT_SECONDS` while the job runs, however long that takes. A job whose
+lease ran out (its worker process died) is claimed again by the next
+worker, in any process, within `LEASE_SECONDS`, unless it has already been
+claimed `MAX_CLAIMS` times: a recording that kills its worker every time
+(e.g. out of memory) is failed instead of looping forever. A job's copy of
+the audio is deleted as soon as the job is done or failed.
+
+Submitting the same audio with the same language, model and prompt while an
+earlier job for it is queued, running or done returns that job instead of
+creating a new one, so a recording is never paid for twice.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import closing
+
+from parampara_ai.batch import call_with_retries
+from parampara_ai.cache import cache_key, hash_file
+from parampara_ai.pipeline import process_audio
+from parampara_ai.prompts import MODEL_NAME, PROMPT_TEMPLATE
+from parampara_ai.segments import DEFAULT_SEGMENT_SECONDS, process_long_audio
+from parampara_ai.storage import DATA_DIR
+
+JOBS_FILENAME = "jobs.db"
+JOB_AUDIO_DIRNAME = "jobs" # Audio waiting to be processed, under the data directory
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+LEASE_SECONDS = 120 # A running job whose worker stops renewing for this long is handed to another worker
+HEARTBEAT_SECONDS = 30
+MAX_CLAIMS = 3 # A job whose lease has expired this many times is failed rather than queued again
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    audio_sha256 TEXT NOT NULL,
+    audio_path TEXT NOT NULL,
+    language TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    options TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_id TEXT,
+    locked_until REAL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_dedupe_key ON jobs (dedupe_key, status);
+"""
+LEASE_COLUMNS = {"lease_id": "TEXT", "locked_until": "REAL", "heartbeat_at": "REAL"} # Added to older jobs.db files
+
+
+class JobQueue:
+    """SQLite-backed queue of audio processing jobs."""
+
+    def __init__(self, data_dir="data", db_path=None):
+        self.data_dir = data_dir
+        self.db_path = db_path or os.path.join(data_dir, JOBS_FILENAME)
+        self.audio_dir = os.path.join(data_dir, JOB_AUDIO_DIRNAME)
+
+    def _connect(self):
+        """Opens a connection, creating the schema on first use."""
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None) # Explicit transactions
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=PERSIST") # Writes must not change data/'s mtime (see RecordIndex.sync)
+        conn.executescript(SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, kind in LEASE_COLUMNS.items():
+            if name not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+                except sqlite3.OperationalError: # Added by another process in the meantime
+                    pass
+        return conn
+
+    def _transaction(self, conn):
+        """Runs the enclosed statements in one BEGIN IMMEDIATE transaction (one writer at a time)."""
+        return _Transaction(conn)
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("metadata", "options", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    # --- Producers ---
+    def submit(self, audio_path, language, metadata=None, options=None, audio_digest=None, model_name=MODEL_NAME):
+        """Queues `audio_path` for processing and returns the job ID.
+
+        The audio is copied into the queue's own directory, so the caller may
+        delete its file right away. Returns the ID of an existing queued,
+        running or finished job for the same audio, language, model, prompt
+        and options instead of queueing a duplicate.
+        """
+        options = options or {}
+        audio_digest = audio_digest or hash_file(audio_path)
+        dedupe_key = cache_key(
+            audio_digest, language, model_name,
+            PROMPT_TEMPLATE + json.dumps(options, sort_keys=True),
+        )
+        with closing(self._connect()) as conn:
+            if existing := self._find_duplicate(conn, dedupe_key):
+                return existing # Cheap check before copying the audio
+
+            job_id = str(uuid.uuid4())
+            os.makedirs(self.audio_dir, exist_ok=True)
+            job_audio_path = os.path.join(self.audio_dir, job_id + os.path.splitext(audio_path)[1])
+            shutil.copyfile(audio_path, job_audio_path) # Outside the transaction: copying can take a while
+            with self._transaction(conn): # The duplicate check and the insert must not interleave with another submit
+                existing = self._find_duplicate(conn, dedupe_key)
+                if existing is None:
+                    conn.execute(
+                        "INSERT INTO jobs (id, status, dedupe_key, audio_sha256, audio_path, language, metadata, options, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, QUEUED, dedupe_key, audio_digest, job_audio_path, language,
+                         json.dumps(metadata or {}, ensure_ascii=False), json.dumps(options), time.time()),
+                    )
+        if existing is not None:
+            os.remove(job_audio_path)
+            return existing
+        return job_id
+
+    @staticmethod
+    def _find_duplicate(conn, dedupe_key):
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE dedupe_key = ? AND status != ? ORDER BY created_at DESC LIMIT 1",
+            (dedupe_key, FAILED),
+        ).fetchone()
+        return row["id"] if row else None
+
+    # --- Consumers ---
+    def claim(self, lease_seconds=LEASE_SECONDS):
+        """Marks the oldest queued job as running under a new lease and returns it, or None.
+
+        Jobs whose lease has expired are queued again first. The returned
+        job's `lease_id` must be passed back through `renew()` and
+        `complete()`/`fail()`.
+        """
+        with closing(self._connect()) as conn:
+            with self._transaction(conn): # Only one worker can claim a given job
+                now = time.time()
+                _, abandoned = self._requeue_expired(conn, now)
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    lease_id = str(uuid.uuid4())
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, lease_id = ?, "
+                        "locked_until = ?, heartbeat_at = ? WHERE id = ?",
+                        (RUNNING, now, lease_id, now + lease_seconds, now, row["id"]),
+                    )
+                    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        _remove_audio(abandoned)
+        return self._to_dict(row)
+
+    def renew(self, job, lease_seconds=LEASE_SECONDS):
+        """Extends a running job's lease; returns False if the job is no longer held by this lease."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "UPDATE jobs SET locked_until = ?, heartbeat_at = ? WHERE id = ? AND status = ? AND lease_id = ?",
+                (now + lease_seconds, now, job["id"], RUNNING, job["lease_id"]),
+            ).rowcount == 1
+
+    def _finish(self, job, status, result=None, error=None):
+        with closing(self._connect()) as conn:
+            finished = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, locked_until = NULL "
+                "WHERE id = ? AND status = ? AND lease_id IS ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job["id"], RUNNING, job.get("lease_id")),
+            ).rowcount
+        if finished: # Otherwise the lease expired and another worker owns the job now
+            _remove_audio([job["audio_path"]])
+
+    def complete(self, job, result):
+        """Stores a finished job's result (a JSON-serialisable dict)."""
+        self._finish(job, DONE, result=result)
+
+    def fail(self, job, error):
+        """Marks a job as failed with an error message."""
+        self._finish(job, FAILED, error=error)
+
+    def retry(self, job_id):
+        """Puts a failed job back in the queue; returns False if it is not failed or its audio is gone.
+
+        Failed jobs' audio is deleted, so this only applies to jobs failed
+        before that; submit the recording again otherwise (failed jobs do not
+        count as duplicates).
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT audio_path FROM jobs WHERE id = ? AND status = ?", (job_id, FAILED)).fetchone()
+            if row is None or not os.path.exists(row["audio_path"]):
+                return False
+            conn.execute("UPDATE jobs SET status = ?, error = NULL, attempts = 0 WHERE id = ? AND status = ?", (QUEUED, job_id, FAILED))
+        return True
+
+    def requeue_stale(self):
+        """Re-queues running jobs whose lease has expired (their worker died).
+
+        `claim()` does this too; calling it on startup just shows those jobs
+        as queued right away. Jobs already claimed `MAX_CLAIMS` times are
+        failed instead. Returns the number of jobs re-queued.
+        """
+        with closing(self._connect()) as conn:
+            with self._transaction(conn):
+                requeued, abandoned = self._requeue_expired(conn, time.time())
+        _remove_audio(abandoned)
+        return requeued
+
+    @staticmethod
+    def _requeue_expired(conn, now):
+        """Re-queues or fails running jobs with an expired lease; returns (number re-queued, audio of the failed)."""
+        # Rows from before leases existed have no locked_until and count as expired
+        expired = "status = ? AND COALESCE(locked_until, 0) < ?"
+        abandoned = conn.execute(
+            f"SELECT id, audio_path, attempts FROM jobs WHERE {expired} AND attempts >= ?", (RUNNING, now, MAX_CLAIMS),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_id = NULL, locked_until = NULL WHERE id = ?",
+            [(FAILED, f"The worker stopped while running this job {row['attempts']} times (e.g. it ran out of memory); giving up.",
+              now, row["id"]) for row in abandoned],
+        )
+        requeued = conn.execute(
+            f"UPDATE jobs SET status = ?, lease_id = NULL, locked_until = NULL WHERE {expired}", (QUEUED, RUNNING, now),
+        ).rowcount
+        return requeued, [row["audio_path"] for row in abandoned]
+
+    # --- Status ---
+    def get(self, job_id):
+        """Returns a job as a dict, or None if it does not exist."""
+        with closing(self._connect()) as conn:
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list_jobs(self, limit=50, status=None):
+        """Returns the most recent jobs, newest first."""
+        sql, params = "SELECT * FROM jobs", []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        with closing(self._connect()) as conn:
+            return [self._to_dict(row) for row in conn.execute(sql, [*params, limit])]
+
+    def counts(self):
+        """Returns the number of jobs in each status."""
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+
+def _remove_audio(paths):
+    """Deletes the queue's copies of finished jobs' audio."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, or ROLLBACK on an exception (connections use isolation_level=None)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class WorkerPool:
+    """Background threads that run `handler(job)` for queued jobs.
+
+    `handler` returns the result dict stored with the job; any exception
+    marks the job as failed. While a job runs, its lease is renewed every
+    `heartbeat_interval` seconds.
+    """
+
+    def __init__(self, queue, handler, num_workers=4, poll_interval=1.0, heartbeat_interval=HEARTBEAT_SECONDS):
+        self.queue = queue
+        self.handler = handler
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Starts the worker threads (once)."""
+        if self._threads:
+            return self
+        self.queue.requeue_stale()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"parampara-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def notify(self):
+        """Wakes idle workers right away (e.g. after a submit)."""
+        self._wake.set()
+
+    def stop(self, wait=True):
+        """Asks the workers to exit after their current job."""
+        self._stop.set()
+        self._wake.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def run_once(self):
+        """Claims and runs a single job in the calling thread; returns False if none was queued."""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), name=f"parampara-heartbeat-{job['id'][:8]}", daemon=True)
+        heartbeat.start()
+        try:
+            self.queue.complete(job, self.handler(job))
+        except Exception as e:
+            self.queue.fail(job, f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}")
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _heartbeat(self, job, done):
+        """Renews the job's lease until `done` is set."""
+        while not done.wait(self.heartbeat_interval):
+            try:
+                if not self.queue.renew(job):
+                    return # Lost the lease; the result will not be stored
+            except sqlite3.Error:
+                pass # Busy database: try again at the next beat, well before the lease runs out
+
+    def drain(self):
+        """Runs jobs in the calling thread until the queue is empty."""
+        while self.run_once():
+            pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+def make_pipeline_handler(client, model, cache=None, recorder=None, max_retries=3, data_dir=DATA_DIR, model_name=MODEL_NAME):
+    """Returns a `WorkerPool` handler that runs a job through the Gemini pipeline.
+
+    Jobs with `options["long"]` use long recording mode (`segment_seconds`
+    and `max_workers` options); all others use `process_audio` with the
+    result cache. `options["preprocess"]` preprocesses the audio before it is
+    uploaded. Transient API errors are retried with backoff.
+    """
+    def handle(job):
+        options = job["options"] or {}
+        if options.get("long"):
+            run = lambda: process_long_audio(
+                job["audio_path"], job["language"], client, model, metadata=job["metadata"],
+                segment_seconds=options.get("segment_seconds", DEFAULT_SEGMENT_SECONDS),
+                max_workers=options.get("max_workers", 4), max_retries=max_retries,
+                data_dir=data_dir, model_name=model_name, recorder=recorder,
+                preprocess=options.get("preprocess", False),
+            )
+        else:
+            run = lambda: process_audio(
+                job["audio_path"], job["language"], client, model, metadata=job["metadata"],
+                cache=cache, model_name=model_name, data_dir=data_dir,
+                audio_digest=job["audio_sha256"], recorder=recorder,
+                preprocess=options.get("preprocess", False),
+            )
+        result, _ = call_with_retries(run, max_retries=max_retries)
+        return {
+            "file_id": result.file_id,
+            "location": result.location,
+            "cached": result.cached,
+            "existing_record": result.existing_record,
+            "duration": result.duration,
+            "stages": result.metrics.stages if result.metrics is not None else {},
+            "preprocessed": result.preprocessed.to_dict() if result.preprocessed is not None else None,
+            "estimated_seconds_saved": result.metrics.fields.get("estimated_seconds_saved") if result.metrics is not None else None,
+            **result.parsed.to_dict(),
+        }
+    return handle
@@ -0,0 +1,178 @@
+"""Per-request latency metrics for the ingestion pipeline.
+
+Each processed recording produces one `RequestMetrics` with the time spent in
+every pipeline stage (temp-file write, `upload_file`, `generate_content`,
+parsing, `save_data`, cleanup) plus the model, language and byte counts. The
+records are appended to a JSON Lines log, which can be summarised into
+per-stage percentiles or rendered in the Prometheus text exposition format.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+METRICS_FILENAME = "metrics.jsonl"
+
+# Histogram buckets in seconds, from fast local stages up to long generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class RequestMetrics:
+    """Timings and sizes collected while processing one recording."""
+
+    def __init__(self, model=None, language=None, audio_bytes=None, **fields):
+        self.request_id = str(uuid.uuid4())
+        self.timestamp = datetime.now().isoformat()
+        self.model = model
+        self.language = language
+        self.audio_bytes = audio_bytes
+        self.response_bytes = None
+        self.outcome = None # "ok", "cached" or the exception class name
+        self.stages = {} # stage name -> seconds
+        self.fields = fields # Anything else worth logging (e.g. mode="long")
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block and adds it to stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "timestamp": self.timestamp,
+            "model": self.model,
+            "language": self.language,
+            "audio_bytes": self.audio_bytes,
+            "response_bytes": self.response_bytes,
+            "outcome": self.outcome,
+            "total_seconds": time.perf_counter() - self._start,
+            "stages": self.stages,
+            **self.fields,
+        }
+
+
+def timed(metrics, name):
+    """`metrics.stage(name)`, or a no-op when no metrics are being collected."""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+class MetricsRecorder:
+    """Appends finished `RequestMetrics` to a JSON Lines log."""
+
+    def __init__(self, path=os.path.join("data", METRICS_FILENAME)):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        """Writes one request's metrics as a single log line."""
+        line = json.dumps(metrics.to_dict(), ensure_ascii=False) + "\n"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def load(self):
+        """Returns every logged request, oldest first; unreadable lines are skipped."""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue # A partially written last line
+        return records
+
+
+# --- Aggregation ---
+def percentile(values, q):
+    """Returns the `q`-th percentile (0-100) of `values` by linear interpolation."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(records):
+    """Returns count, mean, p50, p95 and max seconds per stage (and in total)."""
+    samples = defaultdict(list)
+    for record in records:
+        samples["total"].append(record.get("total_seconds", 0.0))
+        for name, seconds in record.get("stages", {}).items():
+            samples[name].append(seconds)
+    return {
+        name: {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values),
+        }
+        for name, values in samples.items()
+    }
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+def render_prometheus(records):
+    """Renders logged requests as Prometheus counters and histograms."""
+    requests = defaultdict(int)
+    audio_bytes = defaultdict(int)
+    response_bytes = defaultdict(int)
+    histograms = defaultdict(lambda: {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0})
+    for record in records:
+        model, language = record.get("model") or "unknown", record.get("language") or "unknown"
+        requests[(model, language, record.get("outcome") or "unknown")] += 1
+        audio_bytes[(model, language)] += record.get("audio_bytes") or 0
+        response_bytes[(model, language)] += record.get("response_bytes") or 0
+        observations = dict(record.get("stages", {}), total=record.get("total_seconds", 0.0))
+        for stage_name, seconds in observations.items():
+            histogram = histograms[(model, stage_name)]
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+
+    lines = [
+        "# HELP parampara_requests_total Recordings processed, by outcome.",
+        "# TYPE parampara_requests_total counter",
+    ]
+    for (model, language, outcome), count in sorted(requests.items()):
+        lines.append(f"parampara_requests_total{_labels(model=model, language=language, outcome=outcome)} {count}")
+    for name, totals, help_text in (
+        ("parampara_audio_bytes_total", audio_bytes, "Audio bytes sent for processing."),
+        ("parampara_response_bytes_total", response_bytes, "Response bytes received from the model."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (model, language), total in sorted(totals.items()):
+            lines.append(f"{name}{_labels(model=model, language=language)} {total}")
+
+    lines += [
+        "# HELP parampara_stage_seconds Time spent in each pipeline stage.",
+        "# TYPE parampara_stage_seconds histogram",
+    ]
+    for (model, stage_name), histogram in sorted(histograms.items()):
+        # Each observation was counted in every bucket whose bound it fits under,
+        # so the counts are already cumulative as Prometheus expects
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f"parampara_stage_seconds_bucket{_labels(model=model, stage=stage_name, le=bound)} {count}")
+        lines.append(f"parampara_stage_seconds_bucket{_labels(model=model, stage=stage_name, le='+Inf')} {histogram['count']}")
+        lines.append(f"parampara_stage_seconds_sum{_labels(model=model, stage=stage_name)} {histogram['sum']:.6f}")
+        lines.append(f"parampara_stage_seconds_count{_labels(model=model, stage=stage_name)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,357 @@
+"""Parsing of the Gemini response into transcription, translation and summary.
+
+The prompt asks for `**<Language> Transcription:**`, `**English
+Translation:**` and `**Summary JSON:**` headings followed by a ```` ```json ````
+block, but the model does not always follow it to the letter: headings come
+back lower-cased, as `## Markdown` headings, with the colon outside the bold
+markers or with the text on the same line, and the JSON may lack its fence or
+carry trailing commas, single quotes or a truncated ending. `parse_response`
+finds every heading and code fence in one regex scan, so all of these still
+split into sections, and `decode_summary` repairs and validates the JSON
+instead of throwing the whole generation away.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+ENGLISH_PREFIX_MARKER = "**English Translation:**"
+SUMMARY_JSON_BLOCK_START_MARKER = "```json" # This is the crucial marker for the JSON content itself
+SUMMARY_JSON_BLOCK_END_MARKER = "```"
+
+# Sections in the order the prompt asks for them
+ORIGINAL, TRANSLATION, SUMMARY = "original", "translation", "summary"
+
+# One alternation for every token the scan cares about: section headings (with
+# or without bold/underscore markers, `#` prefixes and colons) and code fences
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<fence>```[ \t]*(?P<fence_lang>[A-Za-z]*))
+    |
+    ^[ \t>]*(?:(?P<hashes>\#{1,6})[ \t]*)?(?:(?P<open>\*\*|__)[ \t]*)?
+    (?P<label>(?:[^\s*_:#`][^\n*_:#`]{0,39}?)?
+        (?:(?P<original>transcription|transcript)|(?P<translation>translation)|(?P<summary>summary))
+        [^\n*_:#`]{0,20})
+    [ \t]*(?P<colon>:)?[ \t]*(?P<close>\*\*|__)?[ \t]*(?P<colon_after>:)?[ \t]*
+    """,
+    re.IGNORECASE | re.MULTILINE | re.VERBOSE,
+)
+
+# Summary keys as the model sometimes names them, mapped to the schema's names
+SUMMARY_KEY_ALIASES = {
+    "title": "title",
+    "heading": "title",
+    "category": "category",
+    "type": "category",
+    "instructions": "instructions",
+    "steps": "instructions",
+    "summary_text": "summary_text",
+    "summary": "summary_text",
+    "text": "summary_text",
+}
+DEFAULT_SUMMARY_CATEGORY = "General Summary"
+
+
+def original_lang_prefix_marker(language):
+    """Returns the heading Gemini uses for the original-language transcription."""
+    return f"**{language} Transcription:**"
+
+
+@dataclass
+class ParsedResponse:
+    """The sections extracted from one Gemini response."""
+
+    original_lang_text: str = ""
+    translated_text: str = ""
+    summary_data: Optional[dict] = None
+    error: Optional[str] = None # Human-readable reason parsing failed, if it did
+    json_string: Optional[str] = None # The JSON block that was (or failed to be) decoded
+    indices: dict = field(default_factory=dict) # Section positions, for debugging
+    repairs: list = field(default_factory=list) # Fixes applied to get here, e.g. "json_repaired"
+
+    @property
+    def ok(self):
+        """True when all three sections were extracted."""
+        return bool(self.original_lang_text and self.translated_text and self.summary_data)
+
+    def to_dict(self):
+        """Returns the fields that are worth caching or saving."""
+        return {
+            "original_lang_text": self.original_lang_text,
+            "translated_text": self.translated_text,
+            "summary_data": self.summary_data,
+        }
+
+
+def _is_heading(match):
+    """True when a heading-shaped match is marked up as a heading rather than prose."""
+    if match.group("fence") is not None:
+        return False
+    marked = match.group("hashes") or (match.group("open") and match.group("close"))
+    if match.group("summary"):
+        # "Summary:" at the start of a translated sentence is prose; only a
+        # marked-up heading or one that says JSON ends the translation
+        return bool(marked or "json" in match.group("label").lower())
+    return bool(marked or match.group("colon") or match.group("colon_after"))
+
+
+def scan_sections(text):
+    """Finds the sections of a response in one pass over its headings and fences.
+
+    Returns `{section: (start, end)}` for the transcription, translation and
+    summary JSON that were found, where the summary span covers the fenced
+    block (or everything after its heading when there is no fence). Headings
+    are only accepted in prompt order, so a later "translation" in the
+    transcribed text does not split it.
+    """
+    spans = {}
+    current, current_start = None, 0
+    summary_heading_end = None
+    fence_start = None
+    for match in _TOKEN_RE.finditer(text):
+        if match.group("fence") is not None:
+            if fence_start is not None:
+                spans[SUMMARY] = (fence_start, match.start())
+                break
+            if current in (TRANSLATION, SUMMARY):
+                if current == TRANSLATION:
+                    spans[TRANSLATION] = (current_start, match.start())
+                current = SUMMARY
+                fence_start = match.end()
+            continue
+        if not _is_heading(match):
+            continue
+        if match.group("original") and current is None:
+            section = ORIGINAL
+        elif match.group("translation") and current == ORIGINAL:
+            section = TRANSLATION
+        elif match.group("summary") and current == TRANSLATION:
+            section = SUMMARY
+            summary_heading_end = match.end()
+        else:
+            continue
+        if current is not None:
+            spans[current] = (current_start, match.start())
+        current, current_start = section, match.end()
+    else:
+        # Ran out of tokens: close whatever section is still open
+        if fence_start is not None:
+            spans[SUMMARY] = (fence_start, len(text)) # Truncated before the closing fence
+        elif current == SUMMARY:
+            spans[SUMMARY] = (summary_heading_end, len(text))
+        elif current is not None:
+            spans[current] = (current_start, len(text))
+    return spans
+
+
+# --- JSON repair ---
+_REPAIR_TOKEN_RE = re.compile(r"""//[^\n]*|/\*.*?\*/|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|[A-Za-z_][A-Za-z0-9_]*|\S""", re.DOTALL)
+_BARE_WORDS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+# Quotes that may open a string outside one, and the quotes that may close it
+_STRING_CLOSERS = {'"': '"”', "“": '”"', "”": '”"', "'": "'", "‘": "’'", "’": "’'"}
+_ESCAPED_CONTROL = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _closes_string(text, pos):
+    """True when the quote at `pos` is followed by something that can follow a JSON string.
+
+    A quote followed by anything else is taken to be part of the text (an
+    apostrophe, or quotes the model forgot to escape). After a line break,
+    another string also counts, for a comma missing at the end of a line.
+    """
+    crossed_line = False
+    for ch in text[pos + 1:pos + 256]:
+        if ch == "\n":
+            crossed_line = True
+        elif not ch.isspace():
+            return ch in ",:}]" or (crossed_line and ch in _STRING_CLOSERS)
+    return True # End of text (or only whitespace) after the quote
+
+
+def repair_json(text):
+    """Rewrites almost-JSON into JSON in one pass.
+
+    Handles the defects models produce: single or curly quotes, unescaped
+    quotes and raw newlines inside strings, Python `True`/`False`/`None`,
+    unquoted keys, comments, missing and trailing commas, and output that was
+    cut off before its closing quotes and brackets. Anything after the first
+    complete top-level value is dropped.
+    """
+    start = text.find("{")
+    if start == -1:
+        start = text.find("[")
+    if start == -1:
+        return text
+    out = []
+    stack = [] # Closers expected for the open objects/arrays
+    last = "" # Last significant character written, to spot missing or trailing commas
+    pos = start
+    while pos < len(text):
+        ch = text[pos]
+        if ch.isspace():
+            pos += 1
+            continue
+        if ch in _STRING_CLOSERS:
+            if last in ('"', "}", "]") or last.isalnum():
+                out.append(",")
+            closers = _STRING_CLOSERS[ch]
+            chars = ['"']
+            pos += 1
+            while pos < len(text):
+                ch = text[pos]
+                if ch == "\\" and pos + 1 < len(text):
+                    chars.append(text[pos:pos + 2])
+                    pos += 2
+                    continue
+                if ch in closers and _closes_string(text, pos):
+                    break
+                if ch == '"':
+                    chars.append('\\"')
+                else:
+                    chars.append(_ESCAPED_CONTROL.get(ch, ch))
+                pos += 1
+            chars.append('"')
+            out.append("".join(chars))
+            last = '"'
+            pos += 1
+            continue
+        match = _REPAIR_TOKEN_RE.match(text, pos)
+        token = match.group()
+        pos = match.end()
+        if token.startswith(("//", "/*")):
+            continue
+        if token in "{[":
+            if last in ('"', "}", "]") or last.isalnum():
+                out.append(",")
+            stack.append("}" if token == "{" else "]")
+        elif token in "}]":
+            if not stack or stack[-1] != token:
+                continue # Stray closer
+            if last == ",":
+                out.pop()
+            stack.pop()
+        elif token == ",":
+            if last in ("", ",", "{", "["):
+                continue
+        elif token == ":":
+            pass
+        elif token[0].isalnum() or token[0] in "-_":
+            if last in ('"', "}", "]") or last.isalnum():
+                out.append(",")
+            if token[0].isalpha() or token[0] == "_":
+                token = _BARE_WORDS.get(token, json.dumps(token)) # Unquoted keys become strings
+        else:
+            continue # Anything else outside a string (ellipses, stray prose) is dropped
+        out.append(token)
+        last = token[-1]
+        if not stack:
+            break # The top-level value is complete
+    # Close a truncated value
+    if last == ",":
+        out.pop()
+    elif last == ":":
+        out.append("null")
+    out.extend(reversed(stack))
+    return "".join(out)
+
+
+# --- Summary schema ---
+def validate_summary(data):
+    """Checks `data` against the summary schema, coercing near misses.
+
+    The schema is a dict with a string `title` and `category` and either an
+    `instructions` list of strings (tutorials) or a `summary_text` string.
+    Key aliases (`steps`, `summary`, capitalised keys), instructions given as
+    one string or as step objects and a missing category are fixed up.
+    Returns `(summary, problems)`; the summary is only usable when `problems`
+    is empty.
+    """
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        return None, [f"summary is a {type(data).__name__}, not an object"]
+    if len(data) == 1 and isinstance(next(iter(data.values())), dict):
+        data = next(iter(data.values())) # {"summary": {...}}
+    summary = {}
+    for key, value in data.items():
+        normalized = str(key).strip().lower().replace(" ", "_")
+        summary.setdefault(SUMMARY_KEY_ALIASES.get(normalized, key), value)
+
+    instructions = summary.get("instructions")
+    if isinstance(instructions, str):
+        instructions = [line.strip() for line in instructions.splitlines() if line.strip()]
+    if isinstance(instructions, list):
+        steps = []
+        for step in instructions:
+            if isinstance(step, dict):
+                step = step.get("text") or step.get("step") or next((v for v in step.values() if isinstance(v, str)), "")
+            if step not in (None, ""):
+                steps.append(str(step))
+        summary["instructions"] = steps
+    if isinstance(summary.get("summary_text"), list):
+        summary["summary_text"] = " ".join(str(part) for part in summary["summary_text"])
+    if not summary.get("category"):
+        summary["category"] = DEFAULT_SUMMARY_CATEGORY
+
+    problems = []
+    if not isinstance(summary.get("title"), str) or not summary["title"].strip():
+        problems.append("missing title")
+    if not isinstance(summary["category"], str):
+        problems.append("category is not a string")
+    has_instructions = bool(summary.get("instructions"))
+    has_text = isinstance(summary.get("summary_text"), str) and summary["summary_text"].strip()
+    if not (has_instructions or has_text):
+        problems.append("missing instructions or summary_text")
+    return summary, problems
+
+
+def decode_summary(json_string):
+    """Decodes and validates a summary JSON block.
+
+    The text may still carry prose or a fence around the object. Returns
+    `(summary, repairs)`; raises `ValueError` with a human-readable reason
+    when the JSON cannot be repaired or does not fit the schema.
+    """
+    repairs = []
+    start = json_string.find("{")
+    if start == -1:
+        raise ValueError("Failed to parse Summary JSON: no JSON object found.")
+    try:
+        data, _ = json.JSONDecoder().raw_decode(json_string, start)
+    except json.JSONDecodeError as e:
+        try:
+            data = json.loads(repair_json(json_string[start:]))
+        except json.JSONDecodeError:
+            raise ValueError(f"Failed to parse Summary JSON. JSONDecodeError: {e}") from None
+        repairs.append("json_repaired")
+    summary, problems = validate_summary(data)
+    if problems:
+        raise ValueError(f"Summary JSON does not match the expected schema: {', '.join(problems)}.")
+    if summary != data:
+        repairs.append("summary_coerced")
+    return summary, repairs
+
+
+def parse_response(full_response_text, language=None):
+    """Splits a full Gemini response into its transcription, translation and summary parts.
+
+    `language` is accepted for symmetry with the prompt builders; headings are
+    recognised whatever language they name.
+    """
+    spans = scan_sections(full_response_text)
+    parsed = ParsedResponse(indices={section: start for section, (start, _) in spans.items()})
+    if ORIGINAL not in spans or TRANSLATION not in spans:
+        parsed.error = "Gemini API response did not contain all expected sections in the correct order, or parsing markers were not found."
+        return parsed
+    parsed.original_lang_text = full_response_text[slice(*spans[ORIGINAL])].strip()
+    parsed.translated_text = full_response_text[slice(*spans[TRANSLATION])].strip()
+    if SUMMARY not in spans:
+        parsed.error = "Gemini API response did not contain a Summary JSON block."
+        return parsed
+    parsed.json_string = full_response_text[slice(*spans[SUMMARY])].strip()
+    try:
+        parsed.summary_data, parsed.repairs = decode_summary(parsed.json_string)
+    except ValueError as e:
+        parsed.error = str(e)
+    return parsed
@@ -0,0 +1,294 @@
+"""The upload → generate → parse → save flow for a single audio file.
+
+`client` is anything with `upload_file(path)` and `delete_file(name)` (the
+`google.generativeai` module in production) and `model` is anything with
+`generate_content(contents)`, so the flow can run against a local stub.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from parampara_ai.cache import cache_key, hash_file
+from parampara_ai.index import RecordIndex
+from parampara_ai.metrics import RequestMetrics, timed
+from parampara_ai.parsing import ParsedResponse, decode_summary, parse_response
+from parampara_ai.preprocess import AudioToolError, PreprocessedAudio, preprocess_audio
+from parampara_ai.prompts import JSON_GENERATION_CONFIG, MODEL_NAME, PROMPT_TEMPLATE, build_prompt, build_summary_prompt
+from parampara_ai.recordstore import read_record
+from parampara_ai.storage import DATA_DIR, save_record
+from parampara_ai.streaming import IncrementalParser
+
+
+class ResponseParseError(ValueError):
+    """Raised when a Gemini response cannot be split into all three sections."""
+
+    def __init__(self, message, raw_text, parsed=None):
+        super().__init__(message)
+        self.raw_text = raw_text
+        self.parsed = parsed
+
+
+@dataclass
+class ProcessResult:
+    """Outcome of processing one audio file."""
+
+    parsed: ParsedResponse
+    file_id: Optional[str] = None # Set when the record was saved
+    location: Optional[str] = None # ...and where (see `recordstore.describe_location`)
+    cached: bool = False # True when the result came from the result cache
+    existing_record: bool = False # True when a cache hit returned a record saved earlier with the same metadata
+    duration: float = 0.0
+    raw_text: Optional[str] = None # The raw Gemini response, when one was requested
+    time_to_first_text: Optional[float] = None # Seconds until transcription text was available
+    metrics: Optional[RequestMetrics] = None # Stage timings, when they were collected
+    preprocessed: Optional[PreprocessedAudio] = None # Size and duration savings, when the audio was preprocessed
+
+
+def generate(client, model, audio_path, prompt, on_chunk=None, metrics=None):
+    """Uploads `audio_path`, asks `model` for a response and returns its text.
+
+    When `on_chunk` is given the response is streamed (`stream=True`) and
+    `on_chunk(text)` is called for every chunk as it arrives. The uploaded
+    file is always deleted from Gemini's storage afterwards. Stage timings
+    are added to `metrics` when it is given.
+    """
+    with timed(metrics, "upload_file"):
+        audio_data = client.upload_file(audio_path)
+    if not audio_data or not audio_data.name:
+        raise ValueError("Gemini file upload failed.")
+    try:
+        contents = [
+            {"role": "user", "parts": [
+                {"text": prompt},
+                audio_data # The audio file content
+            ]}
+        ]
+        with timed(metrics, "generate_content"):
+            if on_chunk is None:
+                return model.generate_content(contents).text
+            chunks = []
+            for chunk in model.generate_content(contents, stream=True):
+                chunks.append(chunk.text)
+                on_chunk(chunk.text)
+            return "".join(chunks)
+    finally:
+        with timed(metrics, "remote_cleanup"):
+            try:
+                client.delete_file(audio_data.name)
+            except Exception:
+                pass # Remote files expire on their own; a failed cleanup is not fatal
+
+
+def prepare_upload(audio_path, metrics=None):
+    """Preprocesses `audio_path` for upload (see `parampara_ai.preprocess`).
+
+    Returns the `PreprocessedAudio`, or None when the original should be
+    uploaded instead: it could not be decoded (e.g. no ffmpeg for an MP3), or
+    preprocessing neither shrank it nor trimmed any silence. The outcome and
+    savings are added to `metrics`.
+    """
+    try:
+        with timed(metrics, "preprocess"):
+            prepared = preprocess_audio(audio_path)
+    except AudioToolError:
+        if metrics is not None:
+            metrics.fields["preprocess"] = "skipped"
+        return None
+    if prepared.bytes_saved <= 0 and prepared.trimmed_seconds < 1:
+        prepared.remove()
+        if metrics is not None:
+            metrics.fields["preprocess"] = "no_gain"
+        return None
+    if metrics is not None:
+        metrics.fields["preprocess"] = "ok"
+        metrics.fields.update(prepared.to_dict())
+    return prepared
+
+
+def record_savings(prepared, metrics):
+    """Adds the estimated end-to-end seconds saved by preprocessing to `metrics`."""
+    if prepared is None or metrics is None:
+        return
+    metrics.fields["estimated_seconds_saved"] = round(prepared.estimated_seconds_saved(
+        metrics.stages.get("upload_file", 0.0), metrics.stages.get("generate_content", 0.0),
+    ), 3)
+
+
+def recover_summary(model, language, parsed, metrics=None):
+    """Asks `model` for just the summary when a response's JSON was unusable.
+
+    Used when the transcription and translation were parsed but the summary
+    JSON was missing, broken beyond repair or off-schema: a text-only request
+    in JSON mode (`response_mime_type`) is far cheaper than regenerating the
+    whole response. Updates `parsed` in place and returns True on success; on
+    failure the original parse error is kept.
+    """
+    if parsed.ok or not (parsed.original_lang_text and parsed.translated_text):
+        return False
+    try:
+        with timed(metrics, "summary_fallback"):
+            response = model.generate_content(
+                build_summary_prompt(language, parsed.translated_text),
+                generation_config=JSON_GENERATION_CONFIG,
+            )
+            parsed.summary_data, repairs = decode_summary(response.text)
+    except Exception:
+        return False # Report the original parse error
+    parsed.error = None
+    parsed.repairs += ["summary_fallback", *repairs]
+    return True
+
+
+def _same_metadata(record, metadata):
+    """True when `record` was saved with the username, coordinates and category in `metadata`."""
+    coordinates = record.get("coordinates") or {}
+    return (record.get("username") == (metadata.get("username") or "Anonymous") # As save_record fills them in
+            and coordinates.get("latitude") == (metadata.get("latitude") or None)
+            and coordinates.get("longitude") == (metadata.get("longitude") or None)
+            and record.get("category") == metadata.get("category"))
+
+
+def find_saved_record(record_ids, metadata, data_dir=DATA_DIR):
+    """Returns the index row of the first of `record_ids` saved with the same metadata, or None."""
+    record_index = RecordIndex(data_dir)
+    record_index.sync() # Records saved by other processes since the last sync count too
+    for record_id in record_ids:
+        row = record_index.get(record_id)
+        if row is not None and _same_metadata(read_record(row["path"], data_dir, resolve_prompt=False), metadata):
+            return row
+    return None
+
+
+def process_audio(audio_path, language, client, model, metadata=None, cache=None,
+                  model_name=MODEL_NAME, data_dir=DATA_DIR, stream=False, on_update=None,
+                  audio_digest=None, recorder=None, metrics=None, preprocess=False):
+    """Transcribes, translates and summarises one file and saves the record.
+
+    `metadata` may carry `username`, `latitude`, `longitude`, `category` and
+    `audio_file` (the name of the original recording).
+    `audio_digest` is the SHA-256 of the file when the caller already has it
+    (e.g. from `spool_upload`), which saves hashing the file a second time.
+    With `stream=True` the response is parsed incrementally and
+    `on_update(parser)` is called with the `IncrementalParser` after every
+    chunk. Raises `ResponseParseError` when the response is missing a section.
+
+    When a `recorder` is given, per-stage timings are written to it once the
+    request finishes (successfully or not). Callers that timed earlier stages
+    themselves (e.g. the temp-file write) can pass their own `metrics`.
+
+    With `preprocess=True` a mono, 16 kHz, silence-trimmed and compressed copy
+    is uploaded instead of the original (when one can be made); the cache key
+    stays that of the original audio.
+
+    The cache remembers the IDs of the records each result was saved as. A
+    hit returns one of them that is still in the index and has the same
+    username, coordinates and category as `metadata` (`file_id`,
+    `location`, `existing_record=True`) instead of saving a duplicate;
+    otherwise the cached texts are saved as a new record.
+    """
+    metadata = metadata or {}
+    start_time = time.time()
+    if metrics is None and (recorder is not None or preprocess):
+        metrics = RequestMetrics() # Preprocessing savings are estimated from the stage timings
+    if metrics is not None:
+        metrics.model, metrics.language = model_name, language
+        metrics.audio_bytes = os.path.getsize(audio_path)
+        metrics.fields["stream"] = stream
+
+    prepared = None
+    try:
+        prompt = build_prompt(language)
+        with timed(metrics, "hash"):
+            key = cache_key(audio_digest or hash_file(audio_path), language, model_name, PROMPT_TEMPLATE)
+
+        with timed(metrics, "cache_lookup"):
+            cached_result = cache.get(key) if cache else None
+        cached_record_ids = []
+        time_to_first_text = None
+        upload_path = audio_path
+        if not cached_result and preprocess:
+            prepared = prepare_upload(audio_path, metrics)
+            if prepared is not None:
+                upload_path = prepared.path
+        if cached_result:
+            cached_record_ids = cached_result.pop("record_ids", []) # Empty for entries cached before records were linked
+            parsed = ParsedResponse(**cached_result)
+            raw_text = None
+            time_to_first_text = time.time() - start_time
+        elif stream:
+            parser = IncrementalParser(language)
+
+            def on_chunk(text):
+                nonlocal time_to_first_text
+                parser.feed(text)
+                if time_to_first_text is None and parser.original_lang_text:
+                    time_to_first_text = time.time() - start_time
+                if on_update:
+                    on_update(parser)
+
+            raw_text = generate(client, model, upload_path, prompt, on_chunk=on_chunk, metrics=metrics)
+            with timed(metrics, "parse"):
+                parsed = parser.finish()
+        else:
+            raw_text = generate(client, model, upload_path, prompt, metrics=metrics)
+            time_to_first_text = time.time() - start_time # Nothing is shown before the full response
+            with timed(metrics, "parse"):
+                parsed = parse_response(raw_text, language)
+        if not cached_result:
+            record_savings(prepared, metrics)
+            recover_summary(model, language, parsed, metrics)
+        if metrics is not None and raw_text is not None:
+            metrics.response_bytes = len(raw_text.encode("utf-8"))
+            if parsed.repairs:
+                metrics.fields["parse_repairs"] = parsed.repairs
+        if not cached_result and not parsed.ok:
+            raise ResponseParseError(parsed.error or "Gemini response is missing a section.", raw_text, parsed)
+
+        existing = find_saved_record(cached_record_ids, metadata, data_dir) if cached_record_ids else None
+        if existing is not None:
+            file_id, location = existing["id"], existing["path"]
+        else:
+            with timed(metrics, "save_data"):
+                file_id, location = save_record(
+                    transcription_original_lang=parsed.original_lang_text,
+                    translation=parsed.translated_text,
+                    summary=parsed.summary_data,
+                    system_prompt=prompt,
+                    username_val=metadata.get("username"),
+                    latitude_val=metadata.get("latitude"),
+                    longitude_val=metadata.get("longitude"),
+                    category_val=metadata.get("category"),
+                    selected_lang_val=language,
+                    audio_file_val=metadata.get("audio_file"),
+                    model_val=model_name,
+                    data_dir=data_dir,
+                )
+            if cache: # Cached once saved, with the records it was saved as
+                cache.put(key, dict(parsed.to_dict(), record_ids=[*cached_record_ids, file_id]))
+        if metrics is not None:
+            metrics.outcome = "cached" if cached_result else "ok"
+            metrics.fields["time_to_first_text"] = time_to_first_text
+    except Exception as e:
+        if metrics is not None:
+            metrics.outcome = type(e).__name__
+        raise
+    finally:
+        if prepared is not None:
+            prepared.remove()
+        if recorder is not None:
+            recorder.record(metrics)
+
+    return ProcessResult(
+        parsed=parsed,
+        file_id=file_id,
+        location=location,
+        cached=bool(cached_result),
+        existing_record=existing is not None,
+        duration=time.time() - start_time,
+        raw_text=raw_text,
+        time_to_first_text=time_to_first_text,
+        metrics=metrics,
+        preprocessed=prepared,
+    )
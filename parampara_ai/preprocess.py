@@ -0,0 +1,379 @@
+"""Local audio preprocessing before upload.
+
+Upload time grows with the file size and model latency with the audio
+duration, while what users upload is often full-bitrate stereo WAV or video.
+`preprocess_audio` keeps only what transcription needs: the audio track,
+downmixed to mono and resampled to 16 kHz speech bandwidth, with leading and
+trailing silence trimmed by a vectorized NumPy energy detector, re-encoded to
+a compact codec (Opus by default).
+
+The recording is streamed through in blocks of `BLOCK_SAMPLES`: decoded
+samples are spooled to a 16-bit file next to the output while the frame
+energies are measured, then the speech span is read back and encoded. Memory
+stays at a block or two however long the recording is.
+
+Decoding and encoding use `ffmpeg` when it is on the PATH. Without it, WAV
+files are still downmixed, resampled and trimmed in NumPy and written as
+16-bit WAV; other formats raise `AudioToolError`, and callers upload the
+original instead.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import wave
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+SPEECH_SAMPLE_RATE = 16000
+FFMPEG_LOG_TAIL_BYTES = 4096 # Of a failed decode's log, kept on the CalledProcessError
+
+# Codec name -> (file extension, ffmpeg encoder arguments)
+CODECS = {
+    "opus": (".ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]),
+    "mp3": (".mp3", ["-c:a", "libmp3lame", "-b:a", "32k"]),
+    "flac": (".flac", ["-c:a", "flac"]),
+    "wav": (".wav", ["-c:a", "pcm_s16le"]),
+}
+DEFAULT_CODEC = "opus"
+
+# Silence detection
+FRAME_SECONDS = 0.03
+SILENCE_THRESHOLD_DB = -35.0 # Frames this far below the loudest frame count as silence
+SILENCE_FLOOR_DB = -60.0 # ...and so does anything quieter than this, however quiet the recording
+SILENCE_PAD_SECONDS = 0.25 # Kept around the speech so word onsets are not clipped
+
+BLOCK_SAMPLES = 1 << 18 # Samples decoded, measured or encoded at a time (about 16 s at 16 kHz)
+
+
+class AudioToolError(RuntimeError):
+    """Raised when a recording cannot be measured, split or preprocessed."""
+
+
+@dataclass
+class PreprocessedAudio:
+    """A preprocessed copy of a recording and what preprocessing saved."""
+
+    path: Optional[str] # None for the totals of several segments (see `combine`)
+    codec: str
+    original_bytes: int
+    processed_bytes: int
+    original_seconds: float
+    processed_seconds: float
+    seconds: float = 0.0 # Time spent preprocessing
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - self.processed_bytes
+
+    @property
+    def trimmed_seconds(self):
+        return self.original_seconds - self.processed_seconds
+
+    def estimated_seconds_saved(self, upload_seconds, generate_seconds):
+        """Estimates the end-to-end time saved against uploading the original.
+
+        Upload time is taken to scale with bytes and generation time with
+        audio duration (Gemini bills audio by the second, whatever the
+        bitrate); the time spent preprocessing is subtracted.
+        """
+        saved = 0.0
+        if self.processed_bytes:
+            saved += upload_seconds * self.bytes_saved / self.processed_bytes
+        if self.processed_seconds:
+            saved += generate_seconds * self.trimmed_seconds / self.processed_seconds
+        return saved - self.seconds
+
+    def to_dict(self):
+        return {
+            "codec": self.codec,
+            "original_bytes": self.original_bytes,
+            "uploaded_bytes": self.processed_bytes,
+            "bytes_saved": self.bytes_saved,
+            "trimmed_seconds": round(self.trimmed_seconds, 3),
+            "preprocess_seconds": round(self.seconds, 3),
+        }
+
+    def remove(self):
+        """Deletes the preprocessed file, ignoring it if it is already gone."""
+        if self.path is None:
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def combine(cls, parts):
+        """The summed savings of preprocessing each segment of a recording separately."""
+        return cls(
+            path=None,
+            codec=parts[0].codec,
+            original_bytes=sum(part.original_bytes for part in parts),
+            processed_bytes=sum(part.processed_bytes for part in parts),
+            original_seconds=sum(part.original_seconds for part in parts),
+            processed_seconds=sum(part.processed_seconds for part in parts),
+            seconds=sum(part.seconds for part in parts),
+        )
+
+
+def describe_savings(savings, seconds_saved=None):
+    """One line describing a `PreprocessedAudio.to_dict()`, e.g. for a status table."""
+    share = savings["bytes_saved"] / savings["original_bytes"] if savings["original_bytes"] else 0.0
+    text = (f"{savings['original_bytes'] / 1e6:.2f} MB → {savings['uploaded_bytes'] / 1e6:.2f} MB ({share:.0%} smaller), "
+            f"{savings['trimmed_seconds']:.1f}s of silence trimmed")
+    if seconds_saved is not None:
+        text += f", about {seconds_saved:.2f}s faster end to end"
+    return text
+
+
+# --- Decoding ---
+def _wav_samples(raw, width):
+    """Converts little-endian PCM frames of `width` bytes to int16-scaled float32."""
+    if width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) * 256
+    if width == 2:
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32)
+    if width == 3:
+        triples = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = triples[:, 0] | (triples[:, 1] << 8) | (triples[:, 2] << 16)
+        return (np.where(values >= 1 << 23, values - (1 << 24), values) / 256).astype(np.float32)
+    return (np.frombuffer(raw, dtype="<i4") / 65536).astype(np.float32)
+
+
+def downmix(samples, channels):
+    """Averages interleaved channels into one."""
+    if channels == 1:
+        return samples
+    frames = len(samples) // channels
+    return samples[:frames * channels].reshape(frames, channels).mean(axis=1)
+
+
+def resample_blocks(blocks, rate, total_samples, target_rate=SPEECH_SAMPLE_RATE):
+    """Linearly resamples consecutive blocks of one recording of `total_samples` samples.
+
+    When downsampling, a box filter runs first (crude anti-aliasing; ffmpeg
+    does this properly when it is available). The filter carries its last
+    few input samples into the next block and the interpolation its last
+    sample, so the output does not depend on where the blocks are cut.
+    """
+    if rate == target_rate:
+        yield from blocks
+        return
+    step = rate / target_rate
+    width = int(round(step)) if rate > target_rate else 1
+    kernel = np.full(width, 1 / width, dtype=np.float32)
+    history = np.zeros(width - 1, dtype=np.float32)
+    count = int(total_samples / rate * target_rate)
+    tail = np.empty(0, dtype=np.float32)
+    base = 0 # Input position of tail[0]
+    produced = 0
+    for block in blocks:
+        if width > 1:
+            padded = np.concatenate([history, block])
+            history = padded[len(padded) - (width - 1):]
+            block = np.convolve(padded, kernel, mode="valid")
+        buffer = np.concatenate([tail, block])
+        if not len(buffer):
+            continue
+        last = base + len(buffer) - 1
+        stop = min(count, int(last / step) + 1) # Output samples that lie within this buffer
+        if stop > produced:
+            positions = np.arange(produced, stop) * step - base
+            yield np.interp(positions, np.arange(len(buffer)), buffer).astype(np.float32)
+            produced = stop
+        tail, base = buffer[-1:], last
+    if produced < count and len(tail):
+        yield np.full(count - produced, tail[0], dtype=np.float32) # Rounding at the very end
+
+
+def resample(samples, rate, target_rate=SPEECH_SAMPLE_RATE):
+    """`resample_blocks` for samples already in memory."""
+    if rate == target_rate or not len(samples):
+        return samples
+    return np.concatenate([np.empty(0, dtype=np.float32), *resample_blocks([samples], rate, len(samples), target_rate)])
+
+
+def _ffmpeg_blocks(path, sample_rate, block_samples):
+    # stderr goes to a file: a damaged recording can log more errors than a pipe
+    # holds, and ffmpeg would block on them while we wait for its stdout
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(
+            ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-"],
+            stdout=subprocess.PIPE, stderr=log,
+        )
+        try:
+            while pcm := process.stdout.read(block_samples * 2):
+                yield np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+            if process.wait():
+                log.seek(max(0, log.tell() - FFMPEG_LOG_TAIL_BYTES))
+                raise subprocess.CalledProcessError(process.returncode, process.args, stderr=log.read())
+        finally:
+            if process.poll() is None: # Abandoned part way through
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+def _wav_blocks(path, sample_rate, block_samples):
+    with wave.open(path, "rb") as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        if width not in (1, 2, 3, 4):
+            raise AudioToolError(f"Unsupported WAV sample width: {width} bytes")
+        frames_per_block = max(1, block_samples * rate // sample_rate)
+        blocks = (downmix(_wav_samples(raw, width), channels)
+                  for raw in iter(lambda: wav.readframes(frames_per_block), b""))
+        yield from resample_blocks(blocks, rate, wav.getnframes(), sample_rate)
+
+
+def decode_blocks(path, sample_rate=SPEECH_SAMPLE_RATE, block_samples=BLOCK_SAMPLES):
+    """Yields the audio track of `path` as mono float32 samples at `sample_rate`, a block at a time."""
+    if shutil.which("ffmpeg"):
+        return _ffmpeg_blocks(path, sample_rate, block_samples)
+    if not path.lower().endswith(".wav"):
+        raise AudioToolError("ffmpeg is required to preprocess non-WAV recordings.")
+    return _wav_blocks(path, sample_rate, block_samples)
+
+
+# --- Silence trimming ---
+class _LevelMeter:
+    """Frame energies of a recording fed in blocks (one float per frame is kept, not the samples)."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.samples = 0
+        self.powers = []
+        self._partial = np.empty(0, dtype=np.float32)
+
+    def feed(self, samples):
+        self.samples += len(samples)
+        if len(self._partial):
+            samples = np.concatenate([self._partial, samples])
+        count = len(samples) // self.frame
+        frames = samples[:count * self.frame].reshape(count, self.frame)
+        self.powers.append(np.einsum("ij,ij->i", frames, frames) / self.frame)
+        self._partial = samples[count * self.frame:]
+
+    def levels_db(self):
+        power = np.concatenate([np.empty(0), *self.powers])
+        return 10 * np.log10(power / 32768.0 ** 2 + 1e-12)
+
+
+def _bounds(level_db, total, frame, sample_rate, threshold_db, floor_db, pad_seconds):
+    count = len(level_db)
+    if count == 0:
+        return 0, total
+    loud = np.flatnonzero(level_db > max(level_db.max() + threshold_db, floor_db))
+    if not loud.size:
+        return 0, total
+    pad = int(pad_seconds * sample_rate)
+    end = total if loud[-1] == count - 1 else (loud[-1] + 1) * frame # Keep the partial last frame
+    return int(max(0, loud[0] * frame - pad)), int(min(total, end + pad))
+
+
+def speech_bounds(samples, sample_rate, frame_seconds=FRAME_SECONDS, threshold_db=SILENCE_THRESHOLD_DB,
+                  floor_db=SILENCE_FLOOR_DB, pad_seconds=SILENCE_PAD_SECONDS):
+    """Returns `(start, end)` sample indices around everything louder than silence.
+
+    Frame energies are computed for the whole recording at once; a recording
+    that is silent throughout is returned untouched.
+    """
+    meter = _LevelMeter(max(1, int(sample_rate * frame_seconds)))
+    meter.feed(samples)
+    return _bounds(meter.levels_db(), len(samples), meter.frame, sample_rate, threshold_db, floor_db, pad_seconds)
+
+
+# --- Encoding ---
+def _to_pcm16(samples):
+    return np.clip(np.round(samples), -32768, 32767).astype("<i2").tobytes()
+
+
+def encode_blocks(blocks, target, codec=DEFAULT_CODEC, sample_rate=SPEECH_SAMPLE_RATE):
+    """Writes blocks of mono samples to `target` with `codec` (16-bit WAV without ffmpeg)."""
+    if codec == "wav" or not shutil.which("ffmpeg"):
+        with wave.open(target, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            for block in blocks:
+                wav.writeframes(_to_pcm16(block))
+        return
+    process = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-v", "error", "-y", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "-",
+         *CODECS[codec][1], target],
+        stdin=subprocess.PIPE,
+    )
+    try:
+        for block in blocks:
+            process.stdin.write(_to_pcm16(block))
+        process.stdin.close()
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def encode(samples, target, codec=DEFAULT_CODEC, sample_rate=SPEECH_SAMPLE_RATE):
+    """Writes mono samples to `target` with `codec` (16-bit WAV without ffmpeg)."""
+    encode_blocks([samples], target, codec, sample_rate)
+
+
+def _spooled_blocks(spool, start, end, block_samples):
+    """Reads samples `start` to `end` back from a 16-bit spool file, a block at a time."""
+    spool.seek(start * 2)
+    remaining = end - start
+    while remaining > 0:
+        pcm = spool.read(min(remaining, block_samples) * 2)
+        if not pcm:
+            return
+        remaining -= len(pcm) // 2
+        yield np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+
+
+def preprocess_audio(path, dest_dir=None, codec=DEFAULT_CODEC, sample_rate=SPEECH_SAMPLE_RATE, trim_silence=True,
+                     block_samples=BLOCK_SAMPLES):
+    """Writes a mono, resampled, silence-trimmed and compressed copy of `path`.
+
+    The copy goes to a new temporary file (in `dest_dir` if given) that the
+    caller removes with `PreprocessedAudio.remove()`. Raises `AudioToolError`
+    when the recording cannot be decoded; the caller should then upload the
+    original.
+    """
+    start_time = time.perf_counter()
+    meter = _LevelMeter(max(1, int(sample_rate * FRAME_SECONDS)))
+    with tempfile.TemporaryFile(dir=dest_dir) as spool:
+        try:
+            for block in decode_blocks(path, sample_rate, block_samples):
+                meter.feed(block)
+                spool.write(_to_pcm16(block))
+        except (subprocess.CalledProcessError, wave.Error, EOFError) as e:
+            raise AudioToolError(f"Could not decode {os.path.basename(path)}: {e}") from None
+        total = meter.samples
+        start, end = 0, total
+        if trim_silence:
+            start, end = _bounds(meter.levels_db(), total, meter.frame, sample_rate,
+                                 SILENCE_THRESHOLD_DB, SILENCE_FLOOR_DB, SILENCE_PAD_SECONDS)
+
+        extension = CODECS[codec][0] if shutil.which("ffmpeg") else ".wav"
+        with tempfile.NamedTemporaryFile(delete=False, suffix=extension, dir=dest_dir) as temp_file:
+            target = temp_file.name
+        try:
+            encode_blocks(_spooled_blocks(spool, start, end, block_samples), target, codec, sample_rate)
+        except (subprocess.CalledProcessError, OSError) as e:
+            os.remove(target)
+            raise AudioToolError(f"Could not encode {os.path.basename(path)}: {e}") from None
+    return PreprocessedAudio(
+        path=target,
+        codec=codec if extension != ".wav" or codec == "wav" else "wav",
+        original_bytes=os.path.getsize(path),
+        processed_bytes=os.path.getsize(target),
+        original_seconds=total / sample_rate,
+        processed_seconds=(end - start) / sample_rate,
+        seconds=time.perf_counter() - start_time,
+    )
@@ -0,0 +1,105 @@
+"""Prompt template and model settings for the Gemini transcription pipeline."""
+
+import hashlib
+
+# Using gemini-1.5-flash which supports multimodal input including audio
+MODEL_NAME = "gemini-1.5-flash"
+
+# Text-only summary requests ask for bare JSON rather than a fenced block
+JSON_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+# The `{language}` placeholder is filled with the selected audio language.
+# Literal JSON braces are doubled for str.format(). The indentation is kept
+# as-is because the rendered prompt is saved with every record.
+PROMPT_TEMPLATE = """Please transcribe the following audio in {language}. Then, translate the {language} transcription into fluent, natural English.
+                    Finally, analyze the English translation and provide a structured summary in JSON format.
+                    If the content is a tutorial (e.g., pottery), structure the summary with a "title", a "category" (e.g., "Pottery Tutorial"), and an "instructions" array where each element is a numbered step.
+                    If it's not a tutorial, provide a "title", a "category" (e.g., "General Summary"), and a "summary_text" field.
+                    Ensure the meaning, tone, and context are preserved throughout. The input corpus might contain a mix of other languages and grammatical errors. Focus on the essence of the content.
+
+                    Format your full response clearly as follows, including the markdown bolding and newlines:
+
+                    **{language} Transcription:**
+                    [{language} Transcribed Text Here]
+
+                    **English Translation:**
+                    [Translated English Text Here]
+
+                    **Summary JSON:**
+                    ```json
+                    {{
+                      "title": "Summary Title",
+                      "category": "Pottery Tutorial" or "General Summary",
+                      "instructions": [
+                        "1. First step...",
+                        "2. Second step...",
+                        ...
+                      ]
+                    }}
+                    ```
+                    OR
+                    ```json
+                    {{
+                      "title": "Summary Title",
+                      "category": "General Summary",
+                      "summary_text": "A concise summary of the content."
+                    }}
+                    ```
+                    """
+
+
+def build_prompt(language):
+    """Renders the transcription/translation/summary prompt for `language`."""
+    return PROMPT_TEMPLATE.format(language=language)
+
+
+def prompt_hash(template=PROMPT_TEMPLATE):
+    """Returns a short, stable hash identifying a prompt template."""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+# List of common Indic languages. You can expand this list as needed.
+INDIC_LANGUAGES = [
+    "Hindi", "Bengali", "Marathi", "Telugu", "Tamil", "Gujarati",
+    "Kannada", "Malayalam", "Punjabi", "Odia", "Assamese", "Urdu", "Nepali", "Konkani"
+]
+DEFAULT_LANGUAGE = "Telugu"
+
+CATEGORIES = ["Story", "Interview", "News", "Tutorial: Pottery", "Other"]
+
+
+# --- Long recordings ---
+# Long recordings are transcribed segment by segment with SEGMENT_PROMPT_TEMPLATE,
+# then summarised once from the stitched English text with SUMMARY_PROMPT_TEMPLATE.
+SEGMENT_PROMPT_TEMPLATE = """Please transcribe the following audio in {language}. Then, translate the {language} transcription into fluent, natural English.
+This audio is one segment of a longer recording, so it may start or end mid-sentence; transcribe exactly what is spoken and do not add any introduction or summary.
+Ensure the meaning, tone, and context are preserved. The input might contain a mix of other languages and grammatical errors.
+
+Format your full response clearly as follows, including the markdown bolding and newlines:
+
+**{language} Transcription:**
+[{language} Transcribed Text Here]
+
+**English Translation:**
+[Translated English Text Here]
+"""
+
+SUMMARY_PROMPT_TEMPLATE = """Analyze the following English text, translated from a {language} recording, and provide a structured summary in JSON format.
+If the content is a tutorial (e.g., pottery), structure the summary with a "title", a "category" (e.g., "Pottery Tutorial"), and an "instructions" array where each element is a numbered step.
+If it's not a tutorial, provide a "title", a "category" (e.g., "General Summary"), and a "summary_text" field.
+
+Respond with only the JSON inside a ```json code block.
+
+English text:
+{text}
+"""
+
+
+def build_segment_prompt(language):
+    """Renders the transcription/translation prompt used for each segment."""
+    return SEGMENT_PROMPT_TEMPLATE.format(language=language)
+
+
+def build_summary_prompt(language, text):
+    """Renders the text-only summary prompt for the stitched translation."""
+    return SUMMARY_PROMPT_TEMPLATE.format(language=language, text=text)
@@ -0,0 +1,230 @@
+"""Request scheduling within Gemini's per-minute quotas.
+
+Gemini enforces requests-per-minute (RPM) and tokens-per-minute (TPM) limits
+per API key. Every `generate_content` call goes through one process-wide
+`RateLimiter` holding a token bucket for each limit: callers wait in FIFO
+order until both buckets have room instead of being sent off to fail, and a
+429 that slips through anyway (another process sharing the key, a low
+estimate) pauses the whole queue for a jittered backoff before the call is
+retried. Each 429 also halves the request rate, which then creeps back up to
+the configured limit with every successful call, so a limit set higher than
+the real quota settles just under it instead of failing repeatedly.
+
+Limits default to the `GEMINI_RPM` and `GEMINI_TPM` environment variables,
+or to the free-tier quota of gemini-1.5-flash.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from parampara_ai.batch import backoff_delay, is_transient
+
+DEFAULT_RPM = 15
+DEFAULT_TPM = 1_000_000
+
+# Gemini bills audio at 32 tokens per second; at typical upload bitrates
+# (64-128 kbit/s) that is at most about one token per 256 bytes
+AUDIO_TOKENS_PER_BYTE = 1 / 256
+TEXT_CHARS_PER_TOKEN = 4
+OUTPUT_TOKEN_ESTIMATE = 2048 # Transcription + translation + summary
+RECOVERY_STEP = 0.05 # Share of the configured RPM regained per successful call after a 429
+
+
+def estimate_tokens(contents):
+    """Roughly estimates the tokens a `generate_content` call will use.
+
+    Accepts what `generate_content` accepts: strings, `{"text": ...}` and
+    `{"parts": [...]}` dicts, uploaded files (sized by `size_bytes`) and lists
+    of those. The expected output is included.
+    """
+    def walk(value):
+        if isinstance(value, str):
+            return len(value) / TEXT_CHARS_PER_TOKEN
+        if isinstance(value, dict):
+            return walk(value.get("text", "")) + walk(value.get("parts", []))
+        if isinstance(value, (list, tuple)):
+            return sum(walk(item) for item in value)
+        return (getattr(value, "size_bytes", 0) or 0) * AUDIO_TOKENS_PER_BYTE
+    return int(walk(contents)) + OUTPUT_TOKEN_ESTIMATE
+
+
+class TokenBucket:
+    """Refills at `per_minute` units per minute, holding at most `capacity`."""
+
+    def __init__(self, per_minute, capacity=None, clock=time.monotonic):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` can be taken (0 when it can be taken now)."""
+        self._refill()
+        amount = min(amount, self.capacity) # A request larger than the bucket waits for a full one
+        shortfall = amount - self.level
+        return 0.0 if shortfall <= 1e-9 else shortfall / self.rate # Tolerate float rounding in the refill
+
+    def set_rate(self, per_minute):
+        """Changes the refill rate, keeping what has accrued so far."""
+        self._refill()
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+
+    def take(self, amount):
+        """Removes `amount`; the level may go negative to record debt."""
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Process-wide RPM/TPM scheduler shared by every Gemini call.
+
+    `acquire(tokens)` blocks in FIFO order until a request of that size fits
+    both limits. Counters for the status display are available from `stats()`.
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, clock=time.monotonic, sleep=time.sleep):
+        self.rpm, self.tpm = rpm, tpm
+        self.requests = TokenBucket(rpm, clock=clock)
+        self.tokens = TokenBucket(tpm, clock=clock)
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._queue = deque() # Tickets of waiting callers, oldest first
+        self._paused_until = 0.0
+        self._counters = {"requests": 0, "throttled": 0, "rate_limited": 0, "retries": 0, "tokens": 0}
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Builds a limiter from `GEMINI_RPM` / `GEMINI_TPM` (or the defaults)."""
+        return cls(
+            rpm=int(os.getenv("GEMINI_RPM", DEFAULT_RPM)),
+            tpm=int(os.getenv("GEMINI_TPM", DEFAULT_TPM)),
+            **kwargs,
+        )
+
+    def acquire(self, tokens):
+        """Waits until one request of `tokens` tokens fits within the limits."""
+        ticket = object()
+        throttled = False
+        with self._lock:
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._lock:
+                    if self._queue[0] is ticket:
+                        wait = max(
+                            self._paused_until - self.clock(),
+                            self.requests.wait_time(1),
+                            self.tokens.wait_time(tokens),
+                        )
+                        if wait <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            self._counters["requests"] += 1
+                            self._counters["tokens"] += tokens
+                            if throttled:
+                                self._counters["throttled"] += 1
+                            return
+                    else:
+                        wait = 0.05 # Not at the head of the queue yet
+                throttled = True
+                self.sleep(min(wait, 1.0)) # Re-check regularly; a pause may be lifted or extended
+        finally:
+            with self._lock:
+                self._queue.remove(ticket)
+
+    def adjust(self, tokens):
+        """Charges (or refunds, if negative) the difference from an estimate."""
+        with self._lock:
+            self.tokens.take(tokens)
+            self._counters["tokens"] += tokens
+
+    def pause(self, seconds):
+        """Holds every queued request for `seconds` (after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+
+    def record_rate_limited(self):
+        """Halves the request rate after a 429."""
+        with self._lock:
+            self._counters["rate_limited"] += 1
+            self.requests.set_rate(max(1.0, self.requests.per_minute / 2))
+            self.requests.level = min(self.requests.level, 0.0)
+
+    def record_success(self):
+        """Moves the request rate back towards the configured RPM."""
+        with self._lock:
+            if self.requests.per_minute < self.rpm:
+                self.requests.set_rate(min(self.rpm, self.requests.per_minute + self.rpm * RECOVERY_STEP))
+
+    def record_retry(self):
+        with self._lock:
+            self._counters["retries"] += 1
+
+    def stats(self):
+        """Returns queue depth, throttle and 429 counts and totals so far."""
+        with self._lock:
+            return {
+                "queue_depth": len(self._queue),
+                "rpm": self.rpm,
+                "effective_rpm": round(self.requests.per_minute, 2),
+                "tpm": self.tpm,
+                **self._counters,
+            }
+
+
+class RateLimitedModel:
+    """Wraps a Gemini model so `generate_content` goes through a `RateLimiter`.
+
+    Transient errors (429 quota errors, 5xx, timeouts) are retried up to
+    `max_retries` times with jittered exponential backoff; a 429 also pauses
+    every other queued request for the same delay. This is the only layer
+    that retries `generate_content`: the error it finally raises carries
+    `attempts`, which `call_with_retries` passes through untouched. Other
+    attributes are passed through to the wrapped model.
+    """
+
+    def __init__(self, model, limiter, max_retries=5, base_delay=2.0, max_delay=60.0):
+        self.model = model
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def generate_content(self, contents, **kwargs):
+        estimate = estimate_tokens(contents)
+        attempt = 0
+        while True:
+            attempt += 1
+            self.limiter.acquire(estimate)
+            try:
+                response = self.model.generate_content(contents, **kwargs)
+            except Exception as exc:
+                if attempt > self.max_retries or not is_transient(exc):
+                    exc.attempts = attempt
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                if getattr(exc, "code", None) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+                    self.limiter.record_rate_limited()
+                    self.limiter.pause(delay)
+                self.limiter.record_retry()
+                self.limiter.sleep(delay)
+                continue
+            self.limiter.record_success()
+            usage = getattr(response, "usage_metadata", None)
+            if not kwargs.get("stream") and getattr(usage, "total_token_count", None):
+                self.limiter.adjust(usage.total_token_count - estimate)
+            return response
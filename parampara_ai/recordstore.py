@@ -0,0 +1,388 @@
+"""Storage backends for processed recordings.
+
+Records used to be written as one pretty-printed JSON file each, every file
+repeating the multi-kilobyte system prompt. The default backend is now an
+append-only segment log: each record is one compact JSON line in
+`data/segments/NNNNNN.jsonl` (`NNNNNN.G.jsonl` once compacted), new segments are started once the active one
+reaches `SEGMENT_MAX_BYTES`, and prompts are stored once under
+`data/prompts/<hash>.txt` with records holding only `system_prompt_hash`.
+Reading every record is then a sequential scan of a few large files instead
+of opening one file per record.
+
+A record's location is a string kept in the record index: the file path for
+JSON files, or `<segment path>@<byte offset>` for the segment log. Writing a
+record again appends a new version; `SegmentLogStore.compact()` copies the
+sealed segments without superseded versions to a new segment file. Segment
+files are never rewritten in place, so a location read from the index
+always points at the record it was written for, or at a deleted file.
+Appends and compaction hold an exclusive `flock` on
+`segments/segments.lock`, so the CLI, the app and job workers can share a
+log.
+
+Versions replaced by a backfill are kept in a second log of the same format
+under `data/history/`, which neither the record index nor compaction reads.
+
+`PARAMPARA_STORAGE=json` switches new records back to one file each.
+Existing JSON files stay readable either way, and `migrate_json_files()`
+moves them into the segment log.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows: writes and compaction are only serialised within one process
+    fcntl = None
+
+PROMPTS_DIRNAME = "prompts"
+SEGMENTS_DIRNAME = "segments"
+HISTORY_DIRNAME = "history"
+SEGMENT_SUFFIX = ".jsonl"
+LOCK_FILENAME = "segments.lock"
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+LOCATION_SEPARATOR = "@"
+STORAGE_ENV_VAR = "PARAMPARA_STORAGE"
+DEFAULT_BACKEND = "segments"
+
+_ID_PREFIX_RE = re.compile(rb'^\{"id":"([^"\\]*)"') # Records are written with "id" first
+_SEGMENT_NAME_RE = re.compile(r"^(\d+)(?:\.(\d+))?" + re.escape(SEGMENT_SUFFIX) + "$") # Number, compaction generation
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    """Returns the process-wide lock guarding writes under `path`."""
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _record_id(line):
+    """Returns the ID of a raw segment line, usually without decoding the whole line."""
+    match = _ID_PREFIX_RE.match(line)
+    return match.group(1).decode("utf-8") if match else json.loads(line).get("id")
+
+
+def _segment_key(path):
+    """Returns `(number, generation)` for a segment file name, or None for other files."""
+    match = _SEGMENT_NAME_RE.match(os.path.basename(path))
+    return (int(match.group(1)), int(match.group(2) or 0)) if match else None
+
+
+def is_segment_location(location):
+    """True for `<segment>@<offset>` locations, False for JSON file paths."""
+    _, separator, offset = location.rpartition(LOCATION_SEPARATOR)
+    return bool(separator) and offset.isdigit()
+
+
+def describe_location(location):
+    """Where a record location points, for messages: the file, plus the byte offset in a segment."""
+    if is_segment_location(location):
+        path, _, offset = location.rpartition(LOCATION_SEPARATOR)
+        return f"`{path}` (byte offset {offset})"
+    return f"`{location}`"
+
+
+class PromptStore:
+    """Content-addressed store of system prompts, one small text file per prompt."""
+
+    def __init__(self, data_dir="data"):
+        self.directory = os.path.join(data_dir, PROMPTS_DIRNAME)
+        self._cache = {}
+
+    @staticmethod
+    def hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def put(self, text):
+        """Stores `text` (once) and returns its hash."""
+        prompt_hash = self.hash(text)
+        if prompt_hash not in self._cache:
+            path = os.path.join(self.directory, f"{prompt_hash}.txt")
+            if not os.path.exists(path):
+                os.makedirs(self.directory, exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(temp_path, path) # Readers never see a partial prompt
+            self._cache[prompt_hash] = text
+        return prompt_hash
+
+    def get(self, prompt_hash):
+        """Returns the prompt stored under `prompt_hash`, or None."""
+        if prompt_hash not in self._cache:
+            try:
+                with open(os.path.join(self.directory, f"{prompt_hash}.txt"), "r", encoding="utf-8") as f:
+                    self._cache[prompt_hash] = f.read()
+            except OSError:
+                return None
+        return self._cache[prompt_hash]
+
+    def resolve(self, record):
+        """Fills in `system_prompt` from `system_prompt_hash`, in place."""
+        if "system_prompt" not in record and record.get("system_prompt_hash"):
+            record["system_prompt"] = self.get(record["system_prompt_hash"])
+        return record
+
+
+class JsonFileStore:
+    """One pretty-printed JSON file per record, directly in `data_dir`."""
+
+    name = "json"
+
+    def __init__(self, data_dir="data"):
+        self.data_dir = data_dir
+
+    def write(self, record):
+        """Writes `record` and returns its location."""
+        os.makedirs(self.data_dir, exist_ok=True)
+        path = os.path.join(self.data_dir, f"{record['id']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        return path
+
+    def scan(self):
+        """Yields `(location, record)` for every JSON record file."""
+        if not os.path.isdir(self.data_dir):
+            return
+        with os.scandir(self.data_dir) as entries:
+            paths = sorted(entry.path for entry in entries if entry.name.endswith(".json") and entry.is_file())
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(record, dict) and "id" in record: # Skip other JSON files, e.g. embeddings.json
+                yield path, record
+
+
+class SegmentLogStore:
+    """Append-only JSON Lines segments with prompts stored by reference."""
+
+    name = "segments"
+
+    def __init__(self, data_dir="data", max_segment_bytes=SEGMENT_MAX_BYTES, dirname=SEGMENTS_DIRNAME):
+        self.data_dir = data_dir
+        self.directory = os.path.join(data_dir, dirname)
+        self.max_segment_bytes = max_segment_bytes
+        self.prompts = PromptStore(data_dir)
+
+    def segment_paths(self):
+        """Returns the segment files, oldest first (a compacted segment after those it replaces)."""
+        if not os.path.isdir(self.directory):
+            return []
+        with os.scandir(self.directory) as entries:
+            paths = [os.path.join(self.directory, entry.name) for entry in entries if _segment_key(entry.name)]
+        return sorted(paths, key=_segment_key)
+
+    def _segment_path(self, number, generation=0):
+        if generation:
+            return os.path.join(self.directory, f"{number:06d}.{generation}{SEGMENT_SUFFIX}")
+        return os.path.join(self.directory, f"{number:06d}{SEGMENT_SUFFIX}")
+
+    @contextmanager
+    def _locked(self):
+        """Holds the write lock for this log, across threads and processes."""
+        with _lock_for(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_FILENAME), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file is closed
+                yield
+
+    def _active_segment(self):
+        """Returns the segment new records go to, starting a new one when it is full."""
+        paths = self.segment_paths()
+        if not paths:
+            return self._segment_path(1)
+        last = paths[-1]
+        if os.path.getsize(last) < self.max_segment_bytes:
+            return last
+        return self._segment_path(_segment_key(last)[0] + 1)
+
+    def _encode(self, record):
+        stored = {"id": record["id"]}
+        for key, value in record.items():
+            if key == "system_prompt":
+                stored["system_prompt_hash"] = self.prompts.put(value or "")
+            elif key != "id":
+                stored[key] = value
+        return (json.dumps(stored, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def write(self, record):
+        """Appends `record` and returns its location."""
+        line = self._encode(record)
+        with self._locked(): # Rollover and append, so compaction never seals a segment mid-write
+            path = self._active_segment()
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                offset = os.lseek(fd, 0, os.SEEK_CUR) - len(line)
+            finally:
+                os.close(fd)
+        return f"{path}{LOCATION_SEPARATOR}{offset}"
+
+    def read(self, location, resolve_prompt=True):
+        """Returns the record stored at `location`."""
+        path, _, offset = location.rpartition(LOCATION_SEPARATOR)
+        with open(path, "rb") as f:
+            f.seek(int(offset))
+            record = json.loads(f.readline())
+        return self.prompts.resolve(record) if resolve_prompt else record
+
+    def _scan_lines(self, paths, start_offsets=None):
+        """Yields `(location, raw line)` for every complete line in `paths`."""
+        start_offsets = start_offsets or {}
+        for path in paths:
+            with open(path, "rb") as f:
+                offset = start_offsets.get(path, 0)
+                f.seek(offset)
+                for line in f:
+                    if line.endswith(b"\n"): # A missing newline means a write is still in progress
+                        yield f"{path}{LOCATION_SEPARATOR}{offset}", line
+                    offset += len(line)
+
+    def scan(self, resolve_prompts=False, start_offsets=None, latest_only=True):
+        """Yields `(location, record)` in write order with one sequential read per segment.
+
+        With `latest_only`, a first pass over the raw lines finds each record's
+        newest version and only those are decoded. `start_offsets` maps
+        segment paths to the byte offset to resume from.
+        """
+        paths = self.segment_paths()
+        latest = None
+        if latest_only:
+            latest = {}
+            for location, line in self._scan_lines(paths, start_offsets):
+                latest[_record_id(line)] = location
+            latest = set(latest.values())
+        for location, line in self._scan_lines(paths, start_offsets):
+            if latest is not None and location not in latest:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            yield location, (self.prompts.resolve(record) if resolve_prompts else record)
+
+    def compact(self, on_moved=None):
+        """Copies the sealed segments without superseded record versions.
+
+        The active (newest) segment is left alone, but writers in every
+        process wait on the log's lock while compaction runs, so none can
+        append to a segment being sealed; run it periodically (e.g.
+        `parampara-ai storage compact` from cron). The kept lines go to a new segment file that sorts where the
+        sealed ones did (the last sealed number, next generation), and
+        `on_moved(moved)` is called once it is complete, so the record index
+        can point at it before the old segments are removed. Returns a dict
+        mapping each moved record ID to its new location.
+        """
+        with self._locked():
+            paths = self.segment_paths()
+            sealed, active = paths[:-1], paths[-1:]
+            if not sealed:
+                return {}
+            newer_ids = {_record_id(line) for _, line in self._scan_lines(active)}
+            latest = {}
+            for _, line in self._scan_lines(sealed):
+                latest[_record_id(line)] = line
+
+            number, generation = _segment_key(sealed[-1])
+            target = self._segment_path(number, generation + 1)
+            temp_path = f"{target}.compact.tmp"
+            moved = {}
+            offset = 0
+            with open(temp_path, "wb") as out:
+                for record_id, line in latest.items():
+                    if record_id in newer_ids:
+                        continue # A newer version lives in the active segment
+                    out.write(line)
+                    moved[record_id] = f"{target}{LOCATION_SEPARATOR}{offset}"
+                    offset += len(line)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, target) # A new name: nothing refers to it yet
+            if on_moved is not None:
+                on_moved(moved)
+            for path in sealed:
+                os.remove(path)
+        return moved
+
+
+BACKENDS = {JsonFileStore.name: JsonFileStore, SegmentLogStore.name: SegmentLogStore}
+
+
+def get_store(data_dir="data", backend=None):
+    """Returns the backend new records are written to (`PARAMPARA_STORAGE`, default segments)."""
+    backend = backend or os.getenv(STORAGE_ENV_VAR, DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}'; choose one of {', '.join(BACKENDS)}")
+    return BACKENDS[backend](data_dir)
+
+
+def read_record(location, data_dir=None, resolve_prompt=True):
+    """Loads the record at a location from the record index, whichever backend wrote it."""
+    if is_segment_location(location):
+        segment_path = location.rpartition(LOCATION_SEPARATOR)[0]
+        data_dir = data_dir or os.path.dirname(os.path.dirname(segment_path))
+        return SegmentLogStore(data_dir).read(location, resolve_prompt=resolve_prompt)
+    with open(location, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scan_records(data_dir="data", resolve_prompts=False):
+    """Yields `(location, record)` for the latest version of every record.
+
+    Meant for bulk reads (analytics, exports, backfills): segments are read
+    sequentially and prompts are only loaded when `resolve_prompts` is set.
+    """
+    seen = set()
+    for location, record in SegmentLogStore(data_dir).scan(resolve_prompts=resolve_prompts):
+        seen.add(record.get("id"))
+        yield location, record
+    for location, record in JsonFileStore(data_dir).scan():
+        if record["id"] not in seen: # Left behind by an interrupted migration
+            yield location, record
+
+
+def iter_records(data_dir="data", resolve_prompts=False):
+    """Yields the latest version of every record, from the segment log and JSON files."""
+    for _, record in scan_records(data_dir, resolve_prompts):
+        yield record
+
+
+def migrate_json_files(data_dir="data", record_index=None, remove=True, on_progress=None, batch_size=500):
+    """Moves one-file-per-record JSON files into the segment log.
+
+    Records are appended to the log and re-pointed in `record_index` in
+    batches, and only then are their files removed, so an interrupted
+    migration loses nothing and can simply be run again. Returns the number
+    of records migrated.
+    """
+    store = SegmentLogStore(data_dir)
+    migrated = 0
+    pending = {} # record ID -> (old path, new location)
+
+    def flush():
+        if record_index is not None:
+            # Records that were never indexed are picked up by the next sync()
+            record_index.relocate({record_id: location for record_id, (_, location) in pending.items()})
+        if remove:
+            for path, _ in pending.values():
+                os.remove(path)
+        pending.clear()
+
+    for path, record in JsonFileStore(data_dir).scan():
+        pending[record["id"]] = (path, store.write(record))
+        migrated += 1
+        if len(pending) >= batch_size:
+            flush()
+        if on_progress:
+            on_progress(migrated)
+    flush()
+    return migrated
@@ -0,0 +1,88 @@
+"""Full-text search over transcriptions, translations and summaries.
+
+The search index is an SQLite FTS5 table stored next to the record index in
+`data/index.db` and updated by `RecordIndex` whenever a record is added or
+re-synced, so searches never scan the JSON files.
+
+FTS5's `unicode61` tokenizer treats combining marks (Indic vowel signs,
+viramas, anusvara, ...) as separators, which would split every Telugu or
+Hindi word into fragments. The marks of the Indic script blocks, plus the
+zero-width (non-)joiners, are therefore declared as token characters.
+"""
+
+import re
+import unicodedata
+
+# Combining marks in the Devanagari to Sinhala blocks, plus ZWNJ/ZWJ
+TOKEN_CHARS = "".join(
+    chr(code) for code in range(0x0900, 0x0E00) if unicodedata.category(chr(code)).startswith("M")
+) + "‌‍"
+
+FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    id UNINDEXED,
+    transcription,
+    translation,
+    title,
+    instructions,
+    summary_text,
+    tokenize = "unicode61 remove_diacritics 0 tokenchars '{TOKEN_CHARS}'"
+);
+"""
+
+# bm25() weights, one per column above: titles count most, then summaries
+BM25_WEIGHTS = (0.0, 1.0, 1.0, 5.0, 2.0, 2.0)
+
+SNIPPET_TOKENS = 12
+
+
+def _normalize(text):
+    return unicodedata.normalize("NFC", text or "")
+
+
+def document_fields(record):
+    """Returns the searchable text of a record, one value per FTS column."""
+    summary = record.get("summary_data") or {}
+    if not isinstance(summary, dict):
+        summary = {}
+    instructions = summary.get("instructions") or []
+    if not isinstance(instructions, list):
+        instructions = [instructions]
+    return (
+        _normalize(record.get("transcription_original_language")),
+        _normalize(record.get("translation_english")),
+        _normalize(summary.get("title")),
+        _normalize("\n".join(str(step) for step in instructions)),
+        _normalize(summary.get("summary_text")),
+    )
+
+
+def upsert_document(conn, record_id, record, rowid, replaced_rowids=()):
+    """Replaces the search document for `record_id`.
+
+    Documents share the rowid of their row in the `records` table, so the
+    documents of the rows an upsert replaced are deleted by rowid instead of
+    scanning the unindexed `id` column.
+    """
+    conn.executemany("DELETE FROM documents WHERE rowid = ?", [(replaced,) for replaced in replaced_rowids])
+    conn.execute(
+        "INSERT INTO documents (rowid, id, transcription, translation, title, instructions, summary_text) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (rowid, record_id, *document_fields(record)),
+    )
+
+
+def to_match_query(text):
+    """Turns free text into an FTS5 MATCH expression.
+
+    Every word must match (implicit AND); words are quoted so punctuation and
+    FTS operators in user input are taken literally, and the last word also
+    matches as a prefix so results appear while the user is still typing.
+    Returns None when the text contains no searchable words.
+    """
+    words = [word for word in re.split(r"[\s\"]+", _normalize(text).strip()) if word]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
@@ -0,0 +1,299 @@
+"""Long-recording mode: overlapping segments transcribed in parallel.
+
+A long recording is split into overlapping segments that are transcribed and
+translated concurrently (each request stays short and bounded in size), the
+segment texts are stitched back together in order with the duplicated
+overlap removed, and a single summary is generated from the combined English
+translation.
+
+WAV files are split with the standard library; other formats need `ffmpeg`
+and `ffprobe` on the PATH.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import unicodedata
+import wave
+
+from parampara_ai.batch import BatchItem, call_with_retries, run_batch
+from parampara_ai.metrics import RequestMetrics
+from parampara_ai.parsing import ORIGINAL, TRANSLATION, ParsedResponse, decode_summary, scan_sections
+from parampara_ai.pipeline import ProcessResult, ResponseParseError, generate, prepare_upload
+from parampara_ai.preprocess import CODECS, AudioToolError, PreprocessedAudio
+from parampara_ai.prompts import JSON_GENERATION_CONFIG, MODEL_NAME, build_segment_prompt, build_summary_prompt
+from parampara_ai.storage import DATA_DIR, save_record
+
+DEFAULT_SEGMENT_SECONDS = 300
+DEFAULT_OVERLAP_SECONDS = 10
+STITCH_WORDS_PER_SECOND = 4 # Upper bound on speech rate; caps the overlap length in words
+STITCH_SLACK = 3 # Words at a boundary that may be cut off or mis-heard on one side only
+STITCH_MIN_MATCH = 3 # Shortest run of words treated as duplicated overlap
+_WORD_RE = re.compile(r"\S+")
+
+
+# --- Segmentation ---
+def plan_segments(duration, segment_seconds=DEFAULT_SEGMENT_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+    """Returns `(start, end)` times in seconds covering `duration` with overlap.
+
+    Consecutive segments share `overlap_seconds`, so a word cut at one
+    boundary is heard whole in the neighbouring segment.
+    """
+    if segment_seconds <= overlap_seconds:
+        raise ValueError("segment_seconds must be larger than overlap_seconds")
+    segments = []
+    start = 0.0
+    while True:
+        end = min(duration, start + segment_seconds)
+        segments.append((start, end))
+        if end >= duration:
+            return segments
+        start = end - overlap_seconds
+
+
+def probe_duration(path):
+    """Returns the length of a recording in seconds."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    if not shutil.which("ffprobe"):
+        raise AudioToolError("ffprobe is required to measure non-WAV recordings.")
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    try:
+        return float(output.strip())
+    except ValueError:
+        raise AudioToolError(f"Could not read the duration of {path}") from None
+
+
+def cut_segment(path, start, end, dest_dir, position, codec=None):
+    """Writes the audio between `start` and `end` seconds to a new file in `dest_dir`.
+
+    WAV files are cut as they are. Other formats are re-encoded, with `codec`
+    (a `preprocess.CODECS` name) if given: "flac" keeps a segment lossless
+    for preprocessing.
+    """
+    if path.lower().endswith(".wav"):
+        target = os.path.join(dest_dir, f"segment_{position:04d}.wav")
+        with wave.open(path, "rb") as src:
+            rate = src.getframerate()
+            src.setpos(int(start * rate))
+            frames = src.readframes(int((end - start) * rate))
+            with wave.open(target, "wb") as dst:
+                dst.setparams(src.getparams())
+                dst.writeframes(frames)
+        return target
+    if not shutil.which("ffmpeg"):
+        raise AudioToolError("ffmpeg is required to split non-WAV recordings.")
+    if codec is not None:
+        extension, codec_args = CODECS[codec]
+    elif path.lower().endswith(".ogg"): # Opus speech: keep the compact codec
+        extension, codec_args = CODECS["opus"]
+    else:
+        extension, codec_args = ".mp3", ["-c:a", "libmp3lame", "-b:a", "64k"]
+    target = os.path.join(dest_dir, f"segment_{position:04d}{extension}")
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-v", "error", "-y", "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+         "-i", path, "-vn", "-ac", "1", *codec_args, target],
+        check=True,
+    )
+    return target
+
+
+# --- Parsing ---
+def parse_segment_response(text, language):
+    """Extracts the transcription and translation from a segment response."""
+    spans = scan_sections(text)
+    if ORIGINAL not in spans or TRANSLATION not in spans:
+        raise ResponseParseError("Segment response did not contain the transcription and translation sections.", text)
+    return text[slice(*spans[ORIGINAL])].strip(), text[slice(*spans[TRANSLATION])].strip()
+
+
+def parse_summary_response(text):
+    """Decodes the JSON summary from a text-only summary response."""
+    try:
+        summary, _ = decode_summary(text) # Tolerates a missing code fence
+    except ValueError as e:
+        raise ResponseParseError(str(e), text) from None
+    return summary
+
+
+# --- Stitching ---
+def _normalize_word(word):
+    """Lowercases a word and drops punctuation so overlap matching ignores it."""
+    return "".join(ch for ch in word.casefold() if not unicodedata.category(ch).startswith("P"))
+
+
+def find_overlap(left_words, right_words, max_words, slack=STITCH_SLACK, min_match=STITCH_MIN_MATCH):
+    """Finds the run of words that both ends a segment and starts the next one.
+
+    Only a run that ends within the last `slack` words of `left_words`,
+    starts within the first `slack` words of `right_words` and is at most
+    `max_words` long counts: a phrase repeated elsewhere in the segments is
+    not an overlap. Returns `(left_end, right_start)`, the index after the
+    run in each list, or None. Longer runs win, then runs nearer the edges.
+    """
+    left_norm = [_normalize_word(w) for w in left_words[-(max_words + slack):]]
+    right_norm = [_normalize_word(w) for w in right_words[:max_words + slack]]
+    for size in range(min(max_words, len(left_norm), len(right_norm)), min_match - 1, -1):
+        for skipped in range(slack + 1):
+            for left_trim in range(skipped + 1):
+                right_skip = skipped - left_trim
+                left_end = len(left_norm) - left_trim
+                if left_end - size < 0 or right_skip + size > len(right_norm):
+                    continue
+                if left_norm[left_end - size:left_end] == right_norm[right_skip:right_skip + size]:
+                    return len(left_words) - left_trim, right_skip + size
+    return None
+
+
+def stitch_pair(left, right, overlap_seconds=DEFAULT_OVERLAP_SECONDS, slack=STITCH_SLACK, min_match=STITCH_MIN_MATCH):
+    """Joins two consecutive segment texts, dropping the words they share.
+
+    The overlap (see `find_overlap`) is at most as many words as
+    `overlap_seconds` of speech can hold; `left` is kept up to its end and
+    `right` continues after it, both with their own line and paragraph
+    breaks. At the join, a paragraph break on either side is kept. Without
+    such an overlap both texts are kept whole.
+    """
+    left_spans = [match.span() for match in _WORD_RE.finditer(left)]
+    right_spans = [match.span() for match in _WORD_RE.finditer(right)]
+    if not left_spans or not right_spans:
+        return left or right
+    max_words = max(min_match, int(overlap_seconds * STITCH_WORDS_PER_SECOND))
+    overlap = find_overlap([left[i:j] for i, j in left_spans], [right[i:j] for i, j in right_spans],
+                           max_words, slack, min_match)
+    if overlap is None:
+        return f"{left}\n\n{right}" # No recognisable overlap; keep everything
+    left_end, right_start = overlap
+    if right_start == len(right_spans):
+        return left[:left_spans[left_end - 1][1]]
+    # The whitespace after the last kept word of `left` and before the first kept word of `right`
+    cut_left, cut_right = left_spans[left_end - 1][1], right_spans[right_start][0]
+    candidates = [left[cut_left:left_spans[left_end][0]] if left_end < len(left_spans) else "",
+                  right[right_spans[right_start - 1][1]:cut_right] if right_start else ""]
+    separator = max(candidates, key=lambda space: space.count("\n")) # A paragraph or line break wins over a space
+    return left[:cut_left] + (separator if "\n" in separator else " ") + right[cut_right:]
+
+
+def stitch_texts(texts, overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+    """Stitches segment texts in order, de-duplicating each overlap."""
+    stitched = ""
+    for text in texts:
+        stitched = stitch_pair(stitched, text, overlap_seconds) if stitched else text
+    return stitched
+
+
+# --- Pipeline ---
+def process_long_audio(audio_path, language, client, model, metadata=None,
+                       segment_seconds=DEFAULT_SEGMENT_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS,
+                       max_workers=4, max_retries=3, data_dir=DATA_DIR, on_progress=None,
+                       model_name=MODEL_NAME, recorder=None, preprocess=False):
+    """Transcribes a long recording segment by segment and saves one record.
+
+    `on_progress(done, total)` is called as segments finish. Raises the first
+    segment error once all segments have been attempted. Stage timings are
+    written to `recorder` when one is given. With `preprocess=True` each
+    segment is preprocessed (see `prepare_upload`) after the split, just
+    before its first upload, so a worker decodes one segment at a time
+    rather than the whole recording up front.
+    """
+    metadata = metadata or {}
+    start_time = time.time()
+    metrics = RequestMetrics(model=model_name, language=language, audio_bytes=os.path.getsize(audio_path), mode="long")
+    prepared = None
+    try:
+        segment_prompt = build_segment_prompt(language)
+        prepared_segments = {} # Segment name -> PreprocessedAudio or None, kept across retries
+        segment_dir = tempfile.mkdtemp()
+        try:
+            with metrics.stage("split"):
+                spans = plan_segments(probe_duration(audio_path), segment_seconds, overlap_seconds)
+                items = [
+                    BatchItem(name=str(position), path=cut_segment(audio_path, start, end, segment_dir, position,
+                                                                    codec="flac" if preprocess else None))
+                    for position, (start, end) in enumerate(spans)
+                ]
+            metrics.fields["segments"] = len(items)
+
+            def transcribe_segment(item):
+                upload_path = item.path
+                if preprocess:
+                    if item.name not in prepared_segments:
+                        prepared_segments[item.name] = prepare_upload(item.path) # Not `metrics`: the workers share it
+                    if prepared_segments[item.name] is not None:
+                        upload_path = prepared_segments[item.name].path
+                return parse_segment_response(generate(client, model, upload_path, segment_prompt), language)
+
+            segment_texts = [None] * len(items)
+            errors = []
+            with metrics.stage("transcribe_segments"): # Wall-clock time for all segments together
+                for done, batch_result in enumerate(run_batch(items, transcribe_segment, max_workers=max_workers, max_retries=max_retries), start=1):
+                    if batch_result.ok:
+                        segment_texts[int(batch_result.item.name)] = batch_result.result
+                    else:
+                        errors.append(batch_result.error)
+                    if on_progress:
+                        on_progress(done, len(items))
+        finally:
+            with metrics.stage("local_cleanup"):
+                for segment in prepared_segments.values():
+                    if segment is not None:
+                        segment.remove()
+                shutil.rmtree(segment_dir, ignore_errors=True)
+        if errors:
+            raise errors[0]
+        segment_savings = [segment for segment in prepared_segments.values() if segment is not None]
+        if preprocess:
+            metrics.fields["preprocess"] = "ok" if segment_savings else "skipped"
+        if segment_savings:
+            prepared = PreprocessedAudio.combine(segment_savings)
+            metrics.fields.update(prepared.to_dict())
+            # Segments are uploaded in parallel, so only the shorter audio counts
+            metrics.fields["estimated_seconds_saved"] = round(
+                prepared.estimated_seconds_saved(0.0, metrics.stages["transcribe_segments"]), 3)
+
+        # Results arrive in completion order; stitching follows segment order
+        with metrics.stage("stitch"):
+            parsed = ParsedResponse(
+                original_lang_text=stitch_texts([original for original, _ in segment_texts], overlap_seconds),
+                translated_text=stitch_texts([english for _, english in segment_texts], overlap_seconds),
+            )
+        summary_prompt = build_summary_prompt(language, parsed.translated_text)
+        with metrics.stage("summarize"):
+            summary_text, _ = call_with_retries(
+                lambda: model.generate_content(summary_prompt, generation_config=JSON_GENERATION_CONFIG).text,
+                max_retries=max_retries,
+            )
+        with metrics.stage("parse"):
+            parsed.summary_data = parse_summary_response(summary_text)
+
+        with metrics.stage("save_data"):
+            file_id, location = save_record(
+                transcription_original_lang=parsed.original_lang_text,
+                translation=parsed.translated_text,
+                summary=parsed.summary_data,
+                system_prompt=f"{segment_prompt}\n\n{build_summary_prompt(language, '[Stitched English Translation]')}",
+                username_val=metadata.get("username"),
+                latitude_val=metadata.get("latitude"),
+                longitude_val=metadata.get("longitude"),
+                category_val=metadata.get("category"),
+                selected_lang_val=language,
+                audio_file_val=metadata.get("audio_file"),
+                model_val=model_name,
+                data_dir=data_dir,
+            )
+        metrics.outcome = "ok"
+    except Exception as e:
+        metrics.outcome = type(e).__name__
+        raise
+    finally:
+        if recorder is not None:
+            recorder.record(metrics)
+    return ProcessResult(parsed=parsed, file_id=file_id, location=location, duration=time.time() - start_time, metrics=metrics,
+                         preprocessed=prepared)
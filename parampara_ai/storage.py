@@ -0,0 +1,68 @@
+"""Writing processed recordings to the `data/` directory."""
+
+import uuid
+from datetime import datetime
+
+from parampara_ai.embeddings import EmbeddingIndex
+from parampara_ai.index import RecordIndex
+from parampara_ai.recordstore import HISTORY_DIRNAME, JsonFileStore, SegmentLogStore, get_store, is_segment_location, read_record
+
+DATA_DIR = "data"
+
+
+def save_data(*args, **kwargs):
+    """Saves transcription, translation, and summary data; returns the record ID (see `save_record`)."""
+    return save_record(*args, **kwargs)[0]
+
+
+def save_record(transcription_original_lang, translation, summary, system_prompt, username_val, latitude_val, longitude_val, category_val, selected_lang_val, audio_file_val=None, model_val=None, data_dir=DATA_DIR):
+    """Saves transcription, translation, and summary data with the configured storage backend.
+
+    Returns `(record ID, location)`; see `recordstore.describe_location`.
+    """
+    file_id = str(uuid.uuid4()) # Generate a unique ID for the file
+    data = {
+        "id": file_id,
+        "timestamp": datetime.now().isoformat(),
+        "username": username_val if username_val else "Anonymous",
+        "coordinates": {
+            "latitude": latitude_val if latitude_val else None,
+            "longitude": longitude_val if longitude_val else None
+        },
+        "category": category_val,
+        "original_language": selected_lang_val, # Save the selected language
+        "audio_file": audio_file_val, # Name or path of the recording the record was made from
+        "transcription_original_language": transcription_original_lang,
+        "translation_english": translation,
+        "summary_data": summary, # Add summary data here
+        "system_prompt": system_prompt,
+        "model": model_val # The Gemini model that produced the record
+    }
+    location = get_store(data_dir).write(data) # The segment log by default (see parampara_ai.recordstore)
+    RecordIndex(data_dir).add(data, location) # Keep the Collection index in sync
+    EmbeddingIndex(data_dir).add(file_id, data) # ...and the "similar records" vectors
+    return file_id, location
+
+
+def save_new_version(location, updates, data_dir=DATA_DIR):
+    """Saves the record at `location` again with `updates` applied, keeping the old version.
+
+    The current version is first appended to the history log
+    (`data/history/`), and the new one records its `version`, `updated_at`
+    and the history location as `previous_version`. The new version goes to
+    the same backend as the old one. Returns `(record, location)`.
+    """
+    current = read_record(location, data_dir, resolve_prompt=False)
+    history_location = SegmentLogStore(data_dir, dirname=HISTORY_DIRNAME).write(current)
+    record = dict(current)
+    if "system_prompt" in updates:
+        record.pop("system_prompt_hash", None) # Re-derived from the new prompt when stored
+    record.update(updates)
+    record["version"] = current.get("version", 1) + 1
+    record["updated_at"] = datetime.now().isoformat()
+    record["previous_version"] = history_location
+    store = SegmentLogStore(data_dir) if is_segment_location(location) else JsonFileStore(data_dir)
+    new_location = store.write(record)
+    RecordIndex(data_dir).add(record, new_location)
+    EmbeddingIndex(data_dir).add(record["id"], record)
+    return record, new_location
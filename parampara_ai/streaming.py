@@ -0,0 +1,103 @@
+"""Incremental parsing of a streamed Gemini response.
+
+`IncrementalParser` is fed response chunks as they arrive and tracks which
+section (transcription, translation or summary JSON) is being written, so the
+partial transcription and translation can be displayed while the model is
+still generating. Only the text since the last section boundary is kept
+for scanning, and each chunk is searched once; a marker split across two
+chunks is found because the unscanned tail is kept until more text arrives.
+The finished response goes through `parse_response`, so a stream whose
+headings drift from the exact markers is still parsed.
+"""
+
+import re
+
+from parampara_ai.parsing import (
+    ENGLISH_PREFIX_MARKER,
+    SUMMARY_JSON_BLOCK_END_MARKER,
+    SUMMARY_JSON_BLOCK_START_MARKER,
+    original_lang_prefix_marker,
+    parse_response,
+)
+
+ORIGINAL, TRANSLATION, SUMMARY_JSON, DONE = "original", "translation", "json", "done"
+
+# The "**Summary JSON:**" heading between the translation and the JSON fence
+_SUMMARY_HEADING_RE = re.compile(r"(?:^|\n)[ \t#*_]*summary(?:[ \t]+json)?[ \t]*:?[ \t*_]*:?\s*$", re.IGNORECASE)
+
+
+class IncrementalParser:
+    """Splits a streamed response into sections as the chunks come in."""
+
+    def __init__(self, language):
+        self.language = language
+        # Marker that closes the current section, and the section it opens
+        self._transitions = {
+            None: (original_lang_prefix_marker(language), ORIGINAL),
+            ORIGINAL: (ENGLISH_PREFIX_MARKER, TRANSLATION),
+            TRANSLATION: (SUMMARY_JSON_BLOCK_START_MARKER, SUMMARY_JSON),
+            SUMMARY_JSON: (SUMMARY_JSON_BLOCK_END_MARKER, DONE),
+        }
+        self.section = None # Section currently being written, None before the first marker
+        self._chunks = [] # Everything fed so far, joined only when `text` is read
+        self._tail = "" # Text after the last section boundary that has not been searched for the next marker yet
+        self._sections = {} # section -> list of its scanned pieces of text
+
+    @property
+    def text(self):
+        """The whole response received so far."""
+        if len(self._chunks) > 1:
+            self._chunks[:] = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk):
+        """Consumes the next chunk of response text.
+
+        Only the new chunk and the few characters kept back from the previous
+        one are searched, so feeding a whole response is linear in its length.
+        """
+        self._chunks.append(chunk)
+        if self.section == DONE:
+            return
+        self._tail += chunk
+        while self.section != DONE:
+            marker, next_section = self._transitions[self.section]
+            idx = self._tail.find(marker)
+            if idx == -1:
+                # Keep the last len(marker) - 1 characters unscanned in case the
+                # marker is split across this chunk and the next one
+                scanned = max(0, len(self._tail) - len(marker) + 1)
+                if self.section is not None:
+                    self._sections[self.section].append(self._tail[:scanned])
+                self._tail = self._tail[scanned:]
+                break
+            if self.section is not None:
+                self._sections[self.section].append(self._tail[:idx])
+            self.section = next_section
+            self._tail = self._tail[idx + len(marker):]
+            if next_section != DONE:
+                self._sections[next_section] = []
+        if self.section == DONE:
+            self._tail = ""
+
+    def _section_text(self, section):
+        # An open section may end with the beginning of its closing marker, so
+        # only the already-scanned part is shown
+        pieces = self._sections.get(section)
+        if not pieces:
+            return ""
+        if len(pieces) > 1:
+            pieces[:] = ["".join(pieces)]
+        return pieces[0].strip()
+
+    @property
+    def original_lang_text(self):
+        return self._section_text(ORIGINAL)
+
+    @property
+    def translated_text(self):
+        return _SUMMARY_HEADING_RE.sub("", self._section_text(TRANSLATION)).strip()
+
+    def finish(self):
+        """Returns the final `ParsedResponse` once the stream has ended."""
+        return parse_response(self.text, self.language)
@@ -0,0 +1,66 @@
+"""Copying uploaded files to disk without holding them in memory."""
+
+import hashlib
+import os
+import tempfile
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Optional
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024 # Copy uploads in 1 MiB chunks
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@dataclass
+class SpooledUpload:
+    """An upload written to a local file, with the SHA-256 of its bytes.
+
+    The file is deleted by `remove()`, or at the latest once the object is
+    garbage collected (e.g. when Streamlit discards an ended session's
+    state) or the interpreter exits.
+    """
+
+    path: str
+    sha256: str
+    size: int
+    write_seconds: Optional[float] = None # Time spent copying to disk, until reported in metrics
+
+    def __post_init__(self):
+        self._cleanup = weakref.finalize(self, _remove_file, self.path) # Must not refer to self
+
+    def remove(self):
+        """Deletes the local file, ignoring it if it is already gone."""
+        self._cleanup()
+
+
+def spool_upload(fileobj, suffix="", dest_dir=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Copies a file-like object to a new temporary file in fixed-size chunks.
+
+    The content hash used for de-duplication and the result cache is computed
+    in the same pass, so the data is read exactly once and never held in
+    memory as a whole.
+    """
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0) # Streamlit reuses the same UploadedFile object across reruns
+    start = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=dest_dir) as temp_file:
+        try:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+                digest.update(chunk)
+                temp_file.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            temp_file.close()
+            os.remove(temp_file.name)
+            raise
+    return SpooledUpload(path=temp_file.name, sha256=digest.hexdigest(), size=size,
+                         write_seconds=time.perf_counter() - start)